@@ -1,15 +1,60 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import os
 
 # Get database URL from environment variable or use default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database/egg_monitor.db")
 
+# SQLite performance profile (only applied to SQLite databases)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # Negative values are KiB (64 MiB)
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # Milliseconds
+SQLITE_AUTO_VACUUM = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")  # Only takes effect for new database files
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "60"))  # Seconds, 0 disables
+SQLITE_CHECKPOINT_MODE = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE")
+
+# Number of threads serving database calls made from async code
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+
+def sqlite_pragmas():
+    """Get the pragma statements applied to every new SQLite connection"""
+    return [
+        # auto_vacuum must be set before the first table is created
+        f"PRAGMA auto_vacuum={SQLITE_AUTO_VACUUM}",
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+        f"PRAGMA temp_store={SQLITE_TEMP_STORE}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}",
+    ]
+
+def configure_sqlite(engine) -> None:
+    """Apply the SQLite performance profile to each connection opened by an engine"""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in sqlite_pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+configure_sqlite(engine)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -24,3 +69,53 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dedicated thread pool for database calls made from the event loop
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function (e.g. one using an existing session) on the database executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database function on the database executor and await its result
+    
+    The function is called as func(db, *args, **kwargs) with a fresh session that
+    is closed afterwards, so it should return plain values rather than ORM objects.
+    """
+    def call():
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+    
+    return await run_blocking(call)
+
+def checkpoint_wal(mode: str = SQLITE_CHECKPOINT_MODE):
+    """
+    Run a WAL checkpoint
+
+    Returns:
+        A tuple of (busy, wal_frames, checkpointed_frames), or None if the
+        database is not SQLite
+    """
+    if engine.dialect.name != "sqlite":
+        return None
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return tuple(result) if result is not None else None
+
+# Background task that keeps the WAL file from growing without bound
+async def checkpoint_wal_periodically(interval: float = SQLITE_CHECKPOINT_INTERVAL):
+    """Checkpoint the WAL every `interval` seconds without blocking the event loop"""
+    if interval <= 0 or engine.dialect.name != "sqlite":
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(checkpoint_wal)
+        except Exception as e:
+            print(f"WAL checkpoint error: {e}")
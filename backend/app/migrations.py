@@ -0,0 +1,104 @@
+"""
+In-place schema migrations for existing SQLite databases.
+
+New databases get their full schema from ``Base.metadata.create_all``. Changes
+that create_all cannot apply to tables that already exist (new indexes, new
+columns) are listed here and tracked with SQLite's ``PRAGMA user_version``, so
+every migration runs exactly once per database file.
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .utils.chunk_codec import decode_chunk
+from .utils.rollups import ROLLUP_RESOLUTIONS, update_rollups
+
+def _migrate_sensor_data_index(conn: Connection) -> None:
+    """Replace the single-column sensor_data indexes with a covering (sensor_id, timestamp, value) index"""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_sensor_data_sensor_id_timestamp "
+        "ON sensor_data (sensor_id, timestamp, value)"
+    )
+    # The timestamp index is superseded by the composite index, and the id index
+    # duplicates the rowid; both only slow down inserts
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_sensor_data_timestamp")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_sensor_data_id")
+
+def _migrate_sensor_retention_columns(conn: Connection) -> None:
+    """Add the per-sensor retention overrides to the sensors table"""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info('sensors')")}
+    if not columns:
+        # The table does not exist yet; create_all will create it with these columns
+        return
+    if "raw_retention_hours" not in columns:
+        conn.exec_driver_sql("ALTER TABLE sensors ADD COLUMN raw_retention_hours FLOAT")
+    if "rollup_retention_days" not in columns:
+        conn.exec_driver_sql("ALTER TABLE sensors ADD COLUMN rollup_retention_days FLOAT")
+
+def _migrate_rollup_backfill(conn: Connection) -> None:
+    """Rebuild the rollups from every stored sample, including samples written before rollups existed"""
+    if not ROLLUP_RESOLUTIONS:
+        return
+    models.SensorDataRollup.__table__.create(conn, checkfirst=True)
+    # Samples written since rollups were added are already counted; rebuilding from scratch avoids counting them twice
+    conn.exec_driver_sql("DELETE FROM sensor_data_rollups")
+
+    # Rows are aggregated in SQL, one pass per resolution; the bucket start is floor(timestamp / resolution) * resolution
+    if conn.exec_driver_sql("PRAGMA table_info('sensor_data')").first() is not None:
+        for resolution in ROLLUP_RESOLUTIONS:
+            conn.exec_driver_sql(
+                "INSERT INTO sensor_data_rollups "
+                "(sensor_id, resolution, bucket_start, count, min_value, max_value, sum_value, sum_squares) "
+                "SELECT sensor_id, ?, bucket * ?, COUNT(*), MIN(value), MAX(value), SUM(value), SUM(value * value) "
+                "FROM (SELECT sensor_id, value, CAST(timestamp / ? AS INTEGER) "
+                "- (timestamp / ? < CAST(timestamp / ? AS INTEGER)) AS bucket FROM sensor_data "
+                "WHERE sensor_id IS NOT NULL AND timestamp IS NOT NULL AND value IS NOT NULL) "
+                "GROUP BY sensor_id, bucket",
+                (resolution, resolution, resolution, resolution, resolution),
+            )
+
+    # Chunks are packed, so they are decoded and merged into the same buckets
+    if conn.exec_driver_sql("PRAGMA table_info('sensor_data_chunks')").first() is not None:
+        with Session(bind=conn) as db:
+            for chunk in conn.execute(select(models.SensorDataChunk.__table__)):
+                timestamps, values = decode_chunk(chunk)
+                update_rollups(db, chunk.sensor_id, timestamps, values)
+
+# Ordered list of (schema version, description, migration function)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "composite (sensor_id, timestamp) index on sensor_data", _migrate_sensor_data_index),
+    (2, "per-sensor retention overrides", _migrate_sensor_retention_columns),
+    (3, "rollups of the samples stored before rollups existed", _migrate_rollup_backfill),
+]
+
+def get_schema_version(conn: Connection) -> int:
+    """Read the schema version stored in the database file"""
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def run_migrations(engine: Engine) -> int:
+    """
+    Apply pending migrations to a database
+
+    Args:
+        engine: The SQLAlchemy engine of the database to migrate
+
+    Returns:
+        The schema version after migrating
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+        for target, description, migrate in MIGRATIONS:
+            if version >= target:
+                continue
+            print(f"Applying database migration {target}: {description}")
+            migrate(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+            version = target
+    return version
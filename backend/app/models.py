@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Table, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -33,6 +33,8 @@ class Sensor(Base):
     sensor_name = Column(String, unique=True, index=True)
     sensor_data_rate = Column(Float, default=100.0)  # Default 100Hz
     is_active = Column(Boolean, default=False)  # Whether mock data is being produced
+    raw_retention_hours = Column(Float, nullable=True)  # Overrides RETENTION_RAW_HOURS when set
+    rollup_retention_days = Column(Float, nullable=True)  # Overrides RETENTION_ROLLUP_DAYS when set
     
     # Relationship with users (many-to-many)
     users = relationship(
@@ -43,15 +45,65 @@ class Sensor(Base):
     
     # Relationship with sensor data (one-to-many)
     data = relationship("SensorData", back_populates="sensor", cascade="all, delete-orphan")
+    
+    # Relationship with packed sensor data chunks (one-to-many)
+    chunks = relationship("SensorDataChunk", back_populates="sensor", cascade="all, delete-orphan")
+    
+    # Relationship with rollup buckets (one-to-many)
+    rollups = relationship("SensorDataRollup", cascade="all, delete-orphan")
 
 class SensorData(Base):
     """Model for storing sensor data points"""
     __tablename__ = "sensor_data"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     sensor_id = Column(Integer, ForeignKey("sensors.id"))
-    timestamp = Column(Float, index=True)  # Unix timestamp
+    timestamp = Column(Float)  # Unix timestamp
     value = Column(Float)  # EGG data value
     
     # Relationship with sensor (many-to-one)
     sensor = relationship("Sensor", back_populates="data")
+
+    # Covering index for per-sensor time range reads: the value column (and the
+    # implicit rowid, which is the id) are stored in the index, so range queries
+    # are answered by a single index seek without touching the table
+    __table_args__ = (
+        Index("ix_sensor_data_sensor_id_timestamp", "sensor_id", "timestamp", "value"),
+    )
+
+class SensorDataChunk(Base):
+    """Model for storing a block of sensor data points in packed binary form"""
+    __tablename__ = "sensor_data_chunks"
+
+    id = Column(Integer, primary_key=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False)
+    start_time = Column(Float, nullable=False)  # Unix timestamp of the first sample
+    end_time = Column(Float, nullable=False)  # Unix timestamp of the last sample
+    sample_count = Column(Integer, nullable=False)
+    sample_interval = Column(Float, nullable=True)  # Set when samples are evenly spaced
+    value_format = Column(String, nullable=False, default="f4")  # "f4" (float32) or "f8" (float64)
+    timestamp_deltas = Column(LargeBinary, nullable=True)  # uint32 microsecond offsets from start_time
+    values = Column(LargeBinary, nullable=False)  # Packed sample values
+    
+    # Relationship with sensor (many-to-one)
+    sensor = relationship("Sensor", back_populates="chunks")
+
+    __table_args__ = (
+        Index("ix_sensor_data_chunks_sensor_id_start_time", "sensor_id", "start_time"),
+    )
+
+class SensorDataRollup(Base):
+    """Model for storing per-bucket aggregates of sensor data at a fixed resolution"""
+    __tablename__ = "sensor_data_rollups"
+
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # Bucket width in seconds
+    bucket_start = Column(Float, primary_key=True)  # Unix timestamp of the bucket start
+    count = Column(Integer, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    sum_squares = Column(Float, nullable=False)  # Used for the RMS
+
+    # Rows are looked up by their primary key only, so store them in the key's b-tree
+    __table_args__ = {"sqlite_with_rowid": False}
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, List, Optional
 import time
 import random
 import asyncio
@@ -8,7 +10,16 @@ import threading
 import math
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_db, run_blocking
+from ..utils import downsampling, export, pagination, rollups, sample_store, spectral, window_stats
+from ..utils import wire_format as wire
+from ..utils.hot_window import hot_window
+from ..utils.ingest_formats import parse_batch
+from ..utils.ingest_writer import ingest_writer
+from ..utils.response_cache import listing_cache
+from ..utils.retention import retention_job
+from ..utils.sensor_registry import sensor_registry
+from .websockets import forward_samples
 
 router = APIRouter(
     prefix="/api/sensors",
@@ -16,6 +27,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Serializes the cached sensor listing
+sensors_adapter = TypeAdapter(List[schemas.SensorWithUsers])
+
 # Dictionary to store active mock data threads
 mock_data_threads = {}
 
@@ -31,10 +45,15 @@ def generate_mock_data(sensor_id: int, data_rate: float):
         # Set sensor as active
         sensor.is_active = True
         db.commit()
+        listing_cache.invalidate()
+        sensor_registry.set_active(sensor_id, True)
         
         # Calculate sleep time based on data rate
         sleep_time = 1.0 / data_rate
         
+        # Size the in-memory window for this rate
+        hot_window.configure(sensor_id, data_rate)
+        
         # Variables for generating realistic EGG data
         previous_value = 0.0
         base_frequency = 0.05  # 3 cycles per minute = 0.05Hz
@@ -66,14 +85,8 @@ def generate_mock_data(sensor_id: int, data_rate: float):
             # Update previous value for next iteration
             previous_value = value
             
-            data_point = models.SensorData(
-                sensor_id=sensor_id,
-                timestamp=timestamp,
-                value=value
-            )
-            
-            db.add(data_point)
-            db.commit()
+            # Hand the sample to the ingest writer, which commits in batches
+            ingest_writer.submit(sensor_id, (timestamp,), (value,))
             
             # Sleep according to data rate
             time.sleep(sleep_time)
@@ -83,9 +96,82 @@ def generate_mock_data(sensor_id: int, data_rate: float):
         if sensor:
             sensor.is_active = False
             db.commit()
+            listing_cache.invalidate()
+            sensor_registry.set_active(sensor_id, False)
     finally:
         db.close()
 
+@router.get("/ingest/status", response_model=schemas.IngestStatus)
+def get_ingest_status():
+    """Get the ingest writer settings, queue depth and counters"""
+    return ingest_writer.stats()
+
+@router.get("/hot-window/status", response_model=schemas.HotWindowStatus)
+def get_hot_window_status():
+    """Get the in-memory window size and memory use per sensor"""
+    return hot_window.stats()
+
+@router.get("/retention/status", response_model=schemas.RetentionReport)
+def get_retention_status():
+    """Get the report of the last retention run"""
+    return retention_job.last_report or schemas.RetentionReport()
+
+@router.get(
+    "/data",
+    response_model=Dict[int, List[schemas.SensorDataPoint]],
+    response_model_exclude_none=True,
+)
+def get_sensors_data(
+    start_time: float,
+    end_time: float = None,
+    sensor_ids: Optional[List[int]] = Query(None),
+    user_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Get a time window of data for several sensors in one request
+    
+    The sensors are given as repeated `sensor_ids` parameters or as the
+    `user_id` of their user. Ranges inside the in-memory window are served from
+    it; the rest are read with a single query grouped by sensor. The result maps
+    each sensor ID to its newest `limit` samples, newest first.
+    """
+    if user_id is not None:
+        db_user = db.query(models.User).filter(models.User.id == user_id).first()
+        if db_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {user_id} not found"
+            )
+        requested = [sensor.id for sensor in db_user.sensors]
+    elif sensor_ids:
+        requested = list(dict.fromkeys(sensor_ids))
+        existing = {
+            row.id for row in db.query(models.Sensor.id).filter(models.Sensor.id.in_(requested))
+        }
+        missing = [sensor_id for sensor_id in requested if sensor_id not in existing]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Sensors with IDs {missing} not found"
+            )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either sensor_ids or user_id is required"
+        )
+    
+    # Serve what the in-memory window covers, then read the rest together
+    results = {}
+    for sensor_id in requested:
+        recent = hot_window.read(sensor_id, start_time, end_time, limit=limit, newest_first=True)
+        if recent is not None:
+            results[sensor_id] = recent
+    remaining = [sensor_id for sensor_id in requested if sensor_id not in results]
+    results.update(sample_store.read_samples_many(db, remaining, start_time, end_time, limit))
+    return {sensor_id: results[sensor_id] for sensor_id in requested}
+
 @router.post("/", response_model=schemas.SensorInDB, status_code=status.HTTP_201_CREATED)
 def create_sensor(sensor: schemas.SensorCreate, db: Session = Depends(get_db)):
     """Create a new sensor"""
@@ -101,14 +187,31 @@ def create_sensor(sensor: schemas.SensorCreate, db: Session = Depends(get_db)):
     db_sensor = models.Sensor(**sensor.dict())
     db.add(db_sensor)
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_sensor)
+    sensor_registry.update(db_sensor)
     return db_sensor
 
 @router.get("/", response_model=List[schemas.SensorWithUsers])
-def read_sensors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all sensors with their users"""
-    sensors = db.query(models.Sensor).offset(skip).limit(limit).all()
-    return sensors
+def read_sensors(request: Request, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Get all sensors with their users
+    
+    Pass the ID of the last sensor of a page as `after_id` to get the next page
+    with an index seek instead of an OFFSET scan. Responses carry an ETag and
+    are cached until a user, sensor or assignment changes.
+    """
+    def render() -> bytes:
+        # Load the users of the whole page with one extra query
+        query = db.query(models.Sensor).options(selectinload(models.Sensor.users)).order_by(models.Sensor.id)
+        if after_id is not None:
+            query = query.filter(models.Sensor.id > after_id)
+        else:
+            query = query.offset(skip)
+        sensors = query.limit(limit).all()
+        return sensors_adapter.dump_json(sensors_adapter.validate_python(sensors, from_attributes=True))
+    
+    return listing_cache.respond(request, ("sensors", skip, limit, after_id), render)
 
 @router.get("/{sensor_id}", response_model=schemas.SensorWithUsers)
 def read_sensor(sensor_id: int, db: Session = Depends(get_db)):
@@ -137,7 +240,14 @@ def update_sensor(sensor_id: int, sensor: schemas.SensorUpdate, db: Session = De
         setattr(db_sensor, key, value)
     
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_sensor)
+    sensor_registry.update(db_sensor)
+    
+    # Resize the in-memory window and drop spectra computed at the old rate if the rate changed
+    if "sensor_data_rate" in update_data:
+        hot_window.configure(sensor_id, db_sensor.sensor_data_rate)
+        spectral.spectral_cache.remove(sensor_id)
     return db_sensor
 
 @router.delete("/{sensor_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -157,6 +267,10 @@ def delete_sensor(sensor_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_sensor)
     db.commit()
+    listing_cache.invalidate()
+    sensor_registry.remove(sensor_id)
+    hot_window.remove(sensor_id)
+    spectral.spectral_cache.remove(sensor_id)
     return None
 
 @router.post("/{sensor_id}/mock/start", response_model=schemas.SensorInDB)
@@ -191,7 +305,9 @@ def start_mock_data(sensor_id: int, db: Session = Depends(get_db)):
     # Update sensor status (the thread will also do this, but this ensures immediate UI feedback)
     db_sensor.is_active = True
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_sensor)
+    sensor_registry.set_active(sensor_id, True)
     
     return db_sensor
 
@@ -213,19 +329,203 @@ def stop_mock_data(sensor_id: int, db: Session = Depends(get_db)):
     # Update sensor status
     db_sensor.is_active = False
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_sensor)
+    sensor_registry.set_active(sensor_id, False)
     
     return db_sensor
 
-@router.get("/{sensor_id}/data", response_model=List[schemas.SensorDataInDB])
+def _read_sensor_data(
+    db: Session,
+    sensor_id: int,
+    response: Response,
+    limit: int,
+    start_time: Optional[float],
+    end_time: Optional[float],
+    max_points: Optional[int],
+    downsample: str,
+    resolution: Optional[int],
+    direction: Optional[str],
+    cursor: Optional[str],
+) -> List[dict]:
+    """Select the samples or rollup buckets answering a get_sensor_data request"""
+    # Check if sensor exists
+    db_sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+    if db_sensor is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sensor with ID {sensor_id} not found"
+        )
+    if downsample not in downsampling.METHODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown downsampling method '{downsample}'"
+        )
+    
+    # Keyset pagination
+    if cursor is not None or direction is not None:
+        after = None
+        if cursor is not None:
+            try:
+                after, direction = pagination.decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if direction not in pagination.DIRECTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Direction must be one of {list(pagination.DIRECTIONS)}"
+            )
+        samples = sample_store.read_keyed_samples(
+            db,
+            sensor_id,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit + 1,
+            newest_first=direction == "older",
+            after=after,
+        )
+        page = samples[:limit]
+        next_cursor, prev_cursor = pagination.page_cursors(
+            [key for key, _ in page], direction, has_more=len(samples) > limit
+        )
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if prev_cursor is not None:
+            response.headers["X-Prev-Cursor"] = prev_cursor
+        return [sample for _, sample in page]
+    
+    # Explicit rollup resolution
+    if resolution is not None:
+        if resolution not in rollups.ROLLUP_RESOLUTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Resolution must be one of {rollups.ROLLUP_RESOLUTIONS}"
+            )
+        buckets = rollups.read_rollups(db, sensor_id, resolution, start_time, end_time)
+        return buckets[:max_points] if max_points is not None else buckets[:limit]
+    
+    if max_points is not None and start_time is not None:
+        window_end = end_time if end_time is not None else time.time()
+        expected_samples = (window_end - start_time) * db_sensor.sensor_data_rate
+        if expected_samples > max_points:
+            # Serve very long windows from the rollups
+            if expected_samples > downsampling.DOWNSAMPLE_MAX_RAW_SAMPLES:
+                resolution = rollups.choose_resolution(start_time, window_end, max_points)
+                if resolution is not None:
+                    return rollups.read_rollups(db, sensor_id, resolution, start_time, end_time)[:max_points]
+            
+            # Decimate the raw range
+            series = hot_window.read_series(sensor_id, start_time, end_time)
+            if series is None:
+                series = sample_store.read_series(db, sensor_id, start_time, end_time)
+            timestamps, values = downsampling.downsample(*series, max_points, downsample)
+            return [
+                {"sensor_id": sensor_id, "timestamp": timestamp, "value": value}
+                for timestamp, value in zip(timestamps[::-1].tolist(), values[::-1].tolist())
+            ]
+        limit = max(limit, max_points)
+    
+    # Serve recent ranges from the in-memory window
+    if start_time is not None:
+        recent = hot_window.read(sensor_id, start_time, end_time, limit=limit, newest_first=True)
+        if recent is not None:
+            return recent
+    
+    # Read from row and chunk storage, newest first
+    return sample_store.read_samples(
+        db,
+        sensor_id,
+        start_time=start_time,
+        end_time=end_time,
+        limit=limit,
+        newest_first=True,
+    )
+
+@router.get(
+    "/{sensor_id}/data",
+    response_model=List[schemas.SensorDataPoint],
+    response_model_exclude_none=True,
+)
 def get_sensor_data(
     sensor_id: int, 
+    response: Response,
     limit: int = 100, 
     start_time: float = None, 
     end_time: float = None,
+    max_points: Optional[int] = Query(None, ge=1),
+    downsample: str = "lttb",
+    resolution: Optional[int] = Query(None, ge=1),
+    direction: Optional[str] = None,
+    cursor: Optional[str] = None,
+    wire_format: str = Query("json", alias="format"),
     db: Session = Depends(get_db)
 ):
-    """Get data for a specific sensor with optional time range filtering"""
+    """
+    Get data for a specific sensor with optional time range filtering
+    
+    Passing `direction` ("older" walks back from end_time newest first, "newer"
+    walks forward from start_time oldest first) returns pages keyed on
+    (timestamp, id). The X-Next-Cursor response header holds an opaque cursor
+    for the next page (absent on the last page) and X-Prev-Cursor one for
+    walking back; either is passed as `cursor` on the next request.
+    
+    When max_points is set along with start_time and the window holds more raw
+    samples than that, the series is decimated to at most max_points samples
+    with the `downsample` method ("lttb" or "minmax"). Windows holding more
+    than DOWNSAMPLE_MAX_RAW_SAMPLES samples are served from the rollup buckets
+    of the finest resolution that fits the budget instead. Passing a
+    `resolution` returns the rollup buckets of that resolution directly.
+    
+    `format=binary` returns the series as a binary batch frame (float64
+    timestamps and float32 values, see utils.wire_format), `format=delta` as a
+    JSON batch frame with t0/dt timestamps and `format=msgpack` the same
+    objects as the JSON response encoded with MessagePack.
+    """
+    if wire_format not in wire.available_formats():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format must be one of {list(wire.available_formats())}"
+        )
+    
+    points = _read_sensor_data(
+        db,
+        sensor_id,
+        response,
+        limit=limit,
+        start_time=start_time,
+        end_time=end_time,
+        max_points=max_points,
+        downsample=downsample,
+        resolution=resolution,
+        direction=direction,
+        cursor=cursor,
+    )
+    if wire_format == "json":
+        return points
+    
+    # Binary formats bypass the response model, so carry the pagination headers over
+    headers = {name: value for name, value in response.headers.items() if name.startswith("x-")}
+    if wire_format in ("binary", "delta"):
+        content = wire.encode_batch({sensor_id: wire.series_from_points(points)}, wire_format)
+    else:
+        content = wire.msgpack.packb(points)
+    return Response(content=content, media_type=wire.MEDIA_TYPES[wire_format], headers=headers)
+
+@router.get("/{sensor_id}/export")
+def export_sensor_data(
+    sensor_id: int,
+    export_format: str = Query("ndjson", alias="format"),
+    start_time: float = None,
+    end_time: float = None,
+    gzip: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Stream every sample of a sensor in a time range as NDJSON, CSV or Arrow IPC
+    
+    Samples are read through a server-side cursor and encoded batch by batch,
+    so memory use stays constant regardless of the size of the range.
+    """
     # Check if sensor exists
     db_sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
     if db_sensor is None:
@@ -234,16 +534,184 @@ def get_sensor_data(
             detail=f"Sensor with ID {sensor_id} not found"
         )
     
-    # Build query
-    query = db.query(models.SensorData).filter(models.SensorData.sensor_id == sensor_id)
+    batches = export.iter_sample_batches(db, sensor_id, start_time, end_time)
+    try:
+        body = export.export_stream(batches, export_format, compress=gzip)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # Apply time range filters if provided
-    if start_time is not None:
-        query = query.filter(models.SensorData.timestamp >= start_time)
-    if end_time is not None:
-        query = query.filter(models.SensorData.timestamp <= end_time)
+    _, media_type, extension = export.FORMATS[export_format]
+    filename = f"sensor_{sensor_id}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/{sensor_id}/stats", response_model=schemas.SensorStats)
+def get_sensor_stats(
+    sensor_id: int,
+    start_time: float,
+    end_time: float = None,
+    percentiles: Optional[List[float]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Get summary statistics of a sensor over a time window
+    
+    Mean, std, RMS, min/max, percentiles and the zero-crossing rate are computed
+    with NumPy over the raw samples. Windows holding more than
+    STATS_MAX_RAW_SAMPLES samples are summarized from the whole rollup buckets
+    inside the window plus the raw samples of the partial buckets at its edges,
+    which gives exact moments and extremes but no percentiles or crossings.
+    """
+    # Check if sensor exists
+    db_sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+    if db_sensor is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sensor with ID {sensor_id} not found"
+        )
+    if percentiles is not None and not all(0 <= p <= 100 for p in percentiles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Percentiles must be between 0 and 100"
+        )
+    
+    window_end = end_time if end_time is not None else time.time()
+    result = {"sensor_id": sensor_id, "start_time": start_time, "end_time": window_end}
+    
+    expected_samples = (window_end - start_time) * db_sensor.sensor_data_rate
+    resolution = rollups.choose_resolution(start_time, window_end, window_stats.STATS_MAX_ROLLUP_BUCKETS)
+    if expected_samples > window_stats.STATS_MAX_RAW_SAMPLES and resolution is not None:
+        # Whole buckets come from the rollups and the partial ones at the edges from the raw samples
+        first_bucket = math.ceil(start_time / resolution) * resolution
+        last_bucket_end = max(math.floor(window_end / resolution) * resolution, first_bucket)
+        buckets = [
+            bucket for bucket in rollups.read_rollups(db, sensor_id, resolution, first_bucket, window_end, newest_first=False)
+            if bucket["timestamp"] + resolution <= last_bucket_end
+        ]
+        head = sample_store.read_series(db, sensor_id, start_time, min(first_bucket, window_end))
+        tail = sample_store.read_series(db, sensor_id, last_bucket_end, window_end)
+        edge_values = [value for timestamp, value in zip(*head) if timestamp < first_bucket] + list(tail[1])
+        result.update(window_stats.rollup_stats(buckets, edge_values), source="rollups", resolution=resolution)
+        return result
+    
+    series = hot_window.read_series(sensor_id, start_time, window_end)
+    if series is None:
+        series = sample_store.read_series(db, sensor_id, start_time, window_end)
+    stats = window_stats.raw_stats(*series, percentiles=window_stats.DEFAULT_PERCENTILES if percentiles is None else percentiles)
+    result.update(stats, source="raw")
+    return result
+
+@router.get("/{sensor_id}/spectrum", response_model=schemas.SpectralAnalysis, response_model_exclude_none=True)
+def get_sensor_spectrum(
+    sensor_id: int,
+    start_time: float,
+    end_time: float = None,
+    segment_seconds: float = Query(120.0, ge=10.0),
+    overlap: float = Query(0.5, ge=0.0, lt=1.0),
+    spectrogram: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the Welch power spectrum of a sensor window with its EGG metrics
+    
+    Returns the dominant frequency in cycles per minute, the power and power
+    ratio of the bradygastria, normogastria and tachygastria bands, the averaged
+    spectrum and, with spectrogram=true, the spectrum of every segment.
+    Segments sit on a fixed time grid and their periodograms are cached, so
+    polling a live window only computes the segments completed since the last
+    request.
+    """
+    # Check if sensor exists
+    db_sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+    if db_sensor is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sensor with ID {sensor_id} not found"
+        )
+    
+    window_end = end_time if end_time is not None else time.time()
+    if window_end - start_time < segment_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The window must be at least segment_seconds ({segment_seconds} s) long"
+        )
+    
+    def read_series(start: float, end: float):
+        series = hot_window.read_series(sensor_id, start, end)
+        return series if series is not None else sample_store.read_series(db, sensor_id, start, end)
+    
+    analysis = spectral.analyze(
+        read_series,
+        sensor_id,
+        db_sensor.sensor_data_rate,
+        start_time,
+        window_end,
+        segment_seconds,
+        overlap,
+        spectrogram=spectrogram,
+    )
+    return dict(analysis, sensor_id=sensor_id, start_time=start_time, end_time=window_end)
+
+def _queue_samples(sensor_id: int, data_rate: float, timestamps, values) -> bool:
+    """Size the sensor's hot window and queue its samples on the ingest writer (blocking, see run_blocking)"""
+    if sensor_id not in hot_window.rates:
+        hot_window.configure(sensor_id, data_rate)
+    return ingest_writer.submit_many([(sensor_id, timestamps, values)])
+
+@router.post("/{sensor_id}/data", response_model=schemas.IngestResult, status_code=status.HTTP_201_CREATED)
+async def ingest_sensor_data(sensor_id: int, request: Request):
+    """
+    Ingest a batch of samples for a sensor
+    
+    The body format is chosen by the Content-Type header:
+    - application/json: {"timestamps": [...], "values": [...]},
+      {"start_time": t0, "rate": hz, "values": [...]} or [[timestamp, value], ...]
+    - application/x-ndjson: one [timestamp, value] or {"timestamp", "value"} per line
+    - application/octet-stream: a binary header (see ingest_formats.BINARY_HEADER)
+      followed by packed float32/float64 values
+    
+    Samples are queued on the group-commit ingest writer, so many small batches
+    share one commit. When the writer queue is full the batch is refused with
+    503 and a Retry-After header, and nothing is stored. Parsing and queueing
+    run on the executor, so large batches do not stall the websocket broadcasts.
+    """
+    body = await request.body()
+    try:
+        timestamps, values = await run_blocking(parse_batch, request.headers.get("content-type"), body)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # Check if sensor exists (from the registry, without querying)
+    await sensor_registry.ensure_loaded()
+    sensor = sensor_registry.get(sensor_id)
+    if sensor is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sensor with ID {sensor_id} not found"
+        )
+    
+    if not await run_blocking(_queue_samples, sensor_id, sensor["data_rate"], timestamps, values):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": str(max(math.ceil(ingest_writer.flush_interval), 1))}
+        )
     
-    # Order by timestamp (newest first) and limit results
-    data = query.order_by(models.SensorData.timestamp.desc()).limit(limit).all()
+    # Forward to live websocket subscribers
+    await forward_samples(sensor_id, timestamps, values)
     
-    return data
+    return {
+        "sensor_id": sensor_id,
+        "accepted": len(values),
+        "start_time": min(timestamps),
+        "end_time": max(timestamps),
+    }
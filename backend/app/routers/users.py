@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 
 from .. import models, schemas
 from ..database import get_db
+from ..utils.response_cache import listing_cache
 
 router = APIRouter(
     prefix="/api/users",
@@ -11,6 +13,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Serializes the cached user listing
+users_adapter = TypeAdapter(List[schemas.UserWithSensors])
+
 @router.post("/", response_model=schemas.UserInDB, status_code=status.HTTP_201_CREATED)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """Create a new user"""
@@ -26,14 +31,30 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = models.User(**user.dict())
     db.add(db_user)
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_user)
     return db_user
 
 @router.get("/", response_model=List[schemas.UserWithSensors])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users with their sensors"""
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+def read_users(request: Request, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Get all users with their sensors
+    
+    Pass the ID of the last user of a page as `after_id` to get the next page
+    with an index seek instead of an OFFSET scan. Responses carry an ETag and
+    are cached until a user, sensor or assignment changes.
+    """
+    def render() -> bytes:
+        # Load the sensors of the whole page with one extra query
+        query = db.query(models.User).options(selectinload(models.User.sensors)).order_by(models.User.id)
+        if after_id is not None:
+            query = query.filter(models.User.id > after_id)
+        else:
+            query = query.offset(skip)
+        users = query.limit(limit).all()
+        return users_adapter.dump_json(users_adapter.validate_python(users, from_attributes=True))
+    
+    return listing_cache.respond(request, ("users", skip, limit, after_id), render)
 
 @router.get("/{user_id}", response_model=schemas.UserWithSensors)
 def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -62,6 +83,7 @@ def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(ge
         setattr(db_user, key, value)
     
     db.commit()
+    listing_cache.invalidate()
     db.refresh(db_user)
     return db_user
 
@@ -77,6 +99,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_user)
     db.commit()
+    listing_cache.invalidate()
     return None
 
 @router.post("/{user_id}/sensors/{sensor_id}", response_model=schemas.UserWithSensors)
@@ -102,6 +125,7 @@ def assign_sensor_to_user(user_id: int, sensor_id: int, db: Session = Depends(ge
     if db_sensor not in db_user.sensors:
         db_user.sensors.append(db_sensor)
         db.commit()
+        listing_cache.invalidate()
         db.refresh(db_user)
     
     return db_user
@@ -129,6 +153,7 @@ def remove_sensor_from_user(user_id: int, sensor_id: int, db: Session = Depends(
     if db_sensor in db_user.sensors:
         db_user.sensors.remove(db_sensor)
         db.commit()
+        listing_cache.invalidate()
         db.refresh(db_user)
     
     return db_user
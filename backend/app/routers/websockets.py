@@ -1,16 +1,30 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
+import hmac
 import json
 import asyncio
+import os
 import time
 
 from .. import models, schemas
-from ..database import get_db
+from ..database import run_db
+from ..utils.hot_window import hot_window
+from ..utils.ingest_formats import parse_ingest_frame, parse_json_payload
+from ..utils.ingest_writer import ingest_writer
+from ..utils.backfill import backfill_frames, parse_max_points, parse_time_range, read_backfill
+from ..utils.connection_writer import ConnectionWriter
 from ..utils.mock_data_generator import MockDataGenerator
+from ..utils.sensor_registry import sensor_registry
+from ..utils.tick_schedule import TickClock, parse_tick_ms, server_interval
+from ..utils.wire_format import Frame, Series, encode_sensor, join_batch, negotiate, series_from_points
 
 router = APIRouter(prefix="/api", tags=["websockets"])
 
+# Tokens accepted from device gateways on the ingest websocket (comma-separated);
+# the endpoint rejects every connection while none are configured
+INGEST_TOKENS = {token.strip() for token in os.getenv("INGEST_TOKENS", "").split(",") if token.strip()}
+
 # Store active connections
 class ConnectionManager:
     def __init__(self):
@@ -19,75 +33,300 @@ class ConnectionManager:
         # All connections for the global endpoint
         self.global_connections: Set[WebSocket] = set()
         # Subscriptions for each global connection
-        self.global_subscriptions: Dict[WebSocket, List[int]] = {}
+        self.global_subscriptions: Dict[WebSocket, Set[int]] = {}
+        # Inverted index of global_subscriptions: sensor_id -> subscribed global connections
+        self.sensor_subscribers: Dict[int, Set[WebSocket]] = {}
+        # Number of connections (single-sensor or global) following each sensor
+        self.sensor_refs: Dict[int, int] = {}
+        # Wire format negotiated by each connection ("json", "delta", "binary" or "msgpack")
+        self.wire_formats: Dict[WebSocket, str] = {}
+        # Outbound queue and writer task of each connection
+        self.writers: Dict[WebSocket, ConnectionWriter] = {}
+        # Broadcast tick requested by global connections, in seconds (others follow the server tick)
+        self.tick_intervals: Dict[WebSocket, float] = {}
+        # Samples held back for connections on a slower tick: requested interval
+        # (None for the server tick) -> [due time, batch]
+        self.tick_buffers: Dict[Optional[float], list] = {}
     
     async def connect(self, websocket: WebSocket, sensor_id: int = None):
-        await websocket.accept()
+        # Data frames use the format requested with ?format= or a subprotocol
+        wire_format, subprotocol = negotiate(
+            websocket.query_params.get("format"), websocket.scope.get("subprotocols", ())
+        )
+        await websocket.accept(subprotocol=subprotocol)
+        self.register(websocket, sensor_id, wire_format)
+    
+    def register(self, websocket: WebSocket, sensor_id: int = None, wire_format: str = "json"):
+        """Track an accepted connection and start its writer task (must run on the event loop)"""
+        self.wire_formats[websocket] = wire_format
+        writer = ConnectionWriter(websocket, wire_format, on_close=lambda: self.disconnect(websocket, sensor_id))
+        self.writers[websocket] = writer
+        writer.start()
         if sensor_id is not None:
             # Single sensor connection
             if sensor_id not in self.active_connections:
                 self.active_connections[sensor_id] = set()
-            self.active_connections[sensor_id].add(websocket)
+            if websocket not in self.active_connections[sensor_id]:
+                self.active_connections[sensor_id].add(websocket)
+                self._add_ref(sensor_id)
         else:
             # Global connection
             self.global_connections.add(websocket)
-            self.global_subscriptions[websocket] = []
+            self.global_subscriptions.setdefault(websocket, set())
     
     def disconnect(self, websocket: WebSocket, sensor_id: int = None):
+        self.wire_formats.pop(websocket, None)
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            writer.stop()
+        self.tick_intervals.pop(websocket, None)
         if sensor_id is not None:
             # Single sensor connection
-            if sensor_id in self.active_connections:
+            if websocket in self.active_connections.get(sensor_id, ()):
                 self.active_connections[sensor_id].discard(websocket)
+                self._remove_ref(sensor_id)
                 if not self.active_connections[sensor_id]:
                     del self.active_connections[sensor_id]
         else:
             # Global connection
             self.global_connections.discard(websocket)
             if websocket in self.global_subscriptions:
+                self.remove_subscriptions(websocket, list(self.global_subscriptions[websocket]))
                 del self.global_subscriptions[websocket]
     
+    def _add_ref(self, sensor_id: int) -> None:
+        self.sensor_refs[sensor_id] = self.sensor_refs.get(sensor_id, 0) + 1
+    
+    def _remove_ref(self, sensor_id: int) -> None:
+        self.sensor_refs[sensor_id] -= 1
+        if not self.sensor_refs[sensor_id]:
+            del self.sensor_refs[sensor_id]
+    
+    def active_sensors(self):
+        """Get the IDs of the sensors followed by at least one connection (a live view, not a copy)"""
+        return self.sensor_refs.keys()
+    
     def subscribe_global(self, websocket: WebSocket, sensor_ids: List[int]):
-        """Subscribe a global connection to specific sensors"""
+        """Replace the subscriptions of a global connection"""
         if websocket in self.global_subscriptions:
-            self.global_subscriptions[websocket] = sensor_ids
+            wanted = set(sensor_ids)
+            current = self.global_subscriptions[websocket]
+            self.remove_subscriptions(websocket, list(current - wanted))
+            self.add_subscriptions(websocket, list(wanted - current))
+    
+    def add_subscriptions(self, websocket: WebSocket, sensor_ids: List[int]):
+        """Subscribe a global connection to more sensors"""
+        subscriptions = self.global_subscriptions.get(websocket)
+        if subscriptions is None:
+            return
+        for sensor_id in sensor_ids:
+            if sensor_id not in subscriptions:
+                subscriptions.add(sensor_id)
+                self.sensor_subscribers.setdefault(sensor_id, set()).add(websocket)
+                self._add_ref(sensor_id)
+    
+    def remove_subscriptions(self, websocket: WebSocket, sensor_ids: List[int]):
+        """Unsubscribe a global connection from some sensors"""
+        subscriptions = self.global_subscriptions.get(websocket)
+        if subscriptions is None:
+            return
+        for sensor_id in sensor_ids:
+            if sensor_id in subscriptions:
+                subscriptions.discard(sensor_id)
+                subscribers = self.sensor_subscribers[sensor_id]
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.sensor_subscribers[sensor_id]
+                self._remove_ref(sensor_id)
+    
+    def set_tick(self, websocket: WebSocket, tick_ms: Optional[int]):
+        """Set the broadcast tick of a global connection (None follows the server tick)"""
+        if tick_ms is None:
+            self.tick_intervals.pop(websocket, None)
+        elif websocket in self.global_connections:
+            self.tick_intervals[websocket] = tick_ms / 1000.0
+    
+    def hold(self, websocket: WebSocket):
+        """Hold the live frames of a connection back until release()"""
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.hold()
     
-    async def broadcast_to_sensor(self, sensor_id: int, data: dict):
-        # Add sensor_id to the data
-        data["sensor_id"] = sensor_id
+    def release(self, websocket: WebSocket, frames: List[Frame] = ()):
+        """Queue frames ahead of the live frames held since hold() and resume"""
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.release(frames)
+    
+    def base_interval(self, server_tick: float) -> float:
+        """Get the broadcast interval: the server tick or the fastest tick a connection asked for"""
+        return min([server_tick, *self.tick_intervals.values()])
+    
+    async def send_batch(
+        self,
+        batch: Dict[int, Series],
+        sensor_connections: bool = True,
+        recipients: Optional[Set[WebSocket]] = None,
+    ) -> None:
+        """
+        Queue a batch_data frame for every connection following sensors in the batch
         
-        # Send to specific sensor connections
-        if sensor_id in self.active_connections:
-            # Create a copy of the set to avoid modification during iteration
-            websockets_to_process = list(self.active_connections[sensor_id])
-            disconnected_websockets = set()
-            
-            for websocket in websockets_to_process:
-                try:
-                    await websocket.send_json(data)
-                except Exception as e:
-                    print(f"Error sending to websocket: {e}")
-                    disconnected_websockets.add(websocket)
-            
-            # Clean up any disconnected websockets
-            for websocket in disconnected_websockets:
-                self.disconnect(websocket, sensor_id)
+        Global connections are grouped by wire format and by the sensors of the
+        batch they subscribe to. Each sensor's part is encoded once per format
+        and each distinct frame is assembled once, so the encoding cost follows
+        the number of distinct subscriptions rather than the number of sockets.
+        Frames go to the bounded queue of each connection and never wait on the
+        network, so a slow client cannot hold up the others (see ConnectionWriter
+        for what happens when a queue fills).
+        
+        Args:
+            batch: Maps each sensor ID to its (timestamps, values)
+            sensor_connections: Also send to the single-sensor connections
+            recipients: Only send to these global connections
+        """
+        # Sensors of the batch followed by each global connection, found through the inverted index
+        followed: Dict[WebSocket, List[int]] = {}
+        for sensor_id in batch:
+            for websocket in self.sensor_subscribers.get(sensor_id, ()):
+                if recipients is None or websocket in recipients:
+                    followed.setdefault(websocket, []).append(sensor_id)
+        
+        # (wire format, sensor IDs) -> connections
+        groups: Dict[Tuple[str, Tuple[int, ...]], List[WebSocket]] = {}
+        for websocket, sensor_ids in followed.items():
+            key = (self.wire_formats.get(websocket, "json"), tuple(sensor_ids))
+            groups.setdefault(key, []).append(websocket)
+        if sensor_connections:
+            for sensor_id in batch:
+                for websocket in list(self.active_connections.get(sensor_id, ())):
+                    key = (self.wire_formats.get(websocket, "json"), (sensor_id,))
+                    groups.setdefault(key, []).append(websocket)
+        
+        parts: Dict[Tuple[str, int], Frame] = {}
+        for (wire_format, sensor_ids), sockets in groups.items():
+            for sensor_id in sensor_ids:
+                if (wire_format, sensor_id) not in parts:
+                    parts[(wire_format, sensor_id)] = encode_sensor(sensor_id, batch[sensor_id], wire_format)
+            frame = join_batch([parts[(wire_format, sensor_id)] for sensor_id in sensor_ids], wire_format)
+            subset = {sensor_id: batch[sensor_id] for sensor_id in sensor_ids}
+            for websocket in sockets:
+                writer = self.writers.get(websocket)
+                if writer is not None:
+                    writer.enqueue(frame, subset)
+    
+    async def send_tick(self, batch: Dict[int, Series], interval: float, server_tick: Optional[float] = None) -> None:
+        """
+        Send the samples of one broadcast tick to the global connections
         
-        # Send to global connections that are subscribed to this sensor
-        global_disconnected = set()
+        Connections whose tick (the one they asked for, or the server tick)
+        matches the broadcast tick get the batch right away. The others share
+        one buffer per tick length, which is flushed as a single frame whenever
+        that tick falls due, so a client asking for a fast tick does not speed
+        up the connections that did not.
+        
+        Args:
+            batch: Maps each sensor ID to its (timestamps, values)
+            interval: The current broadcast interval in seconds
+            server_tick: The server tick in seconds, followed by connections
+                that did not ask for their own (defaults to interval)
+        """
+        if server_tick is None:
+            server_tick = interval
+        now = time.monotonic()
+        # Buffer key (requested tick, or None for the server tick) -> connections
+        slower: Dict[Optional[float], Set[WebSocket]] = {}
         for websocket in self.global_connections:
-            if websocket in self.global_subscriptions and sensor_id in self.global_subscriptions[websocket]:
-                try:
-                    await websocket.send_json(data)
-                except Exception as e:
-                    print(f"Error sending to global websocket: {e}")
-                    global_disconnected.add(websocket)
+            requested = self.tick_intervals.get(websocket)
+            tick = requested if requested is not None else server_tick
+            if tick > interval + 1e-6:
+                slower.setdefault(requested, set()).add(websocket)
+        held = set().union(*slower.values()) if slower else set()
+        direct = self.global_connections - held if held else None
+        await self.send_batch(batch, sensor_connections=False, recipients=direct)
         
-        # Clean up disconnected global connections
-        for websocket in global_disconnected:
-            self.disconnect(websocket)
+        # Drop the buffers nobody waits for any more
+        for key in [key for key in self.tick_buffers if key not in slower]:
+            del self.tick_buffers[key]
+        for key, members in slower.items():
+            tick = key if key is not None else server_tick
+            buffer = self.tick_buffers.setdefault(key, [now + tick, {}])
+            for sensor_id, (timestamps, values) in batch.items():
+                target = buffer[1].setdefault(sensor_id, ([], []))
+                target[0].extend(timestamps)
+                target[1].extend(values)
+            if now >= buffer[0] - 1e-3:
+                await self.send_batch(buffer[1], sensor_connections=False, recipients=members)
+                buffer[0] = max(buffer[0] + tick, now)
+                buffer[1] = {}
+    
+    def stats(self) -> List[Dict[str, object]]:
+        """Queue depth, lag and counters of every live connection"""
+        connections = []
+        for websocket, writer in list(self.writers.items()):
+            if websocket in self.global_connections:
+                kind, sensor_ids = "global", sorted(self.global_subscriptions.get(websocket, ()))
+            else:
+                kind = "sensor"
+                sensor_ids = [sensor_id for sensor_id, sockets in self.active_connections.items() if websocket in sockets]
+            client = getattr(websocket, "client", None)
+            tick = self.tick_intervals.get(websocket)
+            connections.append(dict(
+                writer.stats(),
+                kind=kind,
+                tick_ms=round(tick * 1000) if tick is not None else None,
+                client=f"{client.host}:{client.port}" if client else None,
+                sensor_ids=sensor_ids,
+            ))
+        return connections
 
 manager = ConnectionManager()
 
+async def build_backfill(websocket: WebSocket, sensor_ids, time_range, max_points) -> List[Frame]:
+    """
+    Build the history frames answering a subscribe message
+    
+    The last time_range seconds of each sensor are decimated to max_points
+    samples (see utils.backfill) and sent as "backfill" frames in the
+    connection's wire format, followed by a backfill_complete message.
+    
+    Returns:
+        The frames, or an empty list when time_range asks for no history
+    """
+    seconds = parse_time_range(time_range)
+    if seconds is None:
+        return []
+    end_time = time.time()
+    start_time = end_time - seconds
+    batch = await read_backfill(sensor_ids, start_time, end_time, parse_max_points(max_points))
+    frames = backfill_frames(batch, manager.wire_formats.get(websocket, "json"))
+    frames.append(json.dumps({
+        "type": "backfill_complete",
+        "sensor_ids": list(batch),
+        "start_time": start_time,
+        "end_time": end_time,
+        "samples": sum(len(values) for _, values in batch.values())
+    }))
+    return frames
+
+async def forward_samples(sensor_id: int, timestamps, values) -> None:
+    """Send ingested samples to every connection following the sensor as a batch_data frame"""
+    await manager.send_batch({sensor_id: (timestamps, values)})
+
+@router.get("/ws/status", response_model=schemas.WebSocketStatus)
+def get_websocket_status():
+    """Get the send queue depth, lag and drop counters of every live websocket connection"""
+    connections = manager.stats()
+    return {
+        "connections": connections,
+        "max_lag": max((connection["lag"] for connection in connections), default=0.0),
+    }
+
+# Blocking queries used by the ingest websocket; they run on the database executor via run_db
+def get_existing_sensor_ids(db: Session, sensor_ids: List[int]) -> Set[int]:
+    """Get which of sensor_ids exist in a single query"""
+    rows = db.query(models.Sensor.id).filter(models.Sensor.id.in_(sensor_ids))
+    return {sensor_id for (sensor_id,) in rows}
+
 @router.websocket("/ws/sensors/{sensor_id}")
 async def websocket_sensor_endpoint(websocket: WebSocket, sensor_id: int):
     """WebSocket endpoint for real-time data from a single sensor"""
@@ -95,12 +334,11 @@ async def websocket_sensor_endpoint(websocket: WebSocket, sensor_id: int):
     await manager.connect(websocket, sensor_id)
     
     try:
-        # Get database session
-        db = next(get_db())
-        
-        # Check if sensor exists
-        sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+        # Check if sensor exists (from the registry, without querying)
+        await sensor_registry.ensure_loaded()
+        sensor = sensor_registry.get(sensor_id)
         if not sensor:
+            manager.disconnect(websocket, sensor_id)
             await websocket.close(code=1000)
             return
         
@@ -108,8 +346,9 @@ async def websocket_sensor_endpoint(websocket: WebSocket, sensor_id: int):
         await websocket.send_json({
             "event": "connected",
             "sensor_id": sensor_id,
-            "sensor_name": sensor.sensor_name,
-            "data_rate": sensor.sensor_data_rate
+            "sensor_name": sensor["sensor_name"],
+            "data_rate": sensor["data_rate"],
+            "format": manager.wire_formats.get(websocket, "json")
         })
         
         # Keep connection alive and handle messages
@@ -124,33 +363,47 @@ async def websocket_sensor_endpoint(websocket: WebSocket, sensor_id: int):
             elif message.get("type") == "subscribe":
                 # Client can update subscription parameters
                 time_range = message.get("time_range", 60)  # Default 60 seconds
-                await websocket.send_json({
-                    "type": "subscription_updated",
-                    "time_range": time_range
-                })
+                
+                # Send the last time_range seconds before any further live frames
+                manager.hold(websocket)
+                frames = []
+                try:
+                    await websocket.send_json({
+                        "type": "subscription_updated",
+                        "time_range": time_range
+                    })
+                    frames = await build_backfill(websocket, [sensor_id], time_range, message.get("max_points"))
+                finally:
+                    manager.release(websocket, frames)
     
     except WebSocketDisconnect:
         manager.disconnect(websocket, sensor_id)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket, sensor_id)
-    finally:
-        db.close()
+
+def connection_tick_ms(websocket: WebSocket) -> int:
+    """Get the tick a global connection receives frames on, in milliseconds"""
+    tick = manager.tick_intervals.get(websocket)
+    if tick is None:
+        tick = server_interval(len(manager.writers))
+    return round(tick * 1000)
 
 @router.websocket("/ws/all")
 async def websocket_all_sensors_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time data from all sensors"""
     # Connect to the WebSocket
     await manager.connect(websocket)
+    # Clients may ask for their own tick with ?tick_ms= (MIN_TICK_MS to MAX_TICK_MS)
+    manager.set_tick(websocket, parse_tick_ms(websocket.query_params.get("tick_ms")))
     
     try:
-        # Get database session
-        db = next(get_db())
-        
         # Send initial message
         await websocket.send_json({
             "event": "connected",
-            "message": "Connected to all sensors endpoint"
+            "message": "Connected to all sensors endpoint",
+            "format": manager.wire_formats.get(websocket, "json"),
+            "tick_ms": connection_tick_ms(websocket)
         })
         
         # Keep connection alive and handle messages
@@ -167,126 +420,277 @@ async def websocket_all_sensors_endpoint(websocket: WebSocket):
                 time_range = message.get("time_range", 60)  # Default 60 seconds
                 sensor_ids = message.get("sensor_ids", [])  # List of sensor IDs to subscribe to
                 
-                # Update subscriptions
-                manager.subscribe_global(websocket, sensor_ids)
-                
-                # No need to send initial data - the broadcast_sensor_data task will send data immediately
-                
-                await websocket.send_json({
-                    "type": "subscription_updated",
-                    "time_range": time_range,
-                    "sensor_ids": sensor_ids
-                })
+                # Live frames wait while the history of the subscribed sensors is read,
+                # so the backfill reaches the client first. Every subscribe backfills all
+                # its sensors, like the single-sensor endpoint, since clients resend the
+                # same list when they change the time range.
+                manager.hold(websocket)
+                frames = []
+                try:
+                    # Update subscriptions
+                    manager.subscribe_global(websocket, sensor_ids)
+                    if "tick_ms" in message:
+                        manager.set_tick(websocket, parse_tick_ms(message["tick_ms"]))
+                    
+                    await websocket.send_json({
+                        "type": "subscription_updated",
+                        "time_range": time_range,
+                        "sensor_ids": sensor_ids,
+                        "tick_ms": connection_tick_ms(websocket)
+                    })
+                    frames = await build_backfill(websocket, sensor_ids, time_range, message.get("max_points"))
+                finally:
+                    manager.release(websocket, frames)
+            elif message.get("type") in ("subscribe_add", "subscribe_remove"):
+                # Incremental changes, so large dashboards do not resend their whole list
+                sensor_ids = message.get("sensor_ids", [])
+                manager.hold(websocket)
+                frames = []
+                try:
+                    if message["type"] == "subscribe_add":
+                        added = set(sensor_ids) - manager.global_subscriptions.get(websocket, set())
+                        manager.add_subscriptions(websocket, sensor_ids)
+                    else:
+                        added = set()
+                        manager.remove_subscriptions(websocket, sensor_ids)
+                    
+                    await websocket.send_json({
+                        "type": "subscription_updated",
+                        "sensor_ids": sorted(manager.global_subscriptions.get(websocket, ()))
+                    })
+                    if added:
+                        frames = await build_backfill(websocket, added, message.get("time_range", 60), message.get("max_points"))
+                finally:
+                    manager.release(websocket, frames)
     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
         manager.disconnect(websocket)
-    finally:
-        db.close()
+
+def get_ingest_token(websocket: WebSocket) -> Optional[str]:
+    """Read a gateway token from the `token` query parameter or a Bearer Authorization header"""
+    token = websocket.query_params.get("token")
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:].strip()
+    return token
+
+def is_valid_ingest_token(token: Optional[str]) -> bool:
+    if not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), known.encode()) for known in INGEST_TOKENS)
+
+async def ingest_frame(websocket: WebSocket, seq, batches: Dict[int, tuple], known_sensors: Set[int]) -> None:
+    """Queue the samples of one ingest frame, acknowledge it and fan it out to subscribers"""
+    # Check sensors this connection has not sent before
+    unknown = set(batches) - known_sensors
+    if unknown:
+        existing = await run_db(get_existing_sensor_ids, list(unknown))
+        known_sensors.update(existing)
+        missing = unknown - existing
+        if missing:
+            await websocket.send_json({
+                "type": "error",
+                "seq": seq,
+                "detail": f"Unknown sensor IDs: {sorted(missing)}"
+            })
+            return
+    
+    # Size the in-memory windows from the sensors' rates, as the HTTP ingest path does
+    await sensor_registry.ensure_loaded()
+    for sensor_id in batches:
+        sensor = sensor_registry.get(sensor_id)
+        if sensor_id not in hot_window.rates and sensor is not None:
+            hot_window.configure(sensor_id, sensor["data_rate"])
+    
+    # Queue everything or nothing; when the writer is behind, ask the gateway to retry
+    items = [(sensor_id, timestamps, values) for sensor_id, (timestamps, values) in batches.items()]
+    if not ingest_writer.submit_many(items):
+        await websocket.send_json({
+            "type": "backpressure",
+            "seq": seq,
+            "queue_depth": ingest_writer.queue_depth(),
+            "queue_capacity": ingest_writer.max_pending,
+            "retry_after": ingest_writer.flush_interval
+        })
+        return
+    
+    await websocket.send_json({
+        "type": "ack",
+        "seq": seq,
+        "accepted": sum(len(values) for _, _, values in items),
+        "queue_depth": ingest_writer.queue_depth(),
+        "queue_capacity": ingest_writer.max_pending
+    })
+    
+    # Fan out to live subscribers
+    for sensor_id, timestamps, values in items:
+        await forward_samples(sensor_id, timestamps, values)
+
+@router.websocket("/ws/ingest")
+async def websocket_ingest_endpoint(websocket: WebSocket):
+    """
+    WebSocket endpoint for device gateways streaming samples
+    
+    Gateways authenticate with a token from INGEST_TOKENS and send either text
+    frames {"type": "samples", "seq": n, "sensors": {"<sensor_id>": batch}}, where
+    each batch uses one of the JSON shapes of the bulk ingest endpoint, or binary
+    frames (ingest_formats.INGEST_FRAME_HEADER followed by a binary batch). Every
+    frame is answered with an ack, a backpressure message when the writer queue
+    is full (the frame is not stored and should be resent), or an error.
+    """
+    if not is_valid_ingest_token(get_ingest_token(websocket)):
+        # Policy violation
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    await websocket.send_json({
+        "event": "connected",
+        "queue_capacity": ingest_writer.max_pending
+    })
+    
+    known_sensors: Set[int] = set()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            seq = None
+            try:
+                if message.get("bytes") is not None:
+                    seq, sensor_id, batch = parse_ingest_frame(message["bytes"])
+                    batches = {sensor_id: batch}
+                else:
+                    frame = json.loads(message["text"])
+                    if frame.get("type") == "ping":
+                        await websocket.send_json({"type": "pong"})
+                        continue
+                    seq = frame.get("seq")
+                    if frame.get("type") != "samples" or not isinstance(frame.get("sensors"), dict):
+                        raise ValueError("Expected a samples frame with a 'sensors' object")
+                    batches = {
+                        int(sensor_id): parse_json_payload(batch)
+                        for sensor_id, batch in frame["sensors"].items()
+                    }
+            except (ValueError, TypeError, AttributeError) as e:
+                await websocket.send_json({"type": "error", "seq": seq, "detail": str(e)})
+                continue
+            
+            await ingest_frame(websocket, seq, batches, known_sensors)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Ingest WebSocket error: {e}")
 
 # Create a global instance of the mock data generator
 mock_data_generator = MockDataGenerator()
 
+def mock_rate(data_rate: float) -> float:
+    """Rate at which the broadcaster generates mock samples for a sensor data rate"""
+    return round(data_rate / 100, 0)
+
+# Event loop running the broadcaster, which owns mock_data_generator (None until it starts)
+broadcast_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def update_mock_sensor(sensor_id: int, info: Optional[Dict]) -> None:
+    """Apply a sensor registry change to the mock generator (must run on the broadcast loop)"""
+    if info is None or not info["is_active"]:
+        mock_data_generator.remove_sensor(sensor_id)
+    elif sensor_id in mock_data_generator.sensor_data_rates:
+        mock_data_generator.update_sensor_data_rate(sensor_id, mock_rate(info["data_rate"]))
+
+def apply_sensor_change(sensor_id: int, info: Optional[Dict]) -> None:
+    """
+    Apply sensor registry changes to the mock generator right away instead of at the next tick
+    
+    Registry changes come from threadpool route handlers and mock data threads,
+    while the broadcaster iterates the generator on the event loop, so the
+    change is handed to that loop instead of being applied from the caller's thread.
+    """
+    loop = broadcast_loop
+    if loop is None or loop.is_closed():
+        update_mock_sensor(sensor_id, info)
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        update_mock_sensor(sensor_id, info)
+    else:
+        loop.call_soon_threadsafe(update_mock_sensor, sensor_id, info)
+
+sensor_registry.add_listener(apply_sensor_change)
+
 # Background task to broadcast sensor data to connected clients
 async def broadcast_sensor_data():
     """Generate mock data for each sensor based on data_rate and broadcast to connected clients"""
-    # Time between broadcasts in seconds
-    broadcast_interval = 1.0
+    global broadcast_loop
+    broadcast_loop = asyncio.get_running_loop()
+    
+    # Ticks follow the monotonic clock; the interval is the server tick (WS_TICK_MS, or adaptive)
+    # or the fastest tick a connection asked for
+    clock = TickClock()
+    server_tick = server_interval(len(manager.writers))
+    broadcast_interval = manager.base_interval(server_tick)
     
     while True:
         try:
-            # Get all active sensors (from both specific and global connections)
-            active_sensors = set()
+            started = time.monotonic()
             
-            # Add sensors from specific connections
-            for sensor_id in manager.active_connections.keys():
-                active_sensors.add(sensor_id)
-            
-            # Add sensors from global subscriptions
-            for subscriptions in manager.global_subscriptions.values():
-                active_sensors.update(subscriptions)
+            # Get all active sensors (from both specific and global connections)
+            active_sensors = set(manager.active_sensors())
             
             # Only process if there are active sensors
             if active_sensors:
                 # Get current timestamp
                 current_time = time.time()
                 
-                # Get database session
-                db = next(get_db())
-                
+                # Look up which sensors are active, and their data rates, in the sensor registry
+                # (loaded once on the database executor, then kept current by the sensor routes)
                 try:
-                    # Prepare batch data for all sensors
-                    batch_data = {}
-                    
-                    # Create a list of sensors to process (to avoid modifying the set during iteration)
+                    await sensor_registry.ensure_loaded()
+                    sensor_rates = sensor_registry.active_rates(active_sensors)
+                except Exception as e:
+                    print(f"Error loading sensor status: {e}")
+                    sensor_rates = None
+                
+                if sensor_rates is not None:
                     sensors_to_process = []
-                    inactive_sensors = []
                     
-                    # First, check which sensors are active by querying the database for all sensors
-                    # This ensures we always have the latest active status
                     for sensor_id in active_sensors:
-                        # Always query the database to get the latest active status
-                        sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
-                        if sensor and sensor.is_active:
+                        if sensor_id in sensor_rates:
                             # Only include active sensors
                             sensors_to_process.append(sensor_id)
                             # Update the data rate in case it changed
-                            mock_data_generator.update_sensor_data_rate(sensor_id, round(sensor.sensor_data_rate / 100, 0))
+                            mock_data_generator.update_sensor_data_rate(sensor_id, mock_rate(sensor_rates[sensor_id]))
                         else:
-                            # Track inactive sensors to remove later
-                            inactive_sensors.append(sensor_id)
-                    
-                    # Remove inactive sensors from the active_sensors set
-                    for sensor_id in inactive_sensors:
-                        active_sensors.discard(sensor_id)
-                        mock_data_generator.remove_sensor(sensor_id)
+                            # Stop tracking inactive sensors
+                            mock_data_generator.remove_sensor(sensor_id)
                     
                     # Prepare batch data for all sensors
                     batch_data = {}
                     
-                    # For each active sensor, generate data points
+                    # For each active sensor, generate the data points due since the last tick
                     for sensor_id in sensors_to_process:
-                        # Generate data points using the mock data generator
-                        data_points = mock_data_generator.generate_data_points(
-                            sensor_id,
-                            current_time,
-                            broadcast_interval
-                        )
-                        
-                        # Add to batch data
-                        batch_data[sensor_id] = data_points
-                        
-                        data_rate = mock_data_generator.sensor_data_rates.get(sensor_id, 0)
-                        print(f"Generated {len(data_points)} points for sensor {sensor_id} (data_rate: {data_rate}Hz)")
+                        data_points = mock_data_generator.generate_until(sensor_id, current_time)
+                        if data_points:
+                            batch_data[sensor_id] = series_from_points(data_points)
                     
-                    # Broadcast batch data to all global connections
+                    # Broadcast batch data to the global connections
                     if batch_data:
-                        print(f"Broadcasting mock data for {len(batch_data)} sensors")
-                        for websocket in manager.global_connections:
-                            try:
-                                # Only send data for sensors this connection is subscribed to
-                                if websocket in manager.global_subscriptions:
-                                    subscribed_sensors = manager.global_subscriptions[websocket]
-                                    filtered_batch = {
-                                        sensor_id: data
-                                        for sensor_id, data in batch_data.items()
-                                        if sensor_id in subscribed_sensors
-                                    }
-                                    
-                                    if filtered_batch:
-                                        await websocket.send_json({
-                                            "event": "batch_data",
-                                            "data": filtered_batch
-                                        })
-                            except Exception as e:
-                                print(f"Error sending batch data to websocket: {e}")
-                finally:
-                    db.close()
+                        await manager.send_tick(batch_data, broadcast_interval, server_tick)
             
-            # Sleep before generating new data
-            await asyncio.sleep(broadcast_interval)
+            # Sleep until the next tick, measured from the previous deadline rather than from now
+            busy = time.monotonic() - started
+            server_tick = server_interval(len(manager.writers), busy)
+            broadcast_interval = manager.base_interval(server_tick)
+            await asyncio.sleep(clock.delay(broadcast_interval))
         except Exception as e:
             print(f"Broadcast error: {e}")
             await asyncio.sleep(1)  # Wait a bit longer on error
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 # User schemas
 class UserBase(BaseModel):
@@ -23,6 +23,8 @@ class UserInDB(UserBase):
 class SensorBase(BaseModel):
     sensor_name: str
     sensor_data_rate: float = Field(ge=1.0, default=100.0)  # Data rate must be at least 1Hz
+    raw_retention_hours: Optional[float] = Field(default=None, gt=0)  # Falls back to the global policy
+    rollup_retention_days: Optional[float] = Field(default=None, gt=0)
 
 class SensorCreate(SensorBase):
     pass
@@ -47,12 +49,131 @@ class SensorDataCreate(SensorDataBase):
     sensor_id: int
 
 class SensorDataInDB(SensorDataBase):
-    id: int
+    id: Optional[int] = None  # Samples decoded from packed chunks have no row ID
     sensor_id: int
     
     class Config:
         orm_mode = True
 
+class SensorDataPoint(SensorDataInDB):
+    """A raw sample, or a rollup bucket when a resolution is set (value is the bucket mean)"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: Optional[int] = None
+    rms: Optional[float] = None
+    resolution: Optional[int] = None
+
+# Result of a bulk ingest request
+class IngestResult(BaseModel):
+    sensor_id: int
+    accepted: int
+    start_time: float
+    end_time: float
+
+# Ingest writer status
+class IngestStatus(BaseModel):
+    running: bool
+    queue_depth: int
+    queue_capacity: int
+    batch_size: int
+    flush_interval: float
+    samples_written: int
+    batches_written: int
+    samples_rejected: int
+    samples_dropped: int
+    write_retries: int
+    last_flush_duration: float
+    last_error: Optional[str] = None
+
+# In-memory hot window status
+class HotWindowSensorStatus(BaseModel):
+    capacity: int
+    samples: int
+    memory_bytes: int
+    complete_from: Optional[float] = None  # Every sample at or after this time is held in memory
+    newest: Optional[float] = None
+
+class HotWindowStatus(BaseModel):
+    window_seconds: float
+    total_memory_bytes: int
+    sensors: Dict[int, HotWindowSensorStatus] = {}
+
+# Live websocket connection status
+class WebSocketConnectionStatus(BaseModel):
+    kind: str  # "sensor" or "global"
+    client: Optional[str] = None
+    tick_ms: Optional[int] = None  # Tick requested by the connection, None follows the server tick
+    sensor_ids: List[int] = []
+    wire_format: str
+    policy: str  # What happens when the send queue is full
+    queued: int
+    queue_capacity: int
+    lag: float  # Seconds the oldest queued frame has been waiting
+    frames_sent: int
+    frames_dropped: int
+    frames_coalesced: int
+    last_send_duration: float
+
+class WebSocketStatus(BaseModel):
+    max_lag: float
+    connections: List[WebSocketConnectionStatus] = []
+
+# Retention job report
+class RetentionReport(BaseModel):
+    started_at: Optional[float] = None
+    duration: float = 0.0
+    raw_rows_deleted: int = 0
+    chunks_deleted: int = 0
+    rollups_deleted: int = 0
+    bytes_freed: int = 0  # Space released to the SQLite free list by the deletes
+    bytes_vacuumed: int = 0  # Space returned to the file system by incremental vacuum
+    completed: bool = True  # False when the run stopped at its time budget
+
+# Summary statistics of a sensor over a window
+class SensorStats(BaseModel):
+    sensor_id: int
+    start_time: float
+    end_time: float
+    source: str  # "raw" or "rollups"
+    resolution: Optional[int] = None  # Rollup resolution used, in seconds
+    count: int = 0
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    rms: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    percentiles: Optional[Dict[str, float]] = None  # Only computed from raw samples
+    zero_crossings: Optional[int] = None  # Crossings of the mean, only computed from raw samples
+    zero_crossing_rate: Optional[float] = None  # Per second
+
+# Spectral analysis of a sensor window
+class SpectralBand(BaseModel):
+    name: str
+    low_cpm: float
+    high_cpm: float
+    power: float
+    ratio: Optional[float] = None  # Share of the power in the whole EGG range
+
+class SpectrogramSegment(BaseModel):
+    start_time: float
+    dominant_frequency_cpm: Optional[float] = None
+    psd: List[float]
+
+class SpectralAnalysis(BaseModel):
+    sensor_id: int
+    start_time: float
+    end_time: float
+    sample_rate: float  # Rate the signal was resampled to, in Hz
+    segment_seconds: float
+    overlap: float
+    segments: int  # Number of Welch segments averaged
+    dominant_frequency_cpm: Optional[float] = None
+    dominant_power: Optional[float] = None
+    bands: List[SpectralBand] = []
+    frequencies_cpm: List[float] = []
+    psd: List[float] = []
+    spectrogram: Optional[List[SpectrogramSegment]] = None
+
 # Response schemas with relationships
 class SensorWithData(SensorInDB):
     data: List[SensorDataInDB] = []
@@ -0,0 +1,117 @@
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..database import run_db
+from . import downsampling, rollups, sample_store
+from .hot_window import hot_window
+from .sensor_registry import sensor_registry
+from .wire_format import Frame, Series, encode_batch
+
+# History sent to websocket viewers when they subscribe (overridable through environment variables)
+WS_BACKFILL_MAX_SECONDS = float(os.getenv("WS_BACKFILL_MAX_SECONDS", "3600"))  # Longest time_range backfilled
+WS_BACKFILL_MAX_POINTS = int(os.getenv("WS_BACKFILL_MAX_POINTS", "2000"))  # Samples per sensor, unless the client asks for fewer
+WS_BACKFILL_CHUNK_SAMPLES = int(os.getenv("WS_BACKFILL_CHUNK_SAMPLES", "5000"))  # Samples per backfill frame
+
+def parse_time_range(value) -> Optional[float]:
+    """
+    Read the time_range of a subscribe message
+
+    Returns:
+        The seconds to backfill, capped at WS_BACKFILL_MAX_SECONDS, or None if
+        the value is not a positive number (no backfill)
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not seconds > 0:
+        return None
+    return min(seconds, WS_BACKFILL_MAX_SECONDS)
+
+def parse_max_points(value) -> int:
+    """Read the max_points of a subscribe message, capped at WS_BACKFILL_MAX_POINTS"""
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return min(value, WS_BACKFILL_MAX_POINTS)
+    return WS_BACKFILL_MAX_POINTS
+
+def decimate(series: Series, max_points: int) -> Series:
+    """Reduce a series to at most max_points samples with LTTB"""
+    timestamps, values = series
+    if len(values) <= max_points:
+        return list(timestamps), list(values)
+    timestamps, values = downsampling.downsample(timestamps, values, max_points, "lttb")
+    return timestamps.tolist(), values.tolist()
+
+def read_stored(db: Session, data_rates: Dict[int, float], start_time: float, end_time: float, max_points: int) -> Dict[int, Series]:
+    """
+    Read backfill ranges from storage, one range query per sensor
+
+    Windows holding more than DOWNSAMPLE_MAX_RAW_SAMPLES samples are read from
+    the rollup means instead of the raw samples.
+    """
+    batch = {}
+    for sensor_id, data_rate in data_rates.items():
+        resolution = None
+        if (end_time - start_time) * data_rate > downsampling.DOWNSAMPLE_MAX_RAW_SAMPLES:
+            resolution = rollups.choose_resolution(start_time, end_time, max_points)
+        if resolution is not None:
+            buckets = rollups.read_rollups(db, sensor_id, resolution, start_time, end_time, newest_first=False)
+            series = [bucket["timestamp"] for bucket in buckets], [bucket["value"] for bucket in buckets]
+        else:
+            series = sample_store.read_series(db, sensor_id, start_time, end_time)
+        batch[sensor_id] = decimate(series, max_points)
+    return batch
+
+async def read_backfill(sensor_ids: Iterable[int], start_time: float, end_time: float, max_points: int) -> Dict[int, Series]:
+    """
+    Read the recent history of sensors, decimated to max_points samples each
+
+    Ranges inside the hot window are read from memory; the others are read
+    from storage in a single call on the database executor. Unknown sensors
+    are left out.
+
+    Returns:
+        A batch mapping each sensor ID to its (timestamps, values) in time order
+    """
+    await sensor_registry.ensure_loaded()
+    batch = {}
+    data_rates = {}
+    for sensor_id in sorted(set(sensor_ids)):
+        info = sensor_registry.get(sensor_id)
+        if info is None:
+            continue
+        series = hot_window.read_series(sensor_id, start_time, end_time)
+        if series is None:
+            data_rates[sensor_id] = info["data_rate"]
+        else:
+            batch[sensor_id] = decimate(series, max_points)
+    if data_rates:
+        batch.update(await run_db(read_stored, data_rates, start_time, end_time, max_points))
+    return {sensor_id: batch[sensor_id] for sensor_id in sorted(batch)}
+
+def chunk_batch(batch: Dict[int, Series], chunk_samples: int = WS_BACKFILL_CHUNK_SAMPLES) -> Iterator[Dict[int, Series]]:
+    """Split a batch into batches of at most chunk_samples samples, keeping each sensor's samples in order"""
+    chunk: Dict[int, Series] = {}
+    room = chunk_samples
+    for sensor_id, (timestamps, values) in batch.items():
+        offset = 0
+        while offset < len(values):
+            take = min(room, len(values) - offset)
+            chunk[sensor_id] = (timestamps[offset:offset + take], values[offset:offset + take])
+            offset += take
+            room -= take
+            if room == 0:
+                yield chunk
+                chunk = {}
+                room = chunk_samples
+    if chunk:
+        yield chunk
+
+def backfill_frames(batch: Dict[int, Series], wire_format: str, chunk_samples: Optional[int] = None) -> List[Frame]:
+    """Encode a backfill as frames of at most chunk_samples (default WS_BACKFILL_CHUNK_SAMPLES) samples"""
+    chunk_samples = WS_BACKFILL_CHUNK_SAMPLES if chunk_samples is None else chunk_samples
+    return [encode_batch(chunk, wire_format, event="backfill") for chunk in chunk_batch(batch, max(chunk_samples, 1))]
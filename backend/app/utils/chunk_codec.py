@@ -0,0 +1,99 @@
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Supported value encodings: numpy-style type codes mapped to array type codes
+VALUE_FORMATS = {"f4": "f", "f8": "d"}
+
+# Timestamps are stored as microsecond offsets from the chunk start time
+TIMESTAMP_RESOLUTION = 1e-6
+
+# Longest span a chunk can cover, as its offsets are stored as uint32 (about 71.6 minutes)
+MAX_CHUNK_SPAN = (2 ** 32 - 1) * TIMESTAMP_RESOLUTION
+
+def _to_bytes(data: array) -> bytes:
+    """Serialize an array in little-endian byte order"""
+    if sys.byteorder != "little":
+        data = array(data.typecode, data)
+        data.byteswap()
+    return data.tobytes()
+
+def _from_bytes(typecode: str, raw: bytes) -> array:
+    """Deserialize a little-endian array"""
+    data = array(typecode)
+    data.frombytes(raw)
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data
+
+def encode_chunk(timestamps: Sequence[float], values: Sequence[float], value_format: str = "f4") -> Dict[str, object]:
+    """
+    Pack a block of samples into the columns of a sensor data chunk
+
+    Args:
+        timestamps: Unix timestamps of the samples
+        values: Sample values, same length as timestamps
+        value_format: "f4" for float32 values or "f8" for float64 values
+
+    Returns:
+        A dict with start_time, end_time, sample_count, sample_interval,
+        value_format, timestamp_deltas and values
+    """
+    if value_format not in VALUE_FORMATS:
+        raise ValueError(f"Unsupported value format '{value_format}'")
+    if len(timestamps) != len(values):
+        raise ValueError("timestamps and values must have the same length")
+    if not timestamps:
+        raise ValueError("Cannot encode an empty chunk")
+
+    # Chunks are always stored in time order
+    if any(timestamps[i] > timestamps[i + 1] for i in range(len(timestamps) - 1)):
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        timestamps = [timestamps[i] for i in order]
+        values = [values[i] for i in order]
+
+    start_time = float(timestamps[0])
+    if timestamps[-1] - start_time > MAX_CHUNK_SPAN:
+        raise ValueError(f"A chunk cannot span more than {int(MAX_CHUNK_SPAN)} seconds")
+    deltas = array("I", (round((t - start_time) / TIMESTAMP_RESOLUTION) for t in timestamps))
+
+    # Evenly spaced samples only need the interval, not every offset
+    sample_interval: Optional[float] = None
+    timestamp_deltas: Optional[bytes] = None
+    steps = {deltas[i + 1] - deltas[i] for i in range(len(deltas) - 1)}
+    if len(steps) == 1:
+        sample_interval = steps.pop() * TIMESTAMP_RESOLUTION
+    elif len(deltas) > 1:
+        timestamp_deltas = _to_bytes(deltas)
+
+    return {
+        "start_time": start_time,
+        "end_time": start_time + deltas[-1] * TIMESTAMP_RESOLUTION,
+        "sample_count": len(deltas),
+        "sample_interval": sample_interval,
+        "value_format": value_format,
+        "timestamp_deltas": timestamp_deltas,
+        "values": _to_bytes(array(VALUE_FORMATS[value_format], values)),
+    }
+
+def decode_chunk(chunk) -> Tuple[List[float], List[float]]:
+    """
+    Unpack a sensor data chunk
+
+    Args:
+        chunk: Any object with the chunk columns as attributes (e.g. a SensorDataChunk row)
+
+    Returns:
+        A tuple of (timestamps, values) lists in time order
+    """
+    values = _from_bytes(VALUE_FORMATS[chunk.value_format], chunk.values).tolist()
+    start_time = chunk.start_time
+
+    if chunk.timestamp_deltas is not None:
+        deltas = _from_bytes("I", chunk.timestamp_deltas)
+        timestamps = [start_time + d * TIMESTAMP_RESOLUTION for d in deltas]
+    else:
+        interval = chunk.sample_interval or 0.0
+        timestamps = [start_time + i * interval for i in range(chunk.sample_count)]
+
+    return timestamps, values
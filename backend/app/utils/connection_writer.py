@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .wire_format import Frame, Series, encode_batch
+
+# Outbound queue settings for live websocket connections (overridable through environment variables)
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))  # Frames queued per connection
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # drop_oldest, coalesce or disconnect
+WS_MAX_LAG = float(os.getenv("WS_MAX_LAG", "30"))  # Seconds of lag after which a connection is closed, 0 disables
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Close code sent to consumers that cannot keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ConnectionWriter:
+    """
+    Bounded outbound queue and writer task for one websocket connection
+
+    Producers call enqueue(), which never waits on the network; the writer task
+    drains the queue with one send at a time. When the queue is full the
+    policy decides what happens:
+
+    - drop_oldest: the oldest queued frame is discarded
+    - coalesce: the queued batch frames and the new one are merged into a
+      single frame, so nothing is lost but the client gets fewer, larger frames
+    - disconnect: the connection is closed
+
+    Whatever the policy, a connection whose oldest frame has waited more than
+    max_lag seconds is closed.
+
+    hold() and release() let a frame sequence (such as a history backfill) go
+    out ahead of live frames that arrive while it is being prepared. At most
+    max_frames frames are held; beyond that the policy applies to them too.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        wire_format: str = "json",
+        max_frames: int = WS_SEND_QUEUE_SIZE,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        max_lag: float = WS_MAX_LAG,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy '{policy}'")
+        self.websocket = websocket
+        self.wire_format = wire_format
+        self.max_frames = max(max_frames, 1)
+        self.policy = policy
+        self.max_lag = max_lag
+        self.on_close = on_close
+        # Entries are (enqueue time, frame, batch the frame encodes or None)
+        self.queue: Deque[Tuple[float, Frame, Optional[Dict[int, Series]]]] = deque()
+        self.closed = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_coalesced = 0
+        self.last_send_duration = 0.0
+        # Frames enqueued since hold(), or None when not held
+        self.held: Optional[List[Tuple[Frame, Optional[Dict[int, Series]]]]] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def lag(self) -> float:
+        """Seconds the oldest queued frame has been waiting"""
+        return time.monotonic() - self.queue[0][0] if self.queue else 0.0
+
+    def enqueue(self, frame: Frame, batch: Optional[Dict[int, Series]] = None) -> bool:
+        """
+        Queue a frame for sending without waiting
+
+        Args:
+            frame: The encoded frame
+            batch: The batch the frame encodes, which lets the coalesce policy
+                merge it with other queued batches
+
+        Returns:
+            False if the connection is closed or was closed by the policy
+        """
+        if self.closed:
+            return False
+        if self.held is not None:
+            return self._hold_frame(frame, batch)
+        now = time.monotonic()
+        if self.max_lag > 0 and self.queue and now - self.queue[0][0] > self.max_lag:
+            self._close(f"lagging {now - self.queue[0][0]:.1f} s behind")
+            return False
+
+        if len(self.queue) >= self.max_frames:
+            if self.policy == "disconnect":
+                self._close("send queue full")
+                return False
+            if self.policy == "coalesce" and batch is not None and all(queued is not None for _, _, queued in self.queue):
+                enqueued_at = self.queue[0][0]
+                merged = _merge_batches([queued for _, _, queued in self.queue] + [batch])
+                self.frames_coalesced += len(self.queue)
+                self.queue.clear()
+                self.queue.append((enqueued_at, encode_batch(merged, self.wire_format), merged))
+                self._ready.set()
+                return True
+            self.queue.popleft()
+            self.frames_dropped += 1
+
+        self.queue.append((now, frame, batch))
+        self._ready.set()
+        return True
+
+    def _hold_frame(self, frame: Frame, batch: Optional[Dict[int, Series]]) -> bool:
+        """Keep a frame aside while held, applying the policy once max_frames are held"""
+        if len(self.held) >= self.max_frames:
+            if self.policy == "disconnect":
+                self._close("held frames full")
+                return False
+            if self.policy == "coalesce" and batch is not None and all(held is not None for _, held in self.held):
+                merged = _merge_batches([held for _, held in self.held] + [batch])
+                self.frames_coalesced += len(self.held)
+                self.held = [(encode_batch(merged, self.wire_format), merged)]
+                return True
+            self.held.pop(0)
+            self.frames_dropped += 1
+        self.held.append((frame, batch))
+        return True
+
+    def hold(self) -> None:
+        """Keep enqueued frames aside until release() (meant for short waits such as one read)"""
+        if self.held is None:
+            self.held = []
+
+    def release(self, frames: Iterable[Frame] = ()) -> None:
+        """
+        Queue frames ahead of the frames enqueued since hold(), then resume
+
+        The given frames are queued even past the queue capacity; the held
+        frames then go through enqueue() and its policy as usual.
+        """
+        held, self.held = self.held or [], None
+        if self.closed:
+            return
+        now = time.monotonic()
+        for frame in frames:
+            self.queue.append((now, frame, None))
+        self._ready.set()
+        for frame, batch in held:
+            self.enqueue(frame, batch)
+
+    def stats(self) -> Dict[str, object]:
+        """Snapshot of the queue settings, depth, lag and counters"""
+        return {
+            "wire_format": self.wire_format,
+            "policy": self.policy,
+            "queued": len(self.queue),
+            "queue_capacity": self.max_frames,
+            "lag": self.lag(),
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_coalesced": self.frames_coalesced,
+            "last_send_duration": self.last_send_duration,
+        }
+
+    async def _send(self, frame: Frame) -> None:
+        if isinstance(frame, bytes):
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def _run(self) -> None:
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, frame, _ = self.queue.popleft()
+                started = time.monotonic()
+                await self._send(frame)
+                self.last_send_duration = time.monotonic() - started
+                self.frames_sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending to websocket: {e}")
+            self._close(None)
+
+    def _close(self, reason: Optional[str]) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self._ready.set()
+        if reason is not None:
+            print(f"Closing slow websocket consumer: {reason}")
+            asyncio.get_running_loop().create_task(self._close_socket())
+        if self.on_close is not None:
+            self.on_close()
+
+    async def _close_socket(self) -> None:
+        try:
+            await self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def stop(self) -> None:
+        """Stop the writer task (the websocket itself is left alone)"""
+        self.closed = True
+        self.queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+def _merge_batches(batches) -> Dict[int, Series]:
+    merged: Dict[int, Tuple[list, list]] = {}
+    for batch in batches:
+        for sensor_id, (timestamps, values) in batch.items():
+            target = merged.setdefault(sensor_id, ([], []))
+            target[0].extend(timestamps)
+            target[1].extend(values)
+    return merged
@@ -0,0 +1,104 @@
+import os
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Largest raw range decimated on request; longer windows are served from rollups
+DOWNSAMPLE_MAX_RAW_SAMPLES = int(os.getenv("DOWNSAMPLE_MAX_RAW_SAMPLES", "250000"))
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+def lttb(timestamps: Sequence[float], values: Sequence[float], max_points: int) -> Series:
+    """
+    Decimate a series with largest-triangle-three-buckets
+
+    The first and last samples are always kept. The samples in between are
+    split into max_points - 2 buckets and from each bucket the sample forming
+    the largest triangle with the previously selected sample and the average
+    of the next bucket is kept, which preserves peaks and artifacts.
+
+    Args:
+        timestamps: Sample timestamps in time order
+        values: Sample values, same length as timestamps
+        max_points: Maximum number of samples to return
+
+    Returns:
+        A tuple of (timestamps, values) arrays
+    """
+    x = np.asarray(timestamps, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    if n <= max_points:
+        return x, y
+    if max_points < 3:
+        keep = [0, n - 1][:max_points]
+        return x[keep], y[keep]
+
+    # Bucket boundaries over the interior samples [1, n - 1)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[: n - 1], edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y[: n - 1], edges[:-1]) / sizes
+    # The third vertex for a bucket is the average of the next one (the last sample for the final bucket)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        px, py = x[previous], y[previous]
+        # Twice the triangle area; the constant factor does not change the argmax
+        areas = np.abs((px - next_x[bucket]) * (y[low:high] - py) - (px - x[low:high]) * (next_y[bucket] - py))
+        previous = low + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return x[selected], y[selected]
+
+def min_max(timestamps: Sequence[float], values: Sequence[float], max_points: int) -> Series:
+    """
+    Decimate a series by keeping the minimum and maximum sample of each bucket
+
+    Args:
+        timestamps: Sample timestamps in time order
+        values: Sample values, same length as timestamps
+        max_points: Maximum number of samples to return (two per bucket; a
+            budget of one keeps the sample furthest from zero)
+
+    Returns:
+        A tuple of (timestamps, values) arrays in time order
+    """
+    x = np.asarray(timestamps, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    if n <= max_points:
+        return x, y
+    if max_points < 2:
+        keep = [int(np.argmax(np.abs(y)))][:max(max_points, 0)]
+        return x[keep], y[keep]
+
+    buckets = max_points // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+    # Sort by bucket, then by value: each bucket's first entry is its minimum and its last is its maximum
+    order = np.lexsort((y, bucket_ids))
+    keep = np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1])))
+    return x[keep], y[keep]
+
+# Decimation methods by name
+METHODS = {
+    "lttb": lttb,
+    "minmax": min_max,
+}
+
+def downsample(timestamps: Sequence[float], values: Sequence[float], max_points: int, method: str = "lttb") -> Series:
+    """
+    Decimate a series to at most max_points samples
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'")
+    return METHODS[method](timestamps, values, max_points)
@@ -0,0 +1,148 @@
+import heapq
+import io
+import os
+import zlib
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow
+import pyarrow.ipc
+from sqlalchemy.orm import Session
+
+from .. import models
+from .chunk_codec import decode_chunk
+from .sample_store import CHUNK_SECONDS
+
+# Export settings (overridable through environment variables)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))  # Samples fetched and encoded per step
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+Batch = Tuple[List[float], List[float]]
+
+def _iter_rows(db: Session, sensor_id: int, start_time: Optional[float], end_time: Optional[float], batch_size: int) -> Iterator[Tuple[float, float]]:
+    query = db.query(models.SensorData.timestamp, models.SensorData.value).filter(
+        models.SensorData.sensor_id == sensor_id
+    )
+    if start_time is not None:
+        query = query.filter(models.SensorData.timestamp >= start_time)
+    if end_time is not None:
+        query = query.filter(models.SensorData.timestamp <= end_time)
+    # yield_per fetches from the open cursor in batches instead of buffering the whole result
+    for timestamp, value in query.order_by(models.SensorData.timestamp.asc()).yield_per(batch_size):
+        yield timestamp, value
+
+def _iter_chunks(db: Session, sensor_id: int, start_time: Optional[float], end_time: Optional[float]) -> Iterator[Tuple[float, float]]:
+    query = db.query(models.SensorDataChunk).filter(models.SensorDataChunk.sensor_id == sensor_id)
+    if start_time is not None:
+        query = query.filter(models.SensorDataChunk.start_time >= start_time - CHUNK_SECONDS)
+        query = query.filter(models.SensorDataChunk.end_time >= start_time)
+    if end_time is not None:
+        query = query.filter(models.SensorDataChunk.start_time <= end_time)
+    chunks = iter(query.order_by(models.SensorDataChunk.start_time.asc()).yield_per(64))
+
+    # Chunks overlap after out-of-order ingest, so their samples are merged on a heap of
+    # (next timestamp, chunk order, next value, remaining samples) entries
+    heap: List[Tuple[float, int, float, Iterator[Tuple[float, float]]]] = []
+    pending = next(chunks, None)
+    order = 0
+    while heap or pending is not None:
+        # A chunk starting before the smallest queued sample may hold earlier samples, so open it first
+        while pending is not None and (not heap or pending.start_time <= heap[0][0]):
+            samples = zip(*decode_chunk(pending))
+            first = next(samples, None)
+            if first is not None:
+                heapq.heappush(heap, (first[0], order, first[1], samples))
+                order += 1
+            pending = next(chunks, None)
+        if not heap:
+            continue
+        timestamp, position, value, samples = heapq.heappop(heap)
+        following = next(samples, None)
+        if following is not None:
+            heapq.heappush(heap, (following[0], position, following[1], samples))
+        if (start_time is None or timestamp >= start_time) and (end_time is None or timestamp <= end_time):
+            yield timestamp, value
+
+def iter_sample_batches(
+    db: Session,
+    sensor_id: int,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[Batch]:
+    """
+    Stream a sensor's samples from row and chunk storage in time order
+
+    Both tables are read through server-side cursors and merged lazily, so
+    memory use does not depend on the size of the range.
+
+    Yields:
+        Tuples of (timestamps, values) lists of at most batch_size samples
+    """
+    samples = heapq.merge(
+        _iter_rows(db, sensor_id, start_time, end_time, batch_size),
+        _iter_chunks(db, sensor_id, start_time, end_time),
+    )
+    while True:
+        batch = list(islice(samples, batch_size))
+        if not batch:
+            return
+        yield [timestamp for timestamp, _ in batch], [value for _, value in batch]
+
+def _encode_ndjson(batches: Iterable[Batch]) -> Iterator[bytes]:
+    for timestamps, values in batches:
+        yield "".join(
+            f'{{"timestamp": {timestamp!r}, "value": {value!r}}}\n' for timestamp, value in zip(timestamps, values)
+        ).encode()
+
+def _encode_csv(batches: Iterable[Batch]) -> Iterator[bytes]:
+    yield b"timestamp,value\n"
+    for timestamps, values in batches:
+        yield "".join(f"{timestamp!r},{value!r}\n" for timestamp, value in zip(timestamps, values)).encode()
+
+def _encode_arrow(batches: Iterable[Batch]) -> Iterator[bytes]:
+    schema = pyarrow.schema([("timestamp", pyarrow.float64()), ("value", pyarrow.float64())])
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        for timestamps, values in batches:
+            writer.write_batch(pyarrow.record_batch([pyarrow.array(timestamps), pyarrow.array(values)], schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End-of-stream marker written when the writer closes
+    yield sink.getvalue()
+
+def _gzip(chunks: Iterable[bytes], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 writes a gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# Export formats: name -> (encoder, media type, file extension)
+FORMATS: Dict[str, Tuple[Callable[[Iterable[Batch]], Iterator[bytes]], str, str]] = {
+    "ndjson": (_encode_ndjson, "application/x-ndjson", "ndjson"),
+    "csv": (_encode_csv, "text/csv", "csv"),
+    "arrow": (_encode_arrow, "application/vnd.apache.arrow.stream", "arrow"),
+}
+
+def export_stream(batches: Iterable[Batch], export_format: str, compress: bool = False) -> Iterator[bytes]:
+    """
+    Encode streamed sample batches in an export format
+
+    Args:
+        batches: Iterable of (timestamps, values) batches, e.g. from iter_sample_batches
+        export_format: "ndjson", "csv" or "arrow"
+        compress: Wrap the output in gzip
+
+    Returns:
+        An iterator of encoded byte chunks
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'")
+    chunks = FORMATS[export_format][0](batches)
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,209 @@
+import bisect
+import math
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+# Hot window settings (overridable through environment variables)
+HOT_WINDOW_SECONDS = float(os.getenv("HOT_WINDOW_SECONDS", "120"))  # Seconds of recent data kept per sensor
+HOT_WINDOW_DEFAULT_RATE = float(os.getenv("HOT_WINDOW_DEFAULT_RATE", "100"))  # Used when a sensor's rate is unknown
+HOT_WINDOW_HEADROOM = 1.25  # Extra capacity for rate jitter
+
+class SensorRingBuffer:
+    """
+    Fixed-capacity ring buffer of (timestamp, value) samples for one sensor.
+
+    Timestamps and values live in two preallocated float64 arrays. The buffer
+    tracks the earliest time from which it holds every sample ingested for the
+    sensor (`complete_from`), so a range read can tell whether it can be served
+    from memory or has to fall back to the database.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(int(capacity), 1)
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.values = array("d", bytes(8 * self.capacity))
+        self.start = 0  # Physical index of the oldest sample
+        self.size = 0
+        self.complete_from: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> float:
+        # Timestamp at a logical index (oldest first), which makes the buffer bisectable
+        return self.timestamps[(self.start + index) % self.capacity]
+
+    @property
+    def newest(self) -> Optional[float]:
+        return self[self.size - 1] if self.size else None
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.timestamps.buffer_info()[1] * self.timestamps.itemsize + self.values.buffer_info()[1] * self.values.itemsize
+
+    def append(self, timestamps: Sequence[float], values: Sequence[float]) -> None:
+        """Append samples in time order, evicting the oldest samples when full"""
+        for timestamp, value in zip(timestamps, values):
+            if self.complete_from is None:
+                self.complete_from = timestamp
+            newest = self.newest
+            if newest is not None and timestamp < newest:
+                # Out-of-order sample: it is not kept, so ranges including it are incomplete
+                self.complete_from = max(self.complete_from, math.nextafter(timestamp, math.inf))
+                continue
+
+            if self.size == self.capacity:
+                evicted = self.timestamps[self.start]
+                self.complete_from = max(self.complete_from, math.nextafter(evicted, math.inf))
+                self.start = (self.start + 1) % self.capacity
+                self.size -= 1
+            index = (self.start + self.size) % self.capacity
+            self.timestamps[index] = timestamp
+            self.values[index] = value
+            self.size += 1
+
+    def covers(self, start_time: float) -> bool:
+        """Whether every sample at or after start_time is in the buffer"""
+        return self.complete_from is not None and start_time >= self.complete_from
+
+    def read(self, start_time: float, end_time: Optional[float] = None):
+        """
+        Read the samples in [start_time, end_time]
+
+        Returns:
+            A tuple of (timestamps, values) lists in time order
+        """
+        first = bisect.bisect_left(self, start_time)
+        last = self.size if end_time is None else bisect.bisect_right(self, end_time)
+        timestamps = []
+        values = []
+        for index in range(first, last):
+            physical = (self.start + index) % self.capacity
+            timestamps.append(self.timestamps[physical])
+            values.append(self.values[physical])
+        return timestamps, values
+
+    def resized(self, capacity: int) -> "SensorRingBuffer":
+        """Copy the newest samples into a buffer of a different capacity"""
+        buffer = SensorRingBuffer(capacity)
+        timestamps, values = self.read(-math.inf)
+        buffer.append(timestamps, values)
+        if self.complete_from is not None:
+            buffer.complete_from = max(buffer.complete_from or self.complete_from, self.complete_from)
+        return buffer
+
+class HotWindowStore:
+    """Per-sensor ring buffers holding the last `window_seconds` of ingested samples"""
+
+    def __init__(self, window_seconds: float = HOT_WINDOW_SECONDS, default_rate: float = HOT_WINDOW_DEFAULT_RATE):
+        self.window_seconds = window_seconds
+        self.default_rate = default_rate
+        self.buffers: Dict[int, SensorRingBuffer] = {}
+        self.rates: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _capacity(self, rate: float) -> int:
+        return math.ceil(rate * self.window_seconds * HOT_WINDOW_HEADROOM)
+
+    def configure(self, sensor_id: int, rate: float) -> None:
+        """Size a sensor's buffer for its data rate (keeping the samples it already holds)"""
+        if self.window_seconds <= 0 or not rate or rate <= 0:
+            return
+        with self._lock:
+            self.rates[sensor_id] = rate
+            buffer = self.buffers.get(sensor_id)
+            capacity = self._capacity(rate)
+            if buffer is not None and buffer.capacity != capacity:
+                self.buffers[sensor_id] = buffer.resized(capacity)
+
+    def append(self, sensor_id: int, timestamps: Sequence[float], values: Sequence[float]) -> None:
+        """Add ingested samples for a sensor"""
+        if self.window_seconds <= 0 or not len(timestamps):
+            return
+        with self._lock:
+            buffer = self.buffers.get(sensor_id)
+            if buffer is None:
+                rate = self.rates.get(sensor_id, self.default_rate)
+                buffer = self.buffers[sensor_id] = SensorRingBuffer(self._capacity(rate))
+            buffer.append(timestamps, values)
+
+    def remove(self, sensor_id: int) -> None:
+        with self._lock:
+            self.buffers.pop(sensor_id, None)
+            self.rates.pop(sensor_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.buffers.clear()
+            self.rates.clear()
+
+    def read(
+        self,
+        sensor_id: int,
+        start_time: float,
+        end_time: Optional[float] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True,
+    ) -> Optional[List[Dict]]:
+        """
+        Read a range of samples from memory
+
+        Returns:
+            A list of dicts with sensor_id, timestamp and value (same order and
+            limit semantics as sample_store.read_samples), or None if the range
+            is not fully inside the window and must be read from the database
+        """
+        with self._lock:
+            buffer = self.buffers.get(sensor_id)
+            if buffer is None or start_time is None or not buffer.covers(start_time):
+                return None
+            timestamps, values = buffer.read(start_time, end_time)
+
+        if newest_first:
+            if limit is not None:
+                first = max(len(timestamps) - limit, 0)
+                timestamps, values = timestamps[first:], values[first:]
+            pairs = zip(reversed(timestamps), reversed(values))
+        else:
+            if limit is not None:
+                timestamps, values = timestamps[:limit], values[:limit]
+            pairs = zip(timestamps, values)
+        return [{"sensor_id": sensor_id, "timestamp": timestamp, "value": value} for timestamp, value in pairs]
+
+    def read_series(self, sensor_id: int, start_time: float, end_time: Optional[float] = None):
+        """
+        Read a range as two parallel lists in time order
+
+        Returns:
+            A tuple of (timestamps, values), or None if the range is not fully
+            inside the window
+        """
+        with self._lock:
+            buffer = self.buffers.get(sensor_id)
+            if buffer is None or start_time is None or not buffer.covers(start_time):
+                return None
+            return buffer.read(start_time, end_time)
+
+    def stats(self) -> Dict[str, object]:
+        """Memory accounting per sensor and in total"""
+        with self._lock:
+            sensors = {
+                sensor_id: {
+                    "capacity": buffer.capacity,
+                    "samples": buffer.size,
+                    "memory_bytes": buffer.memory_bytes,
+                    "complete_from": buffer.complete_from,
+                    "newest": buffer.newest,
+                }
+                for sensor_id, buffer in self.buffers.items()
+            }
+        return {
+            "window_seconds": self.window_seconds,
+            "total_memory_bytes": sum(sensor["memory_bytes"] for sensor in sensors.values()),
+            "sensors": sensors,
+        }
+
+# Shared store fed by the ingest path
+hot_window = HotWindowStore()
@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from typing import Tuple
+
+# Maximum number of samples accepted in a single ingest batch
+MAX_INGEST_SAMPLES = int(os.getenv("MAX_INGEST_SAMPLES", "100000"))
+
+# Binary batch header (little-endian): start_time (float64), rate in Hz (float64),
+# value size in bytes (uint8, 4 or 8), 3 padding bytes, sample count (uint32).
+# The header is followed by `count` packed float32 or float64 values.
+BINARY_HEADER = struct.Struct("<ddBxxxI")
+BINARY_VALUE_TYPES = {4: "f", 8: "d"}
+
+Batch = Tuple[array, array]
+
+def _check_batch(timestamps: array, values: array) -> Batch:
+    """Validate a parsed batch without building an object per sample"""
+    if len(timestamps) != len(values):
+        raise ValueError("timestamps and values must have the same length")
+    if not values:
+        raise ValueError("Batch contains no samples")
+    if len(values) > MAX_INGEST_SAMPLES:
+        raise ValueError(f"Batch exceeds the limit of {MAX_INGEST_SAMPLES} samples")
+    if not all(map(math.isfinite, timestamps)) or not all(map(math.isfinite, values)):
+        raise ValueError("Timestamps and values must be finite numbers")
+    return timestamps, values
+
+def _evenly_spaced(start_time: float, rate: float, count: int) -> array:
+    if not rate > 0:
+        raise ValueError("rate must be positive")
+    interval = 1.0 / rate
+    return array("d", (start_time + i * interval for i in range(count)))
+
+def _to_array(items, name: str) -> array:
+    try:
+        return array("d", items)
+    except TypeError:
+        raise ValueError(f"{name} must be a list of numbers")
+
+def parse_json_payload(payload) -> Batch:
+    """
+    Parse an already decoded JSON batch
+
+    Accepted shapes:
+        {"timestamps": [...], "values": [...]}
+        {"start_time": t0, "rate": hz, "values": [...]}
+        [[timestamp, value], ...]
+    """
+    if isinstance(payload, list):
+        try:
+            timestamps, values = zip(*payload) if payload else ((), ())
+        except (TypeError, ValueError):
+            raise ValueError("Expected a list of [timestamp, value] pairs")
+        return _check_batch(_to_array(timestamps, "timestamps"), _to_array(values, "values"))
+
+    if not isinstance(payload, dict) or not isinstance(payload.get("values"), list):
+        raise ValueError("Expected an object with a 'values' list")
+    values = _to_array(payload["values"], "values")
+    if "timestamps" in payload:
+        if not isinstance(payload["timestamps"], list):
+            raise ValueError("timestamps must be a list of numbers")
+        timestamps = _to_array(payload["timestamps"], "timestamps")
+    elif "start_time" in payload and "rate" in payload:
+        try:
+            timestamps = _evenly_spaced(float(payload["start_time"]), float(payload["rate"]), len(values))
+        except (TypeError, ValueError):
+            raise ValueError("start_time and rate must be numbers")
+    else:
+        raise ValueError("Expected either 'timestamps' or 'start_time' and 'rate'")
+    return _check_batch(timestamps, values)
+
+def parse_json_batch(body: bytes) -> Batch:
+    """Parse a JSON batch body (see parse_json_payload for the accepted shapes)"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise ValueError("Body is not valid JSON")
+    return parse_json_payload(payload)
+
+def parse_ndjson_batch(body: bytes) -> Batch:
+    """
+    Parse a newline-delimited JSON batch
+
+    Each line is either [timestamp, value] or {"timestamp": ..., "value": ...}.
+    """
+    timestamps = array("d")
+    values = array("d")
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            sample = json.loads(line)
+            if isinstance(sample, dict):
+                timestamps.append(sample["timestamp"])
+                values.append(sample["value"])
+            else:
+                timestamp, value = sample
+                timestamps.append(timestamp)
+                values.append(value)
+        except (ValueError, TypeError, KeyError):
+            raise ValueError(f"Invalid sample on line {line_number}")
+    return _check_batch(timestamps, values)
+
+def parse_binary_batch(body: bytes) -> Batch:
+    """Parse a binary batch: BINARY_HEADER followed by packed little-endian values"""
+    if len(body) < BINARY_HEADER.size:
+        raise ValueError("Body is shorter than the binary header")
+    start_time, rate, value_size, count = BINARY_HEADER.unpack_from(body)
+    if value_size not in BINARY_VALUE_TYPES:
+        raise ValueError("Value size must be 4 or 8 bytes")
+    if len(body) != BINARY_HEADER.size + count * value_size:
+        raise ValueError("Body length does not match the sample count")
+
+    values = array(BINARY_VALUE_TYPES[value_size])
+    values.frombytes(body[BINARY_HEADER.size:])
+    if sys.byteorder != "little":
+        values.byteswap()
+    if value_size == 4:
+        values = array("d", values)
+    return _check_batch(_evenly_spaced(start_time, rate, count), values)
+
+def encode_binary_batch(start_time: float, rate: float, values, value_size: int = 4) -> bytes:
+    """Build a binary batch body (the counterpart of parse_binary_batch, used by clients and tests)"""
+    packed = array(BINARY_VALUE_TYPES[value_size], values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return BINARY_HEADER.pack(start_time, rate, value_size, len(packed)) + packed.tobytes()
+
+# Binary websocket ingest frame: sequence number (uint32) and sensor ID (uint32),
+# followed by a binary batch (BINARY_HEADER + values)
+INGEST_FRAME_HEADER = struct.Struct("<II")
+
+def parse_ingest_frame(frame: bytes) -> Tuple[int, int, Batch]:
+    """
+    Parse a binary websocket ingest frame
+
+    Returns:
+        A tuple of (sequence number, sensor ID, (timestamps, values))
+    """
+    if len(frame) < INGEST_FRAME_HEADER.size:
+        raise ValueError("Frame is shorter than the frame header")
+    seq, sensor_id = INGEST_FRAME_HEADER.unpack_from(frame)
+    return seq, sensor_id, parse_binary_batch(frame[INGEST_FRAME_HEADER.size:])
+
+# Parsers by media type
+PARSERS = {
+    "application/json": parse_json_batch,
+    "application/x-ndjson": parse_ndjson_batch,
+    "application/ndjson": parse_ndjson_batch,
+    "application/octet-stream": parse_binary_batch,
+}
+
+def parse_batch(content_type: str, body: bytes) -> Batch:
+    """
+    Parse an ingest batch according to its content type
+
+    Returns:
+        A tuple of (timestamps, values) arrays of float64
+
+    Raises:
+        ValueError: If the content type is unsupported or the batch is invalid
+    """
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type not in PARSERS:
+        raise ValueError(f"Unsupported content type '{media_type}'")
+    return PARSERS[media_type](body)
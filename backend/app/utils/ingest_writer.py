@@ -0,0 +1,358 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from ..database import SessionLocal
+from . import sample_store
+from .hot_window import HotWindowStore, hot_window
+from .spectral import spectral_cache
+
+# Writer settings (overridable through environment variables)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  # Samples per bulk insert
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))  # Seconds between flushes
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "200000"))  # Queue bound in samples
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))  # Write attempts per batch before it is dropped
+
+# A queued item: (sensor_id, timestamps, values)
+IngestItem = Tuple[int, Sequence[float], Sequence[float]]
+
+
+class IngestWriter:
+    """
+    Group-commit writer for sensor samples.
+
+    Producers (mock data threads, ingest endpoints) submit samples into a bounded
+    in-memory queue. A single background thread drains the queue and writes the
+    samples to the database with one bulk insert and one commit per batch, where a
+    batch is closed once it reaches ``batch_size`` samples or ``flush_interval``
+    seconds have elapsed since the first queued sample, whichever comes first.
+
+    Queued samples are also added to the in-memory hot window right away, so
+    recent data can be read before it reaches the database.
+
+    With chunk storage, samples are held per sensor until they span
+    ``sample_store.CHUNK_SECONDS`` (or have been open that long), so that each
+    packed chunk covers a full time block instead of one flush interval.
+
+    A batch whose write fails is retried, waiting a little longer before each
+    attempt, up to ``max_attempts`` times. Only then are its samples dropped;
+    they are logged and counted in ``samples_dropped``.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        max_pending: int = INGEST_MAX_PENDING,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+        storage: str = None,
+        window: Optional[HotWindowStore] = hot_window,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.storage = storage or sample_store.SENSOR_STORAGE
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max(max_attempts, 1)
+
+        self._queue: Deque[IngestItem] = deque()
+        self._pending = 0  # Number of samples currently queued
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._inflight = 0  # Number of samples taken from the queue but not yet committed
+        self._seal_requested = False  # Write open chunks on the next pass regardless of age
+
+        # Open (not yet written) chunk buffers per sensor, used with chunk storage
+        self._open_chunks: Dict[int, Tuple[List[float], List[float]]] = {}
+        self._open_since: Dict[int, float] = {}
+
+        # Counters reported by stats()
+        self.samples_written = 0
+        self.batches_written = 0
+        self.samples_rejected = 0
+        self.samples_dropped = 0
+        self.write_retries = 0
+        self.last_flush_duration = 0.0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the writer thread if it is not already running"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the writer thread after flushing everything still queued"""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(
+        self,
+        sensor_id: int,
+        timestamps: Sequence[float],
+        values: Sequence[float],
+        block: bool = True,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Queue samples for a sensor
+
+        Args:
+            sensor_id: The ID of the sensor
+            timestamps: Unix timestamps of the samples
+            values: Sample values, same length as timestamps
+            block: Wait for room in the queue when it is full
+            timeout: Maximum time to wait when blocking (None waits forever)
+
+        Returns:
+            True if the samples were queued, False if the queue was full
+        """
+        count = len(timestamps)
+        if count == 0:
+            return True
+
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending + count > self.max_pending and self._pending > 0:
+                if not block:
+                    self.samples_rejected += count
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.samples_rejected += count
+                    return False
+                self._condition.wait(remaining)
+
+            self._queue.append((sensor_id, timestamps, values))
+            self._pending += count
+            if self._pending >= self.batch_size:
+                self._condition.notify_all()
+        if self.window is not None:
+            self.window.append(sensor_id, timestamps, values)
+        return True
+
+    def submit_many(self, items: Sequence[IngestItem]) -> bool:
+        """
+        Queue samples for several sensors at once, without blocking
+
+        Either every item is queued or, when the queue does not have room for
+        all of them, none is.
+
+        Returns:
+            True if the samples were queued, False if the queue was full
+        """
+        count = sum(len(timestamps) for _, timestamps, _ in items)
+        if count == 0:
+            return True
+
+        self.start()
+        with self._condition:
+            if self._pending + count > self.max_pending and self._pending > 0:
+                self.samples_rejected += count
+                return False
+            self._queue.extend(items)
+            self._pending += count
+            if self._pending >= self.batch_size:
+                self._condition.notify_all()
+        if self.window is not None:
+            for sensor_id, timestamps, values in items:
+                self.window.append(sensor_id, timestamps, values)
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Block until everything queued so far has been committed
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self._open_chunks:
+                self._seal_requested = True
+            self._condition.notify_all()
+            while self._pending > 0 or self._inflight > 0 or self._seal_requested:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def queue_depth(self) -> int:
+        """Number of samples waiting to be written"""
+        return self._pending
+
+    def stats(self) -> Dict[str, object]:
+        """Snapshot of the writer settings and counters"""
+        return {
+            "running": self._running,
+            "queue_depth": self._pending,
+            "queue_capacity": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "samples_written": self.samples_written,
+            "batches_written": self.batches_written,
+            "samples_rejected": self.samples_rejected,
+            "samples_dropped": self.samples_dropped,
+            "write_retries": self.write_retries,
+            "last_flush_duration": self.last_flush_duration,
+            "last_error": self.last_error,
+        }
+
+    def _take_batch(self) -> List[IngestItem]:
+        """Wait for a full batch or the flush interval, then take items off the queue"""
+        with self._condition:
+            while not self._queue and self._running and not self._seal_requested:
+                if self._open_chunks:
+                    # Wake up periodically to write chunks that have been open too long
+                    self._condition.wait(self.flush_interval)
+                    break
+                self._condition.wait()
+
+            # Give producers until the flush interval to fill up the batch
+            deadline = time.monotonic() + self.flush_interval
+            while self._running and self._pending < self.batch_size and not self._seal_requested:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = []
+            taken = 0
+            while self._queue and taken < self.batch_size:
+                item = self._queue.popleft()
+                batch.append(item)
+                taken += len(item[1])
+            self._pending -= taken
+            self._inflight = taken
+            # Wake producers blocked on a full queue
+            self._condition.notify_all()
+            return batch
+
+    def _collect_chunks(self, grouped: Dict[int, Tuple[List[float], List[float]]], seal_all: bool) -> Dict[int, Tuple[List[float], List[float]]]:
+        """Add samples to the open chunk buffers and return the parts ready to be written"""
+        now = time.monotonic()
+        for sensor_id, (timestamps, values) in grouped.items():
+            if sensor_id not in self._open_chunks:
+                self._open_chunks[sensor_id] = ([], [])
+                self._open_since[sensor_id] = now
+            self._open_chunks[sensor_id][0].extend(timestamps)
+            self._open_chunks[sensor_id][1].extend(values)
+
+        ready = {}
+        for sensor_id in list(self._open_chunks):
+            timestamps, values = self._open_chunks[sensor_id]
+            expired = now - self._open_since[sensor_id] >= sample_store.CHUNK_SECONDS
+            if seal_all or expired:
+                ready[sensor_id] = (timestamps, values)
+                del self._open_chunks[sensor_id]
+                del self._open_since[sensor_id]
+                continue
+
+            # Write every complete time block and keep the last one open
+            segments = sample_store.split_by_span(timestamps, values)
+            if len(segments) > 1:
+                ready[sensor_id] = (
+                    [t for segment_ts, _ in segments[:-1] for t in segment_ts],
+                    [v for _, segment_values in segments[:-1] for v in segment_values],
+                )
+                self._open_chunks[sensor_id] = (list(segments[-1][0]), list(segments[-1][1]))
+                self._open_since[sensor_id] = now
+        return ready
+
+    def _group_batch(self, batch: List[IngestItem], seal_all: bool = False) -> Dict[int, Tuple[List[float], List[float]]]:
+        """Group a batch by sensor and, with chunk storage, keep back the samples of open chunks"""
+        grouped: Dict[int, Tuple[List[float], List[float]]] = {}
+        for sensor_id, timestamps, values in batch:
+            if sensor_id not in grouped:
+                grouped[sensor_id] = ([], [])
+            grouped[sensor_id][0].extend(timestamps)
+            grouped[sensor_id][1].extend(values)
+
+        if self.storage == "chunks":
+            grouped = self._collect_chunks(grouped, seal_all)
+        return grouped
+
+    def _write_grouped(self, grouped: Dict[int, Tuple[List[float], List[float]]]) -> int:
+        """Write grouped samples with a single bulk insert per sensor and one commit"""
+        written = 0
+        db = self.session_factory()
+        try:
+            for sensor_id, (timestamps, values) in grouped.items():
+                written += sample_store.write_samples(db, sensor_id, timestamps, values, self.storage)
+            db.commit()
+            # Cached spectra of the segments these samples fall into are now stale
+            for sensor_id, (timestamps, _) in grouped.items():
+                if timestamps:
+                    spectral_cache.invalidate(sensor_id, min(timestamps), max(timestamps))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return written
+
+    def _write_with_retries(self, grouped: Dict[int, Tuple[List[float], List[float]]]) -> int:
+        """Write grouped samples, retrying failed attempts; drops and counts them after max_attempts"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                written = self._write_grouped(grouped)
+                self.last_error = None
+                return written
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt == self.max_attempts:
+                    dropped = sum(len(values) for _, values in grouped.values())
+                    self.samples_dropped += dropped
+                    print(f"Ingest writer error: {e}; dropped {dropped} samples after {attempt} attempts")
+                    return 0
+                self.write_retries += 1
+                print(f"Ingest writer error: {e}; retrying (attempt {attempt + 1} of {self.max_attempts})")
+                # Back off; producers meanwhile fill the bounded queue and get backpressure
+                time.sleep(self.flush_interval * attempt)
+        return 0
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            with self._condition:
+                seal_all = self._seal_requested or not self._running
+            if batch or self._open_chunks:
+                started = time.perf_counter()
+                try:
+                    grouped = self._group_batch(batch, seal_all)
+                    written = self._write_with_retries(grouped) if grouped else 0
+                    if written:
+                        self.samples_written += written
+                        self.batches_written += 1
+                        self.last_flush_duration = time.perf_counter() - started
+                except Exception as e:
+                    print(f"Ingest writer error: {e}")
+                    self.last_error = str(e)
+
+            with self._condition:
+                self._inflight = 0
+                if seal_all:
+                    self._seal_requested = False
+                self._condition.notify_all()
+                if not self._running and not self._queue:
+                    return
+
+
+# Shared writer instance fed by all producers
+ingest_writer = IngestWriter()
@@ -17,6 +17,9 @@ class MockDataGenerator:
         
         # Keep track of sensor data rates
         self.sensor_data_rates: Dict[int, float] = {}
+        
+        # Timestamp of the last point generated by generate_until for each sensor
+        self.sensor_last_times: Dict[int, float] = {}
     
     def update_sensor_data_rate(self, sensor_id: int, data_rate: float) -> None:
         """
@@ -41,6 +44,8 @@ class MockDataGenerator:
             del self.sensor_phases[sensor_id]
         if sensor_id in self.sensor_last_values:
             del self.sensor_last_values[sensor_id]
+        if sensor_id in self.sensor_last_times:
+            del self.sensor_last_times[sensor_id]
     
     def generate_data_points(self, sensor_id: int, current_time: float, broadcast_interval: float) -> List[Dict[str, float]]:
         """
@@ -92,6 +97,49 @@ class MockDataGenerator:
         
         return data_points
     
+    def generate_until(self, sensor_id: int, current_time: float, max_gap: float = 5.0) -> List[Dict[str, float]]:
+        """
+        Generate the data points that fell due since the previous call
+        
+        Points are spaced 1 / data_rate apart and carry on from the last point
+        generated, so the output rate does not depend on how often this is
+        called (unlike generate_data_points, which yields at least one point
+        per call).
+        
+        Args:
+            sensor_id: The ID of the sensor
+            current_time: The current timestamp
+            max_gap: Seconds without a call after which generation restarts at current_time
+            
+        Returns:
+            A list of data points, each with a timestamp and value
+        """
+        if sensor_id not in self.sensor_data_rates:
+            return []
+        
+        # At least 1Hz, like generate_data_points with a one second interval
+        time_step = 1.0 / max(self.sensor_data_rates[sensor_id], 1.0)
+        last_time = self.sensor_last_times.get(sensor_id)
+        if last_time is None or not 0 <= current_time - last_time <= max_gap:
+            last_time = current_time - time_step
+        num_points = int((current_time - last_time) / time_step + 1e-9)
+        if num_points == 0:
+            return []
+        
+        if sensor_id not in self.sensor_phases:
+            self.sensor_phases[sensor_id] = random.uniform(0, 2 * math.pi)
+            self.sensor_last_values[sensor_id] = 0.0
+        base_frequency = 0.05 * (1 + (sensor_id % 5) * 0.2)
+        
+        data_points = []
+        for i in range(num_points):
+            data_points.append({
+                "timestamp": last_time + (i + 1) * time_step,
+                "value": self._generate_single_data_point(sensor_id, base_frequency, time_step)
+            })
+        self.sensor_last_times[sensor_id] = data_points[-1]["timestamp"]
+        return data_points
+    
     def _generate_single_data_point(self, sensor_id: int, base_frequency: float, time_step: float) -> float:
         """
         Generate a single data point for a sensor
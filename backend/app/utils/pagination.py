@@ -0,0 +1,60 @@
+import base64
+import json
+from typing import Optional, Sequence, Tuple
+
+# Page directions: "older" walks back in time (newest first), "newer" walks forward (oldest first)
+DIRECTIONS = ("older", "newer")
+
+def encode_cursor(key: Tuple[float, int], direction: str) -> str:
+    """
+    Build an opaque page cursor
+
+    Args:
+        key: The (timestamp, id) position of the last sample of a page
+        direction: "older" or "newer"
+
+    Returns:
+        A URL-safe token
+    """
+    payload = json.dumps({"t": key[0], "i": key[1], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[Tuple[float, int], str]:
+    """
+    Parse a page cursor built by encode_cursor
+
+    Returns:
+        A tuple of ((timestamp, id), direction)
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = (float(payload["t"]), int(payload["i"]))
+        direction = payload["d"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if direction not in DIRECTIONS:
+        raise ValueError("Invalid cursor")
+    return key, direction
+
+def page_cursors(keys: Sequence[Tuple[float, int]], direction: str, has_more: bool) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get the cursors continuing a page in the same direction and going back
+
+    Args:
+        keys: The (timestamp, id) positions of the page's samples, in page order
+            (see sample_store.read_keyed_samples)
+        direction: "older" or "newer"
+        has_more: Whether samples follow the page
+
+    Returns:
+        A tuple of (next_cursor, prev_cursor); next_cursor is None on the last page
+    """
+    if not keys:
+        return None, None
+    opposite = DIRECTIONS[1 - DIRECTIONS.index(direction)]
+    next_cursor = encode_cursor(keys[-1], direction) if has_more else None
+    return next_cursor, encode_cursor(keys[0], opposite)
@@ -0,0 +1,73 @@
+import hashlib
+import secrets
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+class ResponseCache:
+    """
+    Versioned cache of rendered JSON responses with ETag support
+
+    Every cached body is tagged with the cache version, and any write to the
+    underlying data bumps the version (invalidate), so an ETag stays valid
+    exactly as long as nothing has changed. Clients that send the current ETag
+    in If-None-Match get a 304 without any database work. ETags also carry a
+    random per-process nonce, since versions restart at 0 in every process and
+    would otherwise match ETags issued before a restart or by another worker.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self.nonce = secrets.token_hex(4)
+        self.bodies: Dict[Hashable, bytes] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """Drop every cached response (call after committing a change to the cached data)"""
+        with self._lock:
+            self.version += 1
+            self.bodies.clear()
+
+    def etag(self, key: Hashable, version: Optional[int] = None) -> str:
+        version = self.version if version is None else version
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return f'"{self.name}-{self.nonce}-{version}-{digest}"'
+
+    def _lookup(self, key: Hashable) -> Tuple[int, Optional[bytes]]:
+        with self._lock:
+            return self.version, self.bodies.get(key)
+
+    def _store(self, key: Hashable, version: int, body: bytes) -> None:
+        with self._lock:
+            # Skip bodies rendered from data that changed while they were built
+            if version == self.version:
+                self.bodies[key] = body
+
+    def respond(self, request: Request, key: Hashable, render: Callable[[], bytes]) -> Response:
+        """
+        Answer a request from the cache, rendering the body on a miss
+
+        Args:
+            request: The incoming request (for If-None-Match)
+            key: Identifies the response among those cached (e.g. the query parameters)
+            render: Builds the JSON body; only called on a cache miss
+
+        Returns:
+            A 304 response if the client's copy is current, otherwise the JSON body
+        """
+        version, body = self._lookup(key)
+        etag = self.etag(key, version)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in {tag.strip() for tag in if_none_match.split(",")}:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if body is None:
+            body = render()
+            self._store(key, version, body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+# Shared cache of the user and sensor listings, which embed each other
+listing_cache = ResponseCache("listing")
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from .spectral import spectral_cache
+
+# Retention settings (overridable through environment variables, 0 keeps data forever)
+RETENTION_RAW_HOURS = float(os.getenv("RETENTION_RAW_HOURS", "0"))
+RETENTION_ROLLUP_DAYS = float(os.getenv("RETENTION_ROLLUP_DAYS", "0"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))  # Seconds between runs
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))  # Rows deleted per transaction
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))  # Seconds to yield the write lock between batches
+RETENTION_RUN_BUDGET = float(os.getenv("RETENTION_RUN_BUDGET", "30"))  # Maximum seconds per run
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))  # Pages per incremental vacuum, 0 disables
+
+DELETE_RAW = text(
+    "DELETE FROM sensor_data WHERE id IN ("
+    "SELECT id FROM sensor_data WHERE sensor_id = :sensor_id AND timestamp < :cutoff LIMIT :batch_size)"
+)
+DELETE_CHUNKS = text(
+    "DELETE FROM sensor_data_chunks WHERE id IN ("
+    "SELECT id FROM sensor_data_chunks WHERE sensor_id = :sensor_id AND start_time < :cutoff "
+    "AND end_time < :cutoff LIMIT :batch_size)"
+)
+DELETE_ROLLUPS = text(
+    "DELETE FROM sensor_data_rollups WHERE sensor_id = :sensor_id AND resolution = :resolution AND bucket_start IN ("
+    "SELECT bucket_start FROM sensor_data_rollups WHERE sensor_id = :sensor_id AND resolution = :resolution "
+    "AND bucket_start < :cutoff LIMIT :batch_size)"
+)
+
+class RetentionJob:
+    """
+    Deletes sensor data older than the retention policy.
+
+    Raw samples (rows and chunks) are kept for RETENTION_RAW_HOURS and rollups
+    for RETENTION_ROLLUP_DAYS, unless the sensor overrides them. Deletes run in
+    transactions of at most ``batch_size`` rows with a short pause in between,
+    so the ingest writer never waits long for the write lock, and a run stops
+    once it has used up its time budget.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        raw_hours: float = RETENTION_RAW_HOURS,
+        rollup_days: float = RETENTION_ROLLUP_DAYS,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        batch_pause: float = RETENTION_BATCH_PAUSE,
+        run_budget: float = RETENTION_RUN_BUDGET,
+        vacuum_pages: int = RETENTION_VACUUM_PAGES,
+    ):
+        self.session_factory = session_factory
+        self.raw_hours = raw_hours
+        self.rollup_days = rollup_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.run_budget = run_budget
+        self.vacuum_pages = vacuum_pages
+        self.last_report: Optional[Dict[str, object]] = None
+
+    def _delete_in_batches(self, db: Session, statement, params: dict, deadline: float) -> Tuple[int, bool]:
+        """
+        Run a batched delete until no matching rows are left or the deadline passes
+
+        Returns:
+            A tuple of (rows deleted, whether all matching rows were deleted)
+        """
+        deleted = 0
+        while True:
+            result = db.execute(statement, dict(params, batch_size=self.batch_size))
+            db.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                return deleted, True
+            if time.monotonic() >= deadline:
+                return deleted, False
+            time.sleep(self.batch_pause)
+
+    def _freelist_bytes(self, db: Session) -> int:
+        page_size = db.execute(text("PRAGMA page_size")).scalar()
+        return db.execute(text("PRAGMA freelist_count")).scalar() * page_size
+
+    def run_once(self, now: float = None) -> Dict[str, object]:
+        """
+        Enforce the retention policy once
+
+        Returns:
+            A report with the number of rows deleted and bytes reclaimed
+        """
+        now = now or time.time()
+        started = time.monotonic()
+        deadline = started + self.run_budget
+        report = {
+            "started_at": now,
+            "raw_rows_deleted": 0,
+            "chunks_deleted": 0,
+            "rollups_deleted": 0,
+            "bytes_freed": 0,
+            "bytes_vacuumed": 0,
+            "completed": True,
+        }
+
+        db = self.session_factory()
+        try:
+            freelist_before = self._freelist_bytes(db)
+            sensors = db.query(
+                models.Sensor.id, models.Sensor.raw_retention_hours, models.Sensor.rollup_retention_days
+            ).all()
+            db.commit()
+
+            for sensor_id, raw_hours, rollup_days in sensors:
+                raw_hours = raw_hours or self.raw_hours
+                rollup_days = rollup_days or self.rollup_days
+
+                # (report key, statement, extra params, cutoff)
+                tasks = []
+                if raw_hours:
+                    cutoff = now - raw_hours * 3600
+                    tasks.append(("raw_rows_deleted", DELETE_RAW, {}, cutoff))
+                    tasks.append(("chunks_deleted", DELETE_CHUNKS, {}, cutoff))
+                if rollup_days:
+                    cutoff = now - rollup_days * 86400
+                    resolutions = [row[0] for row in db.query(models.SensorDataRollup.resolution).filter(
+                        models.SensorDataRollup.sensor_id == sensor_id
+                    ).distinct()]
+                    for resolution in resolutions:
+                        tasks.append(("rollups_deleted", DELETE_ROLLUPS, {"resolution": resolution}, cutoff))
+
+                for key, statement, params, cutoff in tasks:
+                    deleted, finished = self._delete_in_batches(
+                        db, statement, dict(params, sensor_id=sensor_id, cutoff=cutoff), deadline
+                    )
+                    report[key] += deleted
+                    if deleted and key != "rollups_deleted":
+                        # Spectra of the segments that lost samples are now stale
+                        spectral_cache.invalidate(sensor_id, end=cutoff)
+                    if not finished:
+                        report["completed"] = False
+                        break
+                if not report["completed"]:
+                    break
+
+            freelist_after = self._freelist_bytes(db)
+            report["bytes_freed"] = max(freelist_after - freelist_before, 0)
+
+            # Return free pages to the file system (requires auto_vacuum=INCREMENTAL)
+            if self.vacuum_pages > 0 and db.bind.dialect.name == "sqlite":
+                page_size = db.execute(text("PRAGMA page_size")).scalar()
+                pages_before = db.execute(text("PRAGMA page_count")).scalar()
+                db.execute(text(f"PRAGMA incremental_vacuum({self.vacuum_pages})"))
+                db.commit()
+                pages_after = db.execute(text("PRAGMA page_count")).scalar()
+                report["bytes_vacuumed"] = max(pages_before - pages_after, 0) * page_size
+        finally:
+            db.close()
+
+        report["duration"] = time.monotonic() - started
+        self.last_report = report
+        deleted = report["raw_rows_deleted"] + report["chunks_deleted"] + report["rollups_deleted"]
+        if deleted:
+            print(
+                f"Retention: deleted {report['raw_rows_deleted']} rows, {report['chunks_deleted']} chunks, "
+                f"{report['rollups_deleted']} rollups; freed {report['bytes_freed']} bytes, "
+                f"vacuumed {report['bytes_vacuumed']} bytes in {report['duration']:.2f}s"
+            )
+        return report
+
+    async def run_periodically(self, interval: float = RETENTION_INTERVAL):
+        """Enforce the retention policy every `interval` seconds without blocking the event loop"""
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Retention error: {e}")
+
+# Shared retention job
+retention_job = RetentionJob()
@@ -0,0 +1,126 @@
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Rollup resolutions in seconds, finest first (an empty value disables rollups)
+ROLLUP_RESOLUTIONS = sorted(
+    int(resolution) for resolution in os.getenv("ROLLUP_RESOLUTIONS", "1,10,60").split(",") if resolution.strip()
+)
+
+def aggregate(timestamps: Sequence[float], values: Sequence[float], resolution: int) -> Dict[float, List[float]]:
+    """
+    Aggregate samples into buckets of `resolution` seconds
+
+    Returns:
+        A dict mapping bucket start time -> [count, min, max, sum, sum of squares]
+    """
+    buckets: Dict[float, List[float]] = {}
+    for timestamp, value in zip(timestamps, values):
+        bucket_start = math.floor(timestamp / resolution) * resolution
+        bucket = buckets.get(bucket_start)
+        if bucket is None:
+            buckets[bucket_start] = [1, value, value, value, value * value]
+        else:
+            bucket[0] += 1
+            if value < bucket[1]:
+                bucket[1] = value
+            if value > bucket[2]:
+                bucket[2] = value
+            bucket[3] += value
+            bucket[4] += value * value
+    return buckets
+
+def update_rollups(db: Session, sensor_id: int, timestamps: Sequence[float], values: Sequence[float]) -> None:
+    """Merge new samples into the rollups of every resolution (the caller commits)"""
+    if not timestamps or not ROLLUP_RESOLUTIONS:
+        return
+
+    table = models.SensorDataRollup.__table__
+    statement = sqlite_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.sensor_id, table.c.resolution, table.c.bucket_start],
+        set_={
+            "count": table.c.count + statement.excluded.count,
+            "min_value": func.min(table.c.min_value, statement.excluded.min_value),
+            "max_value": func.max(table.c.max_value, statement.excluded.max_value),
+            "sum_value": table.c.sum_value + statement.excluded.sum_value,
+            "sum_squares": table.c.sum_squares + statement.excluded.sum_squares,
+        },
+    )
+
+    rows = []
+    for resolution in ROLLUP_RESOLUTIONS:
+        for bucket_start, (count, min_value, max_value, sum_value, sum_squares) in aggregate(timestamps, values, resolution).items():
+            rows.append({
+                "sensor_id": sensor_id,
+                "resolution": resolution,
+                "bucket_start": bucket_start,
+                "count": count,
+                "min_value": min_value,
+                "max_value": max_value,
+                "sum_value": sum_value,
+                "sum_squares": sum_squares,
+            })
+    db.execute(statement, rows)
+
+def choose_resolution(start_time: float, end_time: float, max_points: int) -> Optional[int]:
+    """
+    Pick the finest rollup resolution whose bucket count fits a point budget
+
+    Returns:
+        The resolution in seconds, the coarsest resolution if none fits, or
+        None if rollups are disabled
+    """
+    if not ROLLUP_RESOLUTIONS:
+        return None
+    span = max(end_time - start_time, 0.0)
+    for resolution in ROLLUP_RESOLUTIONS:
+        if span / resolution <= max_points:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+def read_rollups(
+    db: Session,
+    sensor_id: int,
+    resolution: int,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    newest_first: bool = True,
+) -> List[Dict]:
+    """
+    Read rollup buckets for a sensor
+
+    Returns:
+        A list of dicts with timestamp (bucket start), value (mean), min, max,
+        count, rms and resolution
+    """
+    rollup = models.SensorDataRollup
+    query = db.query(
+        rollup.bucket_start, rollup.count, rollup.min_value, rollup.max_value, rollup.sum_value, rollup.sum_squares
+    ).filter(rollup.sensor_id == sensor_id, rollup.resolution == resolution)
+    if start_time is not None:
+        # Include the bucket that contains start_time
+        query = query.filter(rollup.bucket_start > start_time - resolution)
+    if end_time is not None:
+        query = query.filter(rollup.bucket_start <= end_time)
+    query = query.order_by(rollup.bucket_start.desc() if newest_first else rollup.bucket_start.asc())
+
+    return [
+        {
+            "sensor_id": sensor_id,
+            "timestamp": bucket_start,
+            "value": sum_value / count,
+            "min": min_value,
+            "max": max_value,
+            "count": count,
+            "rms": math.sqrt(sum_squares / count),
+            "resolution": resolution,
+        }
+        for bucket_start, count, min_value, max_value, sum_value, sum_squares in query
+    ]
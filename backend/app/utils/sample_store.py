@@ -0,0 +1,308 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .. import models
+from .chunk_codec import MAX_CHUNK_SPAN, decode_chunk, encode_chunk
+from .rollups import update_rollups
+
+# Storage settings (overridable through environment variables)
+SENSOR_STORAGE = os.getenv("SENSOR_STORAGE", "rows")  # "rows" or "chunks"
+CHUNK_SECONDS = float(os.getenv("CHUNK_SECONDS", "5.0"))  # Maximum time span of a chunk
+CHUNK_VALUE_FORMAT = os.getenv("CHUNK_VALUE_FORMAT", "f4")  # "f4" (float32) or "f8" (float64)
+
+if not 0 < CHUNK_SECONDS <= MAX_CHUNK_SPAN:
+    raise ValueError(f"CHUNK_SECONDS must be greater than 0 and at most {int(MAX_CHUNK_SPAN)} seconds")
+
+def split_by_span(timestamps: Sequence[float], values: Sequence[float], span: float = CHUNK_SECONDS) -> List[Tuple[Sequence[float], Sequence[float]]]:
+    """
+    Split time-ordered samples into segments covering at most `span` seconds each
+
+    Args:
+        timestamps: Unix timestamps of the samples, in time order
+        values: Sample values, same length as timestamps
+        span: Maximum time span of a segment in seconds
+
+    Returns:
+        A list of (timestamps, values) segments
+    """
+    segments = []
+    start = 0
+    for i in range(1, len(timestamps)):
+        if timestamps[i] - timestamps[start] > span:
+            segments.append((timestamps[start:i], values[start:i]))
+            start = i
+    if start < len(timestamps):
+        segments.append((timestamps[start:], values[start:]))
+    return segments
+
+def write_samples(db: Session, sensor_id: int, timestamps: Sequence[float], values: Sequence[float], storage: str = None) -> int:
+    """
+    Bulk insert samples for a sensor (the caller commits)
+
+    In "rows" storage every sample becomes a sensor_data row. In "chunks"
+    storage the samples are packed into sensor_data_chunks rows covering at
+    most CHUNK_SECONDS each. The rollups are updated in the same transaction.
+
+    Returns:
+        The number of samples written
+    """
+    if not timestamps:
+        return 0
+    storage = storage or SENSOR_STORAGE
+
+    if storage == "chunks":
+        if any(timestamps[i] > timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            pairs = sorted(zip(timestamps, values))
+            timestamps = [t for t, _ in pairs]
+            values = [v for _, v in pairs]
+        rows = [
+            dict(sensor_id=sensor_id, **encode_chunk(segment_ts, segment_values, CHUNK_VALUE_FORMAT))
+            for segment_ts, segment_values in split_by_span(timestamps, values)
+        ]
+        db.execute(insert(models.SensorDataChunk), rows)
+    else:
+        db.execute(
+            insert(models.SensorData),
+            [
+                {"sensor_id": sensor_id, "timestamp": timestamp, "value": value}
+                for timestamp, value in zip(timestamps, values)
+            ],
+        )
+    update_rollups(db, sensor_id, timestamps, values)
+    return len(timestamps)
+
+# A keyset position: (timestamp, row ID, or chunk_key_id() for samples from chunk storage)
+SampleKey = Tuple[float, int]
+
+def chunk_key_id(chunk_id: int, position: int) -> int:
+    """
+    Get the keyset ID of the sample at `position` in a chunk
+
+    Chunk samples have no row ID, so they are keyed by their chunk and position
+    instead. The result is negative, which keeps it apart from row IDs, and
+    unique per sample, so samples sharing a timestamp are never skipped at a
+    page boundary.
+    """
+    return -((chunk_id << 32) + position + 1)
+
+def _read_rows(db: Session, sensor_id: int, start_time: Optional[float], end_time: Optional[float], limit: Optional[int], newest_first: bool, after: Optional[SampleKey] = None) -> List[Tuple[SampleKey, Dict]]:
+    query = db.query(models.SensorData.id, models.SensorData.timestamp, models.SensorData.value).filter(
+        models.SensorData.sensor_id == sensor_id
+    )
+    if start_time is not None:
+        query = query.filter(models.SensorData.timestamp >= start_time)
+    if end_time is not None:
+        query = query.filter(models.SensorData.timestamp <= end_time)
+    key = tuple_(models.SensorData.timestamp, models.SensorData.id)
+    if after is not None:
+        query = query.filter(key < after if newest_first else key > after)
+    if newest_first:
+        query = query.order_by(models.SensorData.timestamp.desc(), models.SensorData.id.desc())
+    else:
+        query = query.order_by(models.SensorData.timestamp.asc(), models.SensorData.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [
+        ((timestamp, row_id), {"id": row_id, "sensor_id": sensor_id, "timestamp": timestamp, "value": value})
+        for row_id, timestamp, value in query
+    ]
+
+def _read_chunks(db: Session, sensor_id: int, start_time: Optional[float], end_time: Optional[float], limit: Optional[int], newest_first: bool, after: Optional[SampleKey] = None) -> List[Tuple[SampleKey, Dict]]:
+    query = db.query(models.SensorDataChunk).filter(models.SensorDataChunk.sensor_id == sensor_id)
+    # A chunk never spans more than CHUNK_SECONDS, so overlapping chunks can be found
+    # with a range seek on (sensor_id, start_time)
+    if start_time is not None:
+        query = query.filter(models.SensorDataChunk.start_time >= start_time - CHUNK_SECONDS)
+        query = query.filter(models.SensorDataChunk.end_time >= start_time)
+    if end_time is not None:
+        query = query.filter(models.SensorDataChunk.start_time <= end_time)
+    if after is not None:
+        # Chunks that can hold samples past the keyset position
+        if newest_first:
+            query = query.filter(models.SensorDataChunk.start_time <= after[0])
+        else:
+            query = query.filter(models.SensorDataChunk.end_time >= after[0])
+    order = models.SensorDataChunk.start_time.desc() if newest_first else models.SensorDataChunk.start_time.asc()
+
+    samples = []
+    for chunk in query.order_by(order).yield_per(64):
+        if limit is not None and len(samples) >= limit:
+            # Keep reading while a chunk can still hold samples before the limit-th one, as
+            # chunks starting at the same time (or overlapping) interleave with the ones read
+            samples.sort(key=lambda pair: pair[0], reverse=newest_first)
+            del samples[limit:]
+            boundary = samples[-1][0][0]
+            if chunk.start_time < boundary - CHUNK_SECONDS if newest_first else chunk.start_time > boundary:
+                break
+        timestamps, values = decode_chunk(chunk)
+        positions = range(len(timestamps))
+        if newest_first:
+            positions = reversed(positions)
+        for position in positions:
+            timestamp = timestamps[position]
+            if (start_time is not None and timestamp < start_time) or (end_time is not None and timestamp > end_time):
+                continue
+            key = (timestamp, chunk_key_id(chunk.id, position))
+            if after is not None and (key >= after if newest_first else key <= after):
+                continue
+            samples.append((key, {"id": None, "sensor_id": sensor_id, "timestamp": timestamp, "value": values[position]}))
+    return samples
+
+def read_keyed_samples(
+    db: Session,
+    sensor_id: int,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = True,
+    after: Optional[SampleKey] = None,
+) -> List[Tuple[SampleKey, Dict]]:
+    """
+    Read samples for a sensor from both row and chunk storage with their keyset positions
+
+    Takes the same arguments as read_samples.
+
+    Returns:
+        A list of (key, sample) pairs ordered by key, where key is the
+        (timestamp, id) position to pass as `after` to continue past the sample
+    """
+    rows = _read_rows(db, sensor_id, start_time, end_time, limit, newest_first, after)
+    chunked = _read_chunks(db, sensor_id, start_time, end_time, limit, newest_first, after)
+    if not chunked:
+        return rows
+
+    samples = rows + chunked
+    samples.sort(key=lambda pair: pair[0], reverse=newest_first)
+    if limit is not None:
+        samples = samples[:limit]
+    return samples
+
+def read_samples(
+    db: Session,
+    sensor_id: int,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: Optional[int] = None,
+    newest_first: bool = True,
+    after: Optional[SampleKey] = None,
+) -> List[Dict]:
+    """
+    Read samples for a sensor from both row and chunk storage
+
+    Args:
+        db: Database session
+        sensor_id: The ID of the sensor
+        start_time: Optional inclusive lower bound on the timestamp
+        end_time: Optional inclusive upper bound on the timestamp
+        limit: Optional maximum number of samples to return
+        newest_first: Order samples by descending timestamp
+        after: Optional keyset position (timestamp, id) to continue from; only
+            samples past it in the read order are returned. Chunk samples are
+            keyed by chunk_key_id() (see read_keyed_samples).
+
+    Returns:
+        A list of dicts with id, sensor_id, timestamp and value, ordered by
+        (timestamp, id)
+    """
+    return [sample for _, sample in read_keyed_samples(db, sensor_id, start_time, end_time, limit, newest_first, after)]
+
+def read_samples_many(
+    db: Session,
+    sensor_ids: Sequence[int],
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> Dict[int, List[Dict]]:
+    """
+    Read the newest samples of several sensors with one query per storage table
+
+    Args:
+        db: Database session
+        sensor_ids: The IDs of the sensors
+        start_time: Optional inclusive lower bound on the timestamp
+        end_time: Optional inclusive upper bound on the timestamp
+        limit: Optional maximum number of samples per sensor
+
+    Returns:
+        A dict mapping each sensor ID to its samples (same dicts and order as
+        read_samples with newest_first=True)
+    """
+    keyed: Dict[int, List[Tuple[SampleKey, Dict]]] = {sensor_id: [] for sensor_id in sensor_ids}
+    if not keyed:
+        return {}
+
+    data = models.SensorData
+    conditions = [data.sensor_id.in_(keyed)]
+    if start_time is not None:
+        conditions.append(data.timestamp >= start_time)
+    if end_time is not None:
+        conditions.append(data.timestamp <= end_time)
+    if limit is not None:
+        # Number the rows of each sensor newest first and keep the first `limit`
+        rank = func.row_number().over(
+            partition_by=data.sensor_id, order_by=(data.timestamp.desc(), data.id.desc())
+        ).label("rank")
+        ranked = select(data.id, data.sensor_id, data.timestamp, data.value, rank).where(*conditions).subquery()
+        statement = select(ranked.c.id, ranked.c.sensor_id, ranked.c.timestamp, ranked.c.value).where(ranked.c.rank <= limit)
+    else:
+        statement = select(data.id, data.sensor_id, data.timestamp, data.value).where(*conditions)
+    for row_id, sensor_id, timestamp, value in db.execute(statement):
+        keyed[sensor_id].append(((timestamp, row_id), {"id": row_id, "sensor_id": sensor_id, "timestamp": timestamp, "value": value}))
+
+    chunk = models.SensorDataChunk
+    query = db.query(chunk).filter(chunk.sensor_id.in_(keyed))
+    if start_time is not None:
+        query = query.filter(chunk.start_time >= start_time - CHUNK_SECONDS, chunk.end_time >= start_time)
+    if end_time is not None:
+        query = query.filter(chunk.start_time <= end_time)
+    for row in query.yield_per(64):
+        for position, (timestamp, value) in enumerate(zip(*decode_chunk(row))):
+            if (start_time is None or timestamp >= start_time) and (end_time is None or timestamp <= end_time):
+                keyed[row.sensor_id].append((
+                    (timestamp, chunk_key_id(row.id, position)),
+                    {"id": None, "sensor_id": row.sensor_id, "timestamp": timestamp, "value": value},
+                ))
+
+    results: Dict[int, List[Dict]] = {}
+    for sensor_id, samples in keyed.items():
+        samples.sort(key=lambda pair: pair[0], reverse=True)
+        results[sensor_id] = [sample for _, sample in samples[:limit]]
+    return results
+
+def read_series(
+    db: Session,
+    sensor_id: int,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+) -> Tuple[List[float], List[float]]:
+    """
+    Read a time range for a sensor as two parallel lists in time order
+
+    This skips building a dict per sample and is meant for reads that are
+    processed further (downsampling, statistics) rather than returned as-is.
+
+    Returns:
+        A tuple of (timestamps, values)
+    """
+    query = db.query(models.SensorData.timestamp, models.SensorData.value).filter(
+        models.SensorData.sensor_id == sensor_id
+    )
+    if start_time is not None:
+        query = query.filter(models.SensorData.timestamp >= start_time)
+    if end_time is not None:
+        query = query.filter(models.SensorData.timestamp <= end_time)
+    rows = query.order_by(models.SensorData.timestamp.asc()).all()
+    timestamps = [timestamp for timestamp, _ in rows]
+    values = [value for _, value in rows]
+
+    chunked = _read_chunks(db, sensor_id, start_time, end_time, None, newest_first=False)
+    if chunked:
+        pairs = sorted(
+            list(zip(timestamps, values)) + [(sample["timestamp"], sample["value"]) for _, sample in chunked]
+        )
+        timestamps = [timestamp for timestamp, _ in pairs]
+        values = [value for _, value in pairs]
+    return timestamps, values
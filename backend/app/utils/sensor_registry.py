@@ -0,0 +1,110 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import run_db
+
+# Called as listener(sensor_id, info) after every change; info is None when the sensor was deleted
+SensorListener = Callable[[int, Optional[Dict]], None]
+
+class SensorRegistry:
+    """
+    In-process copy of the sensor metadata read on every broadcast tick
+
+    The registry is loaded from the database once and then kept current by the
+    routes that change sensors (create, update, delete, mock start/stop), so the
+    broadcaster and websocket endpoints look up names, data rates and active
+    flags without querying. Listeners registered with add_listener see every
+    change as soon as it is committed.
+    """
+
+    def __init__(self):
+        # Maps sensor_id -> {"sensor_name", "data_rate", "is_active"}
+        self.sensors: Dict[int, Dict] = {}
+        self.loaded = False
+        self._listeners: List[SensorListener] = []
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """Replace the registry with the sensors in the database"""
+        rows = db.query(
+            models.Sensor.id, models.Sensor.sensor_name, models.Sensor.sensor_data_rate, models.Sensor.is_active
+        ).all()
+        with self._lock:
+            self.sensors = {
+                sensor_id: {"sensor_name": name, "data_rate": data_rate, "is_active": bool(is_active)}
+                for sensor_id, name, data_rate, is_active in rows
+            }
+            self.loaded = True
+
+    async def ensure_loaded(self) -> None:
+        """Load the registry on the database executor unless it is already loaded"""
+        if not self.loaded:
+            await run_db(self.load)
+
+    def clear(self) -> None:
+        """Forget every sensor; the next user has to load the registry again"""
+        with self._lock:
+            self.sensors = {}
+            self.loaded = False
+
+    def add_listener(self, listener: SensorListener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: SensorListener) -> None:
+        self._listeners.remove(listener)
+
+    def get(self, sensor_id: int) -> Optional[Dict]:
+        """Get the name, data rate and active flag of a sensor, or None if it does not exist"""
+        with self._lock:
+            info = self.sensors.get(sensor_id)
+            return dict(info) if info is not None else None
+
+    def active_rates(self, sensor_ids: Iterable[int]) -> Dict[int, float]:
+        """Get the data rate of every active sensor among sensor_ids"""
+        with self._lock:
+            return {
+                sensor_id: self.sensors[sensor_id]["data_rate"]
+                for sensor_id in sensor_ids
+                if sensor_id in self.sensors and self.sensors[sensor_id]["is_active"]
+            }
+
+    def update(self, sensor: models.Sensor) -> None:
+        """Record a created or updated sensor (call after committing it)"""
+        info = {
+            "sensor_name": sensor.sensor_name,
+            "data_rate": sensor.sensor_data_rate,
+            "is_active": bool(sensor.is_active),
+        }
+        with self._lock:
+            self.sensors[sensor.id] = info
+        self._notify(sensor.id, dict(info))
+
+    def set_active(self, sensor_id: int, is_active: bool) -> None:
+        """Record a change of a sensor's active flag"""
+        with self._lock:
+            info = self.sensors.get(sensor_id)
+            if info is None or info["is_active"] == is_active:
+                return
+            info["is_active"] = is_active
+            info = dict(info)
+        self._notify(sensor_id, info)
+
+    def remove(self, sensor_id: int) -> None:
+        """Record a deleted sensor"""
+        with self._lock:
+            if self.sensors.pop(sensor_id, None) is None:
+                return
+        self._notify(sensor_id, None)
+
+    def _notify(self, sensor_id: int, info: Optional[Dict]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(sensor_id, info)
+            except Exception as e:
+                print(f"Sensor registry listener error: {e}")
+
+# Shared registry used by the routers and the broadcaster
+sensor_registry = SensorRegistry()
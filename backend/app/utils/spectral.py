@@ -0,0 +1,320 @@
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Spectral analysis settings (overridable through environment variables)
+SPECTRAL_ANALYSIS_RATE = float(os.getenv("SPECTRAL_ANALYSIS_RATE", "4"))  # Hz the signal is resampled to
+SPECTRAL_CACHE_SEGMENTS = int(os.getenv("SPECTRAL_CACHE_SEGMENTS", "2048"))  # Periodograms kept per cache entry
+SPECTRAL_CACHE_ENTRIES = int(os.getenv("SPECTRAL_CACHE_ENTRIES", "64"))  # (sensor, parameters) combinations kept
+SPECTRAL_MIN_COVERAGE = 0.8  # Fraction of a segment's samples required to analyze it
+SPECTRAL_INVALIDATIONS_KEPT = 64  # Recent invalidations remembered per sensor for in-flight analyses
+
+# EGG frequency bands in cycles per minute
+EGG_BANDS = (
+    ("bradygastria", 0.5, 2.0),
+    ("normogastria", 2.0, 4.0),
+    ("tachygastria", 4.0, 10.0),
+)
+EGG_RANGE_CPM = (0.5, 10.0)  # Range searched for the dominant frequency
+SPECTRUM_MAX_CPM = 15.0  # Highest frequency returned in the spectrum
+
+def segment_indices(start_time: float, end_time: float, segment_seconds: float, step_seconds: float) -> List[int]:
+    """
+    Get the segments that fit inside a window
+
+    Segments start at multiples of step_seconds in absolute time, so a sliding
+    window shares its segments with earlier requests and their periodograms can
+    be reused.
+
+    Returns:
+        The indices k of the segments [k * step, k * step + segment_seconds]
+    """
+    first = math.ceil(start_time / step_seconds - 1e-9)
+    last = math.floor((end_time - segment_seconds) / step_seconds + 1e-9)
+    return list(range(first, last + 1))
+
+def _resample(timestamps: np.ndarray, values: np.ndarray, grid: np.ndarray, source_rate: float, target_rate: float) -> np.ndarray:
+    # Average over the decimation factor first so faster content does not alias
+    width = int(round(source_rate / target_rate))
+    if width > 1 and len(values) >= width:
+        kernel = np.full(width, 1.0 / width)
+        values = np.convolve(values, kernel, mode="same")
+    return np.interp(grid, timestamps, values)
+
+def periodograms(
+    timestamps: Sequence[float],
+    values: Sequence[float],
+    starts: Sequence[float],
+    segment_seconds: float,
+    source_rate: float,
+    sample_rate: float = SPECTRAL_ANALYSIS_RATE,
+) -> Dict[int, np.ndarray]:
+    """
+    Compute the Hann-windowed periodogram of each segment
+
+    Args:
+        timestamps: Raw sample timestamps in time order
+        values: Raw sample values
+        starts: Start times of the segments to compute
+        segment_seconds: Length of a segment
+        source_rate: Nominal rate of the raw samples in Hz
+        sample_rate: Rate the segments are resampled to before the FFT
+
+    Returns:
+        A dict mapping the position of each segment in `starts` to its one-sided
+        power spectral density; segments with less than SPECTRAL_MIN_COVERAGE of
+        their samples are left out
+    """
+    ts = np.asarray(timestamps, dtype=np.float64)
+    x = np.asarray(values, dtype=np.float64)
+    if len(ts) < 2 or not len(starts):
+        return {}
+
+    # Keep the segments that have enough samples
+    starts = np.asarray(starts, dtype=np.float64)
+    counts = np.searchsorted(ts, starts + segment_seconds, side="right") - np.searchsorted(ts, starts, side="left")
+    positions = np.flatnonzero(counts >= SPECTRAL_MIN_COVERAGE * segment_seconds * source_rate)
+    if not len(positions):
+        return {}
+    starts = starts[positions]
+
+    length = int(round(segment_seconds * sample_rate))
+    grid = starts[:, None] + np.arange(length)[None, :] / sample_rate
+    segments = _resample(ts, x, grid.ravel(), source_rate, sample_rate).reshape(grid.shape)
+    segments -= segments.mean(axis=1, keepdims=True)
+
+    window = np.hanning(length)
+    spectra = np.fft.rfft(segments * window, axis=1)
+    psd = (np.abs(spectra) ** 2) / (sample_rate * np.sum(window ** 2))
+    # One-sided: double everything except DC (and Nyquist for even lengths)
+    psd[:, 1:(length - 1 if length % 2 == 0 else length)] *= 2
+    return {int(position): row for position, row in zip(positions, psd)}
+
+def frequencies(segment_seconds: float, sample_rate: float = SPECTRAL_ANALYSIS_RATE) -> np.ndarray:
+    """Frequencies in Hz of the periodogram bins"""
+    length = int(round(segment_seconds * sample_rate))
+    return np.fft.rfftfreq(length, 1.0 / sample_rate)
+
+def summarize(freqs: np.ndarray, psd: np.ndarray) -> Dict:
+    """
+    Get the dominant frequency and EGG band powers of a spectrum
+
+    Returns:
+        A dict with dominant_frequency_cpm, dominant_power and bands (a list of
+        dicts with name, low_cpm, high_cpm, power and ratio to the power of the
+        whole EGG range)
+    """
+    cpm = freqs * 60.0
+    df = freqs[1] - freqs[0] if len(freqs) > 1 else 0.0
+    in_range = (cpm >= EGG_RANGE_CPM[0]) & (cpm < EGG_RANGE_CPM[1])
+    total = float(psd[in_range].sum() * df)
+
+    dominant_frequency = None
+    dominant_power = None
+    if in_range.any() and total > 0:
+        peak = np.flatnonzero(in_range)[np.argmax(psd[in_range])]
+        dominant_frequency = float(cpm[peak])
+        dominant_power = float(psd[peak])
+
+    bands = []
+    for name, low, high in EGG_BANDS:
+        power = float(psd[(cpm >= low) & (cpm < high)].sum() * df)
+        bands.append({
+            "name": name,
+            "low_cpm": low,
+            "high_cpm": high,
+            "power": power,
+            "ratio": power / total if total > 0 else None,
+        })
+    return {"dominant_frequency_cpm": dominant_frequency, "dominant_power": dominant_power, "bands": bands}
+
+class SpectralCache:
+    """
+    Per-segment periodograms keyed by (sensor, source rate, segment length, step, rate)
+
+    A live window that slides forward only needs the periodograms of the
+    segments that were not complete at the previous request; everything else
+    is averaged from the cache.
+
+    Writes and deletes of a sensor's samples invalidate the cached segments
+    they overlap. Each invalidation bumps the sensor's generation, and store()
+    skips segments invalidated after the generation an analysis started from,
+    so a periodogram computed from data read before a change is not cached.
+    """
+
+    def __init__(self, max_entries: int = SPECTRAL_CACHE_ENTRIES, max_segments: int = SPECTRAL_CACHE_SEGMENTS):
+        self.max_entries = max_entries
+        self.max_segments = max_segments
+        self.entries: "OrderedDict[Tuple, Dict[int, np.ndarray]]" = OrderedDict()
+        self.segments_computed = 0
+        self.segments_reused = 0
+        self.segments_invalidated = 0
+        # Per sensor: current generation and the recent (generation, start, end) invalidations
+        self.generations: Dict[int, int] = {}
+        self.invalidations: Dict[int, Deque[Tuple[int, float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, sensor_id: int) -> int:
+        """Get the sensor's generation, to pass to store() after computing from fresh reads"""
+        with self._lock:
+            return self.generations.get(sensor_id, 0)
+
+    def lookup(self, key: Tuple, indices: Sequence[int]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Split segment indices into cached periodograms and missing indices
+
+        Returns:
+            A tuple of (cached periodograms by index, missing indices)
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return {}, list(indices)
+            self.entries.move_to_end(key)
+            cached = {index: entry[index] for index in indices if index in entry}
+            self.segments_reused += len(cached)
+            return cached, [index for index in indices if index not in cached]
+
+    def store(self, key: Tuple, computed: Dict[int, np.ndarray], generation: Optional[int] = None) -> None:
+        """
+        Cache computed periodograms
+
+        Args:
+            key: The cache key (see analyze)
+            computed: Periodograms by segment index
+            generation: The sensor's generation before its samples were read;
+                segments invalidated since then are not stored
+        """
+        with self._lock:
+            sensor_id, _, segment_seconds, step, _ = key
+            if generation is not None and generation != self.generations.get(sensor_id, 0):
+                recent = self.invalidations.get(sensor_id, ())
+                if not recent or recent[0][0] > generation + 1:
+                    # Older invalidations were forgotten, so none of the segments can be trusted
+                    return
+                for changed, start, end in recent:
+                    if changed > generation:
+                        computed = {
+                            index: psd for index, psd in computed.items()
+                            if not _overlaps(index, segment_seconds, step, start, end)
+                        }
+            self.segments_computed += len(computed)
+            entry = self.entries.setdefault(key, {})
+            self.entries.move_to_end(key)
+            entry.update(computed)
+            # Keep the newest segments of an entry, and the most recently used entries
+            for index in sorted(entry)[:max(len(entry) - self.max_segments, 0)]:
+                del entry[index]
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, sensor_id: int, start: float = -math.inf, end: float = math.inf) -> None:
+        """Drop a sensor's cached periodograms whose segments overlap [start, end] (call after its samples change)"""
+        with self._lock:
+            generation = self.generations.get(sensor_id, 0) + 1
+            self.generations[sensor_id] = generation
+            recent = self.invalidations.setdefault(sensor_id, deque(maxlen=SPECTRAL_INVALIDATIONS_KEPT))
+            recent.append((generation, start, end))
+            for key, entry in self.entries.items():
+                if key[0] != sensor_id:
+                    continue
+                _, _, segment_seconds, step, _ = key
+                stale = [index for index in entry if _overlaps(index, segment_seconds, step, start, end)]
+                for index in stale:
+                    del entry[index]
+                self.segments_invalidated += len(stale)
+
+    def remove(self, sensor_id: int) -> None:
+        """Drop every cached periodogram of a sensor"""
+        self.invalidate(sensor_id)
+        with self._lock:
+            for key in [key for key in self.entries if key[0] == sensor_id]:
+                del self.entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+def _overlaps(index: int, segment_seconds: float, step: float, start: float, end: float) -> bool:
+    return index * step <= end and index * step + segment_seconds >= start
+
+def analyze(
+    read_series,
+    sensor_id: int,
+    source_rate: float,
+    start_time: float,
+    end_time: float,
+    segment_seconds: float,
+    overlap: float,
+    spectrogram: bool = False,
+    cache: Optional[SpectralCache] = None,
+    sample_rate: float = SPECTRAL_ANALYSIS_RATE,
+) -> Dict:
+    """
+    Welch power spectrum of a sensor window with EGG band summary
+
+    Args:
+        read_series: Called as read_series(start, end) to get raw (timestamps, values)
+        sensor_id: The ID of the sensor (part of the cache key)
+        source_rate: Nominal data rate of the sensor in Hz
+        start_time: Start of the window
+        end_time: End of the window
+        segment_seconds: Welch segment length
+        overlap: Fraction of overlap between consecutive segments (0 to <1)
+        spectrogram: Also return the spectrum of every segment
+        cache: Periodogram cache (defaults to the shared one)
+        sample_rate: Rate the signal is resampled to before the FFT
+
+    Returns:
+        A dict with sample_rate, segment_seconds, overlap, segments,
+        frequencies_cpm, psd, dominant_frequency_cpm, dominant_power, bands and,
+        when requested, spectrogram
+    """
+    cache = spectral_cache if cache is None else cache
+    step = segment_seconds * (1.0 - overlap)
+    indices = segment_indices(start_time, end_time, segment_seconds, step)
+    key = (sensor_id, source_rate, segment_seconds, step, sample_rate)
+    generation = cache.generation(sensor_id)
+    spectra, missing = cache.lookup(key, indices)
+
+    if missing:
+        # Only read the span of the segments that still have to be computed
+        timestamps, values = read_series(missing[0] * step, missing[-1] * step + segment_seconds)
+        computed = periodograms(timestamps, values, [index * step for index in missing], segment_seconds, source_rate, sample_rate)
+        computed = {missing[position]: psd for position, psd in computed.items()}
+        spectra.update(computed)
+        # Segments reaching past the newest sample may still fill up, so they are not cached
+        newest = timestamps[-1] if len(timestamps) else -math.inf
+        cache.store(key, {index: psd for index, psd in computed.items() if index * step + segment_seconds <= newest}, generation)
+
+    freqs = frequencies(segment_seconds, sample_rate)
+    keep = freqs * 60.0 <= SPECTRUM_MAX_CPM
+    result = {
+        "sample_rate": sample_rate,
+        "segment_seconds": segment_seconds,
+        "overlap": overlap,
+        "segments": len(spectra),
+    }
+    if not spectra:
+        return dict(result, frequencies_cpm=[], psd=[], **summarize(freqs, np.zeros(len(freqs))))
+
+    ordered = sorted(spectra)
+    psd = np.mean([spectra[index] for index in ordered], axis=0)
+    result.update(summarize(freqs, psd), frequencies_cpm=(freqs[keep] * 60.0).tolist(), psd=psd[keep].tolist())
+    if spectrogram:
+        result["spectrogram"] = [
+            {
+                "start_time": index * step,
+                "dominant_frequency_cpm": summarize(freqs, spectra[index])["dominant_frequency_cpm"],
+                "psd": spectra[index][keep].tolist(),
+            }
+            for index in ordered
+        ]
+    return result
+
+# Shared cache used by the spectral endpoint
+spectral_cache = SpectralCache()
@@ -0,0 +1,83 @@
+import os
+import time
+from typing import Optional
+
+# Live broadcast tick settings (overridable through environment variables)
+WS_TICK_MS = int(os.getenv("WS_TICK_MS", "1000"))  # Milliseconds between broadcast ticks
+WS_TICK_MODE = os.getenv("WS_TICK_MODE", "fixed")  # fixed or adaptive
+WS_ADAPTIVE_CONNECTIONS = int(os.getenv("WS_ADAPTIVE_CONNECTIONS", "50"))  # Connections per step of the adaptive tick
+
+# Range accepted for the server tick and the tick requested by a connection
+MIN_TICK_MS = 20
+MAX_TICK_MS = 1000
+
+TICK_MODES = ("fixed", "adaptive")
+
+def clamp_tick_ms(tick_ms: float) -> int:
+    """Limit a tick to MIN_TICK_MS..MAX_TICK_MS"""
+    return int(min(max(tick_ms, MIN_TICK_MS), MAX_TICK_MS))
+
+def parse_tick_ms(value) -> Optional[int]:
+    """
+    Read a tick requested by a client
+
+    Returns:
+        The tick in milliseconds, clamped to the accepted range, or None if the
+        value is missing or not a number
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        tick_ms = float(value)
+    except (TypeError, ValueError):
+        return None
+    return clamp_tick_ms(tick_ms) if tick_ms == tick_ms else None
+
+def server_interval(
+    connections: int,
+    busy: float = 0.0,
+    tick_ms: int = WS_TICK_MS,
+    mode: str = WS_TICK_MODE,
+    adaptive_connections: int = WS_ADAPTIVE_CONNECTIONS,
+) -> float:
+    """
+    Get the server broadcast interval in seconds
+
+    In fixed mode this is tick_ms. In adaptive mode the tick starts at
+    MIN_TICK_MS and grows by MIN_TICK_MS for every adaptive_connections
+    connections, up to tick_ms; it also stays at least twice the time the last
+    tick took (busy), so a loaded server sends fewer, larger frames instead of
+    falling behind.
+    """
+    if mode != "adaptive":
+        return clamp_tick_ms(tick_ms) / 1000.0
+    steps = 1 + connections // max(adaptive_connections, 1)
+    interval = min(MIN_TICK_MS * steps, clamp_tick_ms(tick_ms)) / 1000.0
+    return min(max(interval, 2 * busy), MAX_TICK_MS / 1000.0)
+
+class TickClock:
+    """
+    Schedules ticks against the monotonic clock
+
+    Each deadline is the previous deadline plus the interval, so the time spent
+    processing a tick does not push the following ones back. When a tick runs
+    past its successor's deadline the missed ticks are skipped rather than fired
+    back to back.
+    """
+
+    def __init__(self):
+        self.deadline: Optional[float] = None
+        self.ticks_missed = 0
+
+    def delay(self, interval: float) -> float:
+        """Advance the deadline by interval and get the seconds to sleep until it"""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += interval
+        delay = self.deadline - now
+        if delay < 0:
+            self.ticks_missed += int(-delay // interval) + 1 if interval > 0 else 1
+            self.deadline = now
+            delay = 0.0
+        return delay
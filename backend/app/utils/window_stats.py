@@ -0,0 +1,74 @@
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Statistics settings (overridable through environment variables)
+STATS_MAX_RAW_SAMPLES = int(os.getenv("STATS_MAX_RAW_SAMPLES", "500000"))  # Longer windows use the rollups
+STATS_MAX_ROLLUP_BUCKETS = int(os.getenv("STATS_MAX_ROLLUP_BUCKETS", "100000"))  # Finest rollup resolution used is the one that fits this many buckets
+DEFAULT_PERCENTILES = (5.0, 25.0, 50.0, 75.0, 95.0)
+
+def raw_stats(timestamps: Sequence[float], values: Sequence[float], percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict:
+    """
+    Summary statistics of raw samples
+
+    Zero crossings are counted on the mean-removed signal, so they measure the
+    oscillation around the baseline rather than around an absolute zero.
+
+    Args:
+        timestamps: Sample timestamps in time order
+        values: Sample values, same length as timestamps
+        percentiles: Percentiles to compute (0-100)
+
+    Returns:
+        A dict with count, mean, std, rms, min, max, percentiles (keyed by
+        their string form), zero_crossings and zero_crossing_rate (per second)
+    """
+    x = np.asarray(values, dtype=np.float64)
+    if not len(x):
+        return {"count": 0}
+    mean = x.mean()
+    centered = x - mean
+    signs = np.signbit(centered[centered != 0])
+    zero_crossings = int(np.count_nonzero(signs[1:] != signs[:-1]))
+    duration = timestamps[-1] - timestamps[0]
+    return {
+        "count": len(x),
+        "mean": float(mean),
+        "std": float(centered.std()),
+        "rms": float(np.sqrt(np.mean(x * x))),
+        "min": float(x.min()),
+        "max": float(x.max()),
+        "percentiles": {
+            f"{p:g}": float(v) for p, v in zip(percentiles, np.percentile(x, percentiles))
+        } if percentiles else {},
+        "zero_crossings": zero_crossings,
+        "zero_crossing_rate": zero_crossings / duration if duration > 0 else None,
+    }
+
+def rollup_stats(buckets: List[Dict], edge_values: Sequence[float] = ()) -> Dict:
+    """
+    Summary statistics of rollup buckets (as returned by rollups.read_rollups)
+
+    The buckets must lie entirely inside the window; the raw samples of the
+    partial buckets at its edges are passed as edge_values. The moments and
+    extremes are then exact; percentiles and zero crossings need all the raw
+    samples and are not reported.
+    """
+    edges = np.asarray(edge_values, dtype=np.float64)
+    if not buckets and not len(edges):
+        return {"count": 0}
+    counts = np.fromiter((bucket["count"] for bucket in buckets), dtype=np.float64, count=len(buckets))
+    means = np.fromiter((bucket["value"] for bucket in buckets), dtype=np.float64, count=len(buckets))
+    rms = np.fromiter((bucket["rms"] for bucket in buckets), dtype=np.float64, count=len(buckets))
+    total = counts.sum() + len(edges)
+    mean = float(((means * counts).sum() + edges.sum()) / total)
+    mean_square = float(((rms * rms * counts).sum() + (edges * edges).sum()) / total)
+    return {
+        "count": int(total),
+        "mean": mean,
+        "std": float(np.sqrt(max(mean_square - mean * mean, 0.0))),
+        "rms": float(np.sqrt(mean_square)),
+        "min": min([bucket["min"] for bucket in buckets] + ([float(edges.min())] if len(edges) else [])),
+        "max": max([bucket["max"] for bucket in buckets] + ([float(edges.max())] if len(edges) else [])),
+    }
@@ -0,0 +1,181 @@
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import msgpack
+
+# Binary batch frame (little-endian): version (uint8), frame type (uint8: 1 for
+# live batch_data, 2 for backfill history) and
+# sensor count (uint16), then for every sensor its ID (uint32) and sample count
+# (uint32) followed by `count` float64 timestamps and `count` float32 values
+BINARY_VERSION = 1
+BINARY_FRAME_TYPES = {"batch_data": 1, "backfill": 2}
+BATCH_FRAME_HEADER = struct.Struct("<BBH")
+BATCH_SENSOR_HEADER = struct.Struct("<II")
+
+# Negotiate permessage-deflate on websocket connections (passed to uvicorn by main.py and run.py;
+# set UVICORN_WS_PER_MESSAGE_DEFLATE when starting the uvicorn command directly)
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() in ("1", "true", "yes")
+
+# Delta frames send evenly spaced timestamps as t0 + i * dt when every
+# reconstructed timestamp is within this many seconds of the original
+DELTA_TIME_TOLERANCE = 1e-6
+
+# Websocket subprotocols by wire format
+SUBPROTOCOLS = {
+    "json": "egg.json.v1",
+    "delta": "egg.delta.v1",
+    "binary": "egg.binary.v1",
+    "msgpack": "egg.msgpack.v1",
+}
+
+# Media types used when the REST data endpoint returns a wire format
+MEDIA_TYPES = {
+    "json": "application/json",
+    "delta": "application/json",
+    "binary": "application/vnd.egg.batch",
+    "msgpack": "application/x-msgpack",
+}
+
+Series = Tuple[Sequence[float], Sequence[float]]
+Frame = Union[str, bytes]
+
+def available_formats() -> Tuple[str, ...]:
+    """Get the wire formats this server can produce"""
+    return tuple(SUBPROTOCOLS)
+
+def negotiate(requested: Optional[str], subprotocols: Iterable[str] = ()) -> Tuple[str, Optional[str]]:
+    """
+    Pick a websocket wire format from a query parameter or the offered subprotocols
+
+    Returns:
+        A tuple of (wire format, subprotocol to accept or None); unsupported
+        requests fall back to JSON
+    """
+    formats = available_formats()
+    offered = list(subprotocols)
+    for wire_format, subprotocol in SUBPROTOCOLS.items():
+        if subprotocol in offered and wire_format in formats and (requested is None or requested == wire_format):
+            return wire_format, subprotocol
+    if requested in formats:
+        return requested, None
+    return "json", None
+
+def series_from_points(points: Iterable[Dict[str, float]]) -> Series:
+    """Convert a list of {"timestamp", "value"} dicts into (timestamps, values)"""
+    timestamps = []
+    values = []
+    for point in points:
+        timestamps.append(point["timestamp"])
+        values.append(point["value"])
+    return timestamps, values
+
+def regular_step(timestamps: Sequence[float], tolerance: float = DELTA_TIME_TOLERANCE) -> Optional[float]:
+    """
+    Get the spacing of evenly spaced timestamps
+
+    Returns:
+        dt such that every timestamps[i] is within tolerance of
+        timestamps[0] + i * dt, or None if the timestamps are irregular
+    """
+    count = len(timestamps)
+    if count < 2:
+        return 0.0 if count else None
+    t0 = timestamps[0]
+    dt = (timestamps[-1] - t0) / (count - 1)
+    for i, timestamp in enumerate(timestamps):
+        if abs(t0 + i * dt - timestamp) > tolerance:
+            return None
+    return dt
+
+def _pack(typecode: str, items: Sequence[float]) -> bytes:
+    packed = array(typecode, items)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+def encode_binary_batch(batch: Dict[int, Series]) -> bytes:
+    """Encode a batch_data frame in the binary layout"""
+    return encode_batch(batch, "binary")
+
+def decode_binary_batch(frame: bytes, event: str = "batch_data") -> Dict[int, Series]:
+    """Decode a binary batch_data (or backfill) frame (the counterpart of encode_binary_batch, used by clients and tests)"""
+    version, frame_type, sensor_count = BATCH_FRAME_HEADER.unpack_from(frame)
+    if version != BINARY_VERSION or frame_type != BINARY_FRAME_TYPES[event]:
+        raise ValueError(f"Not a binary {event} frame")
+    batch = {}
+    offset = BATCH_FRAME_HEADER.size
+    for _ in range(sensor_count):
+        sensor_id, count = BATCH_SENSOR_HEADER.unpack_from(frame, offset)
+        offset += BATCH_SENSOR_HEADER.size
+        timestamps = array("d", frame[offset:offset + 8 * count])
+        offset += 8 * count
+        values = array("f", frame[offset:offset + 4 * count])
+        offset += 4 * count
+        if sys.byteorder != "little":
+            timestamps.byteswap()
+            values.byteswap()
+        batch[sensor_id] = (timestamps.tolist(), values.tolist())
+    return batch
+
+def _msgpack_map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 1 << 16:
+        return b"\xde" + struct.pack(">H", size)
+    return b"\xdf" + struct.pack(">I", size)
+
+def encode_sensor(sensor_id: int, series: Series, wire_format: str = "json") -> Frame:
+    """
+    Encode one sensor's part of a batch_data frame
+
+    Parts are encoded once and joined into the frames of every subscriber that
+    follows the sensor (see join_batch).
+    """
+    timestamps, values = series
+    if wire_format == "binary":
+        return BATCH_SENSOR_HEADER.pack(sensor_id, len(values)) + _pack("d", timestamps) + _pack("f", values)
+    if wire_format == "msgpack":
+        return msgpack.packb(sensor_id) + msgpack.packb({"timestamps": list(timestamps), "values": list(values)})
+    if wire_format == "delta":
+        dt = regular_step(timestamps)
+        if dt is None:
+            series = {"timestamps": list(timestamps), "values": list(values)}
+        else:
+            series = {"t0": timestamps[0], "dt": dt, "values": list(values)}
+        return f'"{sensor_id}":' + json.dumps(series, separators=(",", ":"))
+    points = [{"timestamp": timestamp, "value": value} for timestamp, value in zip(timestamps, values)]
+    return f'"{sensor_id}":' + json.dumps(points, separators=(",", ":"))
+
+def join_batch(parts: Sequence[Frame], wire_format: str = "json", event: str = "batch_data") -> Frame:
+    """Assemble a batch_data (or backfill) frame from parts made by encode_sensor"""
+    if wire_format == "binary":
+        return BATCH_FRAME_HEADER.pack(BINARY_VERSION, BINARY_FRAME_TYPES[event], len(parts)) + b"".join(parts)
+    if wire_format == "msgpack":
+        return (
+            _msgpack_map_header(2) + msgpack.packb("event") + msgpack.packb(event)
+            + msgpack.packb("data") + _msgpack_map_header(len(parts)) + b"".join(parts)
+        )
+    return '{"event":"' + event + '","data":{' + ",".join(parts) + "}}"
+
+def encode_batch(batch: Dict[int, Series], wire_format: str = "json", event: str = "batch_data") -> Frame:
+    """
+    Encode a batch_data frame
+
+    Args:
+        batch: Maps each sensor ID to its (timestamps, values)
+        wire_format: "json" (a text frame with a list of {"timestamp", "value"}
+            objects per sensor), "delta" (a text frame with {"t0", "dt",
+            "values"} per sensor, or {"timestamps", "values"} when the samples
+            are not evenly spaced), "binary" (the fixed layout above) or
+            "msgpack" (a map with columnar "timestamps" and "values" lists per
+            sensor)
+        event: "batch_data" for live samples or "backfill" for history
+
+    Returns:
+        A str for JSON, bytes otherwise
+    """
+    return join_batch([encode_sensor(sensor_id, series, wire_format) for sensor_id, series in batch.items()], wire_format, event)
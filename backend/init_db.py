@@ -13,10 +13,13 @@ from sqlalchemy.orm import sessionmaker
 # Add the parent directory to the path so we can import the app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.database import Base, engine
-from app.models import User, Sensor, SensorData, user_sensor_association
+from app.migrations import run_migrations
+from app.models import User, Sensor, user_sensor_association
+from app.utils import sample_store
 
-# Create tables
+# Create tables and apply pending migrations
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -81,28 +84,18 @@ def init_db():
         
         # Generate sample sensor data
         now = time.time()
-        data_points = []
+        total_points = 0
         
         for sensor in sensors:
-            # Generate 100 data points for each sensor
-            for i in range(100):
-                # Data points from the last 5 minutes
-                timestamp = now - (300 * random.random())
-                value = random.uniform(-1.0, 1.0)  # Random value between -1 and 1
-                
-                data_point = SensorData(
-                    sensor_id=sensor.id,
-                    timestamp=timestamp,
-                    value=value
-                )
-                data_points.append(data_point)
-        
-        # Add data points to the database
-        for data_point in data_points:
-            db.add(data_point)
+            # Generate 100 data points for each sensor, from the last 5 minutes
+            timestamps = sorted(now - (300 * random.random()) for _ in range(100))
+            values = [random.uniform(-1.0, 1.0) for _ in timestamps]  # Random values between -1 and 1
+            
+            # Store them like ingested samples, so the rollups cover them too
+            total_points += sample_store.write_samples(db, sensor.id, timestamps, values)
         
         db.commit()
-        print(f"Generated {len(data_points)} sample data points")
+        print(f"Generated {total_points} sample data points")
         
         print("Database initialization complete!")
         
@@ -4,11 +4,17 @@ import asyncio
 import os
 
 from app import models
-from app.database import engine
+from app.database import engine, checkpoint_wal_periodically
+from app.migrations import run_migrations
 from app.routers import users, sensors, websockets
+from app.utils.ingest_writer import ingest_writer
+from app.utils.retention import retention_job
+from app.utils.sensor_registry import sensor_registry
+from app.utils.wire_format import WS_PER_MESSAGE_DEFLATE
 
-# Create database tables
+# Create database tables and bring existing databases up to date
 models.Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Create FastAPI app
 app = FastAPI(
@@ -34,8 +40,21 @@ app.include_router(websockets.router)
 # Background task for WebSocket broadcasting
 @app.on_event("startup")
 async def startup_event():
+    # Load the sensor metadata the broadcaster and websocket endpoints read
+    await sensor_registry.ensure_loaded()
+    # Start the writer that commits ingested samples in batches
+    ingest_writer.start()
     # Start the background task for broadcasting sensor data
     asyncio.create_task(websockets.broadcast_sensor_data())
+    # Start the periodic WAL checkpoint
+    asyncio.create_task(checkpoint_wal_periodically())
+    # Start the retention job
+    asyncio.create_task(retention_job.run_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush samples still queued for the database
+    ingest_writer.stop()
 
 @app.get("/")
 async def root():
@@ -53,5 +72,6 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
-        reload=True
+        reload=True,
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE
     )
@@ -6,6 +6,7 @@ This script initializes the database and starts the FastAPI server.
 import os
 import uvicorn
 from init_db import init_db
+from app.utils.wire_format import WS_PER_MESSAGE_DEFLATE
 
 def main():
     """Initialize the database and start the server"""
@@ -22,7 +23,8 @@ def main():
         "main:app",
         host="0.0.0.0",
         port=int(os.getenv("PORT", 8000)),
-        reload=True
+        reload=True,
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE
     )
 
 if __name__ == "__main__":
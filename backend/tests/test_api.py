@@ -1,10 +1,23 @@
+import gzip
+import json
+import math
+import msgpack
 import pytest
+import time
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app import models
+from app import database
 from app.database import Base, get_db
+from app.utils import backfill, downsampling, sample_store, window_stats, wire_format
+from app.utils.hot_window import hot_window
+from app.utils.ingest_writer import ingest_writer
+from app.utils.response_cache import ResponseCache, listing_cache
+from app.utils.sensor_registry import sensor_registry
+from app.utils.spectral import spectral_cache
 from main import app
 
 # Create in-memory SQLite database for testing
@@ -25,6 +38,9 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+# Blocking helpers called through run_db open their own sessions, and so does the ingest writer
+database.SessionLocal = TestingSessionLocal
+ingest_writer.session_factory = TestingSessionLocal
 
 # Create test client
 client = TestClient(app)
@@ -34,8 +50,13 @@ def test_db():
     # Create the database tables
     Base.metadata.create_all(bind=engine)
     yield
-    # Drop the database tables
+    # Drop the database tables and the in-memory data that mirrors them
+    ingest_writer.flush()
     Base.metadata.drop_all(bind=engine)
+    hot_window.clear()
+    listing_cache.invalidate()
+    spectral_cache.clear()
+    sensor_registry.clear()
 
 def test_read_main(test_db):
     """Test the root endpoint"""
@@ -121,3 +142,831 @@ def test_assign_sensor_to_user(test_db):
     assert data["id"] == user_id
     assert len(data["sensors"]) > 0
     assert data["sensors"][0]["id"] == sensor_id
+
+def test_listings_are_eager_loaded_and_cached(test_db):
+    """Test that listings avoid per-row queries and answer unchanged polls with 304"""
+    for i in range(10):
+        user_id = client.post("/api/users/", json={"user_name": f"user_{i}", "user_age": 30}).json()["id"]
+        sensor_id = client.post(
+            "/api/sensors/", json={"sensor_name": f"sensor_{i}", "sensor_data_rate": 10.0}
+        ).json()["id"]
+        client.post(f"/api/users/{user_id}/sensors/{sensor_id}")
+    
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/api/users/")
+        assert response.status_code == 200
+        assert len(response.json()) == 10
+        assert all(len(user["sensors"]) == 1 for user in response.json())
+        # One query for the users and one for all of their sensors
+        assert len(statements) == 2
+        etag = response.headers["etag"]
+        
+        statements.clear()
+        response = client.get("/api/users/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert statements == []
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    
+    # A change invalidates the cached listings
+    sensors_etag = client.get("/api/sensors/").headers["etag"]
+    client.put(f"/api/sensors/{sensor_id}", json={"sensor_name": "renamed"})
+    response = client.get("/api/sensors/", headers={"If-None-Match": sensors_etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != sensors_etag
+    assert response.json()[-1]["sensor_name"] == "renamed"
+    response = client.get("/api/users/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[-1]["sensors"][0]["sensor_name"] == "renamed"
+    
+    # ETags from another process (e.g. before a restart) never match, even at the same version
+    restarted = ResponseCache(listing_cache.name)
+    restarted.version = listing_cache.version
+    assert restarted.etag(("users",)) != listing_cache.etag(("users",))
+
+def test_ingest_status(test_db):
+    """Test reading the ingest writer status"""
+    response = client.get("/api/sensors/ingest/status")
+    assert response.status_code == 200
+    data = response.json()
+    assert "queue_depth" in data
+    assert data["batch_size"] > 0
+    assert data["flush_interval"] > 0
+
+def test_get_sensor_data_from_rows_and_chunks(test_db):
+    """Test that the data endpoint merges row and chunk storage"""
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # Older samples stored as rows, newer samples packed into chunks
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, [100.0 + i * 0.1 for i in range(10)], [0.1] * 10, storage="rows")
+    sample_store.write_samples(db, sensor_id, [101.0 + i * 0.1 for i in range(10)], [0.5] * 10, storage="chunks")
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"limit": 15})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 15
+    timestamps = [point["timestamp"] for point in data]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert "id" not in data[0]
+    assert data[-1]["id"] is not None
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"start_time": 100.55, "end_time": 101.25})
+    data = response.json()
+    assert len(data) == 7
+
+def test_sqlite_pragmas_applied():
+    """Test that the application engine applies the SQLite performance profile"""
+    from app.database import engine as app_engine, SQLITE_BUSY_TIMEOUT
+    with app_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == SQLITE_BUSY_TIMEOUT
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+
+def test_get_sensor_data_uses_rollups(test_db, monkeypatch):
+    """Test that long windows are served from rollup buckets"""
+    monkeypatch.setattr(downsampling, "DOWNSAMPLE_MAX_RAW_SAMPLES", 10000)
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # 5 minutes of 100 Hz data
+    timestamps = [1000.0 + i * 0.01 for i in range(30000)]
+    values = [(i % 200) / 100 - 1 for i in range(30000)]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps, values, storage="rows")
+    db.commit()
+    db.close()
+    
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"start_time": 1000.0, "end_time": 1300.0, "max_points": 100},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert 0 < len(data) <= 100
+    assert all(point["resolution"] == 10 for point in data)
+    assert sum(point["count"] for point in data) == 30000
+    assert data[0]["timestamp"] > data[-1]["timestamp"]
+    assert data[0]["min"] <= data[0]["value"] <= data[0]["max"]
+    
+    # A window that fits the budget returns raw samples
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"start_time": 1000.0, "end_time": 1000.5, "max_points": 100},
+    )
+    data = response.json()
+    assert len(data) == 51
+    assert "resolution" not in data[0]
+
+def test_get_sensor_data_downsampled(test_db):
+    """Test that a window with more samples than max_points is decimated"""
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # 100 seconds of 100 Hz data with a single artifact spike
+    timestamps = [1000.0 + i * 0.01 for i in range(10000)]
+    values = [math.sin(i / 50) for i in range(10000)]
+    values[4321] = 25.0
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps, values, storage="rows")
+    db.commit()
+    db.close()
+    
+    for method in ("lttb", "minmax"):
+        response = client.get(
+            f"/api/sensors/{sensor_id}/data",
+            params={"start_time": 1000.0, "end_time": 1100.0, "max_points": 200, "downsample": method},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert 0 < len(data) <= 200
+        assert data[0]["timestamp"] > data[-1]["timestamp"]
+        assert "resolution" not in data[0]
+        assert max(point["value"] for point in data) == 25.0
+    
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"start_time": 1000.0, "max_points": 200, "downsample": "median"},
+    )
+    assert response.status_code == 400
+    
+    # An explicit resolution returns rollup buckets
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"start_time": 1000.0, "end_time": 1100.0, "resolution": 10},
+    )
+    assert response.status_code == 200
+    assert all(point["resolution"] == 10 for point in response.json())
+
+def test_get_sensor_stats(test_db, monkeypatch):
+    """Test window statistics from raw samples and from rollups"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    
+    # 60 seconds of a 0.05 Hz sine (3 cycles) around a baseline of 2
+    timestamps = [1000.0 + i * 0.01 for i in range(6000)]
+    values = [2 + math.sin(2 * math.pi * 0.05 * (t - 1000.0) + 0.1) for t in timestamps]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps, values, storage="rows")
+    db.commit()
+    db.close()
+    
+    response = client.get(
+        f"/api/sensors/{sensor_id}/stats",
+        params={"start_time": 1000.0, "end_time": 1060.0, "percentiles": [50, 99]},
+    )
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["source"] == "raw"
+    assert stats["count"] == 6000
+    assert stats["mean"] == pytest.approx(2.0, abs=1e-3)
+    assert stats["std"] == pytest.approx(math.sqrt(0.5), abs=1e-3)
+    assert stats["max"] == pytest.approx(3.0, abs=1e-3)
+    assert set(stats["percentiles"]) == {"50", "99"}
+    assert stats["zero_crossings"] == 6
+    
+    # Long windows are summarized from the rollups
+    monkeypatch.setattr(window_stats, "STATS_MAX_RAW_SAMPLES", 1000)
+    response = client.get(f"/api/sensors/{sensor_id}/stats", params={"start_time": 1000.0, "end_time": 1060.0})
+    rollup = response.json()
+    assert rollup["source"] == "rollups"
+    assert rollup["count"] == 6000
+    assert rollup["mean"] == pytest.approx(stats["mean"])
+    assert rollup["rms"] == pytest.approx(stats["rms"])
+    assert rollup["min"] == pytest.approx(stats["min"])
+    assert "percentiles" not in rollup or rollup["percentiles"] is None
+    
+    # Partial buckets at the window edges are summarized from the raw samples
+    start, end = 1000.555, 1057.345
+    inside = [value for timestamp, value in zip(timestamps, values) if start <= timestamp <= end]
+    expected = window_stats.raw_stats([start, end], inside)
+    response = client.get(f"/api/sensors/{sensor_id}/stats", params={"start_time": start, "end_time": end})
+    rollup = response.json()
+    assert rollup["source"] == "rollups"
+    assert rollup["count"] == len(inside)
+    assert rollup["mean"] == pytest.approx(expected["mean"])
+    assert rollup["std"] == pytest.approx(expected["std"])
+    assert rollup["max"] == pytest.approx(expected["max"])
+
+def test_get_sensor_spectrum(test_db):
+    """Test the dominant frequency and band powers of a sensor window"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 5.0}
+    ).json()["id"]
+    
+    # 10 minutes of a 3 cpm slow wave at 5 Hz
+    timestamps = [6000.0 + i * 0.2 for i in range(3000)]
+    values = [math.sin(2 * math.pi * 0.05 * t) for t in timestamps]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps, values, storage="rows")
+    db.commit()
+    db.close()
+    
+    response = client.get(
+        f"/api/sensors/{sensor_id}/spectrum",
+        params={"start_time": 6000.0, "end_time": 6600.0, "spectrogram": True},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["segments"] == 9
+    assert result["dominant_frequency_cpm"] == pytest.approx(3.0, abs=0.5)
+    assert max(result["bands"], key=lambda band: band["power"])["name"] == "normogastria"
+    assert len(result["spectrogram"]) == 9
+    
+    response = client.get(
+        f"/api/sensors/{sensor_id}/spectrum",
+        params={"start_time": 6000.0, "end_time": 6060.0},
+    )
+    assert response.status_code == 400
+
+def test_export_sensor_data(test_db):
+    """Test streaming a sensor's samples as NDJSON and gzipped CSV"""
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    timestamps = [1000.0 + i * 0.01 for i in range(2000)]
+    values = [(i % 100) / 100 for i in range(2000)]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps[:1000], values[:1000], storage="rows")
+    sample_store.write_samples(db, sensor_id, timestamps[1000:], values[1000:], storage="chunks")
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/api/sensors/{sensor_id}/export", params={"start_time": 1005.0})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1500
+    assert [line["timestamp"] for line in lines] == sorted(line["timestamp"] for line in lines)
+    assert lines[0]["timestamp"] == pytest.approx(1005.0)
+    
+    response = client.get(f"/api/sensors/{sensor_id}/export", params={"format": "csv", "gzip": True})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].endswith('.csv.gz"')
+    rows = gzip.decompress(response.content).decode().splitlines()
+    assert rows[0] == "timestamp,value"
+    assert len(rows) == 2001
+    
+    response = client.get(f"/api/sensors/{sensor_id}/export", params={"format": "xml"})
+    assert response.status_code == 400
+
+def test_export_merges_overlapping_chunks(test_db):
+    """Test that chunks overlapping after out-of-order ingest are exported in time order"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0}
+    ).json()["id"]
+    
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, [1000.0 + i for i in range(0, 8, 2)], [0.0] * 4, storage="chunks")
+    # Late samples fall between the ones already stored, in a second chunk
+    sample_store.write_samples(db, sensor_id, [1000.0 + i for i in range(1, 8, 2)], [1.0] * 4, storage="chunks")
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/api/sensors/{sensor_id}/export", params={"start_time": 1001.0})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["timestamp"] for line in lines] == [1000.0 + i for i in range(1, 8)]
+    assert [line["value"] for line in lines] == [1.0, 0.0, 1.0, 0.0, 1.0, 0.0, 1.0]
+
+def test_export_sensor_data_arrow(test_db):
+    """Test that an Arrow IPC export reads back as the stored samples"""
+    import pyarrow.ipc
+    
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    timestamps = [1000.0 + i * 0.01 for i in range(2000)]
+    values = [(i % 100) / 100 for i in range(2000)]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps[:1000], values[:1000], storage="rows")
+    sample_store.write_samples(db, sensor_id, timestamps[1000:], values[1000:], storage="chunks")
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/api/sensors/{sensor_id}/export", params={"format": "arrow"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.apache.arrow.stream")
+    assert response.headers["content-disposition"].endswith('.arrow"')
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.schema.names == ["timestamp", "value"]
+    assert table.column("timestamp").to_pylist() == pytest.approx(timestamps)
+    # Chunks store float32 values by default
+    assert table.column("value").to_pylist() == pytest.approx(values, abs=1e-6)
+
+def test_get_sensor_data_pages(test_db):
+    """Test walking a range with keyset cursors in both directions"""
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # Rows and chunks, including two rows sharing a timestamp
+    timestamps = [1000.0 + i * 0.1 for i in range(50)]
+    values = [i / 50 for i in range(50)]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, timestamps[:25] + [timestamps[24]], values[:25] + [0.5], storage="rows")
+    sample_store.write_samples(db, sensor_id, timestamps[25:], values[25:], storage="chunks")
+    db.commit()
+    db.close()
+    
+    # Walk back from the newest sample
+    seen = []
+    params = {"direction": "older", "limit": 7}
+    while True:
+        response = client.get(f"/api/sensors/{sensor_id}/data", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 7
+        seen.extend(point["timestamp"] for point in page)
+        if "x-next-cursor" not in response.headers:
+            break
+        params = {"cursor": response.headers["x-next-cursor"], "limit": 7}
+    assert len(seen) == 51
+    assert seen == sorted(seen, reverse=True)
+    
+    # Walk forward again from the last page
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"cursor": response.headers["x-prev-cursor"], "limit": 10},
+    )
+    page = response.json()
+    assert len(page) == 10
+    assert page[0]["timestamp"] > seen[-1]
+    assert [point["timestamp"] for point in page] == sorted(point["timestamp"] for point in page)
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_read_sensors_after_id(test_db):
+    """Test keyset pagination of the sensor listing"""
+    for i in range(5):
+        client.post("/api/sensors/", json={"sensor_name": f"sensor_{i}", "sensor_data_rate": 10.0})
+    
+    first = client.get("/api/sensors/", params={"limit": 2}).json()
+    second = client.get("/api/sensors/", params={"limit": 2, "after_id": first[-1]["id"]}).json()
+    assert [sensor["sensor_name"] for sensor in first + second] == [f"sensor_{i}" for i in range(4)]
+
+def test_get_sensor_data_pages_through_chunk_ties(test_db):
+    """Test that chunk samples sharing a timestamp are not skipped at page boundaries"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0}
+    ).json()["id"]
+    db = TestingSessionLocal()
+    sample_store.write_samples(db, sensor_id, [2000.0, 2000.0, 2000.0, 2000.1], [0.1, 0.2, 0.3, 0.4], storage="chunks")
+    sample_store.write_samples(db, sensor_id, [2000.0, 2000.1], [0.5, 0.6], storage="chunks")
+    sample_store.write_samples(db, sensor_id, [2000.0], [0.7], storage="rows")
+    db.commit()
+    db.close()
+    
+    for direction in ("older", "newer"):
+        seen = []
+        params = {"direction": direction, "limit": 2}
+        while True:
+            response = client.get(f"/api/sensors/{sensor_id}/data", params=params)
+            seen.extend(point["value"] for point in response.json())
+            if "x-next-cursor" not in response.headers:
+                break
+            params = {"cursor": response.headers["x-next-cursor"], "limit": 2}
+        assert sorted(seen) == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+
+def test_get_sensors_data(test_db):
+    """Test fetching a window for several sensors in one request"""
+    user_id = client.post("/api/users/", json={"user_name": "test_user", "user_age": 30}).json()["id"]
+    sensor_ids = []
+    db = TestingSessionLocal()
+    for i, storage in enumerate(("rows", "chunks", "rows")):
+        sensor_id = client.post(
+            "/api/sensors/", json={"sensor_name": f"sensor_{i}", "sensor_data_rate": 10.0}
+        ).json()["id"]
+        sensor_ids.append(sensor_id)
+        timestamps = [1000.0 + j * 0.1 for j in range(100)]
+        sample_store.write_samples(db, sensor_id, timestamps, [i + j / 100 for j in range(100)], storage=storage)
+    db.commit()
+    db.close()
+    for sensor_id in sensor_ids[:2]:
+        client.post(f"/api/users/{user_id}/sensors/{sensor_id}")
+    
+    response = client.get(
+        "/api/sensors/data",
+        params={"sensor_ids": sensor_ids, "start_time": 1005.0, "limit": 20},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [int(sensor_id) for sensor_id in data] == sensor_ids
+    for i, sensor_id in enumerate(sensor_ids):
+        series = data[str(sensor_id)]
+        assert len(series) == 20
+        assert series[0]["timestamp"] == pytest.approx(1009.9)
+        assert series[0]["timestamp"] > series[-1]["timestamp"]
+        assert all(point["sensor_id"] == sensor_id for point in series)
+    
+    response = client.get("/api/sensors/data", params={"user_id": user_id, "start_time": 1009.0})
+    assert sorted(int(sensor_id) for sensor_id in response.json()) == sensor_ids[:2]
+    assert len(response.json()[str(sensor_ids[0])]) == 10
+    
+    response = client.get("/api/sensors/data", params={"sensor_ids": [sensor_ids[0], 999], "start_time": 1000.0})
+    assert response.status_code == 404
+
+def test_websocket_all_sensors(test_db):
+    """Test connecting to the all sensors websocket and subscribing"""
+    with client.websocket_connect("/api/ws/all") as websocket:
+        assert websocket.receive_json()["event"] == "connected"
+        websocket.send_text('{"type": "ping"}')
+        assert websocket.receive_json() == {"type": "pong"}
+        websocket.send_text('{"type": "subscribe", "sensor_ids": [1, 2], "time_range": 30}')
+        message = websocket.receive_json()
+        assert message["type"] == "subscription_updated"
+        assert message["sensor_ids"] == [1, 2]
+        # Unknown sensors have no history
+        assert websocket.receive_json()["type"] == "backfill_complete"
+        websocket.send_text('{"type": "subscribe_add", "sensor_ids": [3]}')
+        assert websocket.receive_json()["sensor_ids"] == [1, 2, 3]
+        complete = websocket.receive_json()
+        assert complete["type"] == "backfill_complete"
+        assert complete["sensor_ids"] == []
+        websocket.send_text('{"type": "subscribe_remove", "sensor_ids": [1]}')
+        assert websocket.receive_json()["sensor_ids"] == [2, 3]
+
+def test_websocket_backfill(test_db):
+    """Test that subscribing sends the recent history, decimated and chunked, before live frames"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    start = time.time() - 20
+    client.post(f"/api/sensors/{sensor_id}/data", json={"start_time": start, "rate": 100.0, "values": [0.5] * 1000})
+    assert ingest_writer.flush()
+    
+    with client.websocket_connect("/api/ws/all") as websocket:
+        websocket.receive_json()
+        websocket.send_text(json.dumps({"type": "subscribe", "sensor_ids": [sensor_id], "time_range": 60, "max_points": 300}))
+        assert websocket.receive_json()["type"] == "subscription_updated"
+        
+        # Live samples ingested meanwhile follow the backfill
+        client.post(f"/api/sensors/{sensor_id}/data", json={"start_time": start + 10, "rate": 100.0, "values": [1.0]})
+        backfill = websocket.receive_json()
+        assert backfill["event"] == "backfill"
+        points = backfill["data"][str(sensor_id)]
+        assert len(points) == 300
+        assert points[0]["timestamp"] == pytest.approx(start)
+        complete = websocket.receive_json()
+        assert complete["type"] == "backfill_complete"
+        assert complete["sensor_ids"] == [sensor_id]
+        assert complete["samples"] == 300
+        assert websocket.receive_json()["event"] == "batch_data"
+
+def test_websocket_resubscribe_backfills_again(test_db):
+    """Test that subscribing again to the same sensors with a new time_range resends their history"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    start = time.time() - 20
+    client.post(f"/api/sensors/{sensor_id}/data", json={"start_time": start, "rate": 100.0, "values": [0.5] * 1000})
+    assert ingest_writer.flush()
+    
+    with client.websocket_connect("/api/ws/all") as websocket:
+        websocket.receive_json()
+        first_timestamps = []
+        for time_range in (15, 60):
+            websocket.send_text(json.dumps({"type": "subscribe", "sensor_ids": [sensor_id], "time_range": time_range}))
+            assert websocket.receive_json()["type"] == "subscription_updated"
+            backfill = websocket.receive_json()
+            assert backfill["event"] == "backfill"
+            first_timestamps.append(backfill["data"][str(sensor_id)][0]["timestamp"])
+            complete = websocket.receive_json()
+            assert complete["type"] == "backfill_complete"
+            assert complete["sensor_ids"] == [sensor_id]
+        assert first_timestamps[0] > start + 4
+        assert first_timestamps[1] == pytest.approx(start)
+
+def test_websocket_backfill_from_storage(test_db, monkeypatch):
+    """Test that history outside the in-memory window is read from storage in chunks"""
+    monkeypatch.setattr(backfill, "WS_BACKFILL_CHUNK_SAMPLES", 400)
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    start = time.time() - 20
+    client.post(f"/api/sensors/{sensor_id}/data", json={"start_time": start, "rate": 100.0, "values": [0.25] * 1000})
+    assert ingest_writer.flush()
+    hot_window.clear()
+    
+    with client.websocket_connect(f"/api/ws/sensors/{sensor_id}?format=delta") as websocket:
+        websocket.receive_json()
+        websocket.send_text(json.dumps({"type": "subscribe", "time_range": 60}))
+        assert websocket.receive_json()["type"] == "subscription_updated"
+        
+        chunks = []
+        message = websocket.receive_json()
+        while message.get("event") == "backfill":
+            chunks.append(message["data"][str(sensor_id)])
+            message = websocket.receive_json()
+        assert message["type"] == "backfill_complete"
+        assert [len(chunk["values"]) for chunk in chunks] == [400, 400, 200]
+        assert chunks[0]["t0"] == pytest.approx(start)
+        assert chunks[1]["t0"] == pytest.approx(start + 4.0)
+
+def test_sensor_registry_follows_routes(test_db):
+    """Test that sensor changes reach the registry and its listeners without a reload"""
+    changes = []
+    listener = lambda sensor_id, info: changes.append((sensor_id, info))
+    sensor_registry.add_listener(listener)
+    try:
+        sensor_id = client.post(
+            "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+        ).json()["id"]
+        assert sensor_registry.get(sensor_id) == {"sensor_name": "test_sensor", "data_rate": 100.0, "is_active": False}
+        
+        client.put(f"/api/sensors/{sensor_id}", json={"sensor_data_rate": 250.0})
+        assert sensor_registry.get(sensor_id)["data_rate"] == 250.0
+        assert sensor_registry.active_rates([sensor_id]) == {}
+        
+        client.post(f"/api/sensors/{sensor_id}/mock/start")
+        assert sensor_registry.active_rates([sensor_id]) == {sensor_id: 250.0}
+        
+        client.delete(f"/api/sensors/{sensor_id}")
+        assert sensor_registry.get(sensor_id) is None
+        assert changes[-1] == (sensor_id, None)
+    finally:
+        sensor_registry.remove_listener(listener)
+
+def test_websocket_status(test_db):
+    """Test that live connections report their send queue and lag"""
+    assert client.get("/api/ws/status").json() == {"max_lag": 0.0, "connections": []}
+    
+    with client.websocket_connect("/api/ws/all") as websocket:
+        websocket.receive_json()
+        websocket.send_text('{"type": "subscribe", "sensor_ids": [1, 2], "time_range": 0}')
+        websocket.receive_json()
+        
+        status = client.get("/api/ws/status").json()
+        assert len(status["connections"]) == 1
+        connection = status["connections"][0]
+        assert connection["kind"] == "global"
+        assert connection["sensor_ids"] == [1, 2]
+        assert connection["queued"] == 0
+        assert connection["frames_dropped"] == 0
+
+def test_websocket_binary_format(test_db):
+    """Test that a connection negotiating the binary format receives packed batch frames"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    
+    with client.websocket_connect("/api/ws/all", subprotocols=["egg.binary.v1"]) as websocket:
+        assert websocket.accepted_subprotocol == "egg.binary.v1"
+        assert websocket.receive_json()["format"] == "binary"
+        websocket.send_text(json.dumps({"type": "subscribe", "sensor_ids": [sensor_id], "time_range": 0}))
+        websocket.receive_json()
+        
+        response = client.post(
+            f"/api/sensors/{sensor_id}/data",
+            json={"start_time": 1000.0, "rate": 100.0, "values": [0.5, -0.25, 1.0]},
+        )
+        assert response.status_code == 201
+        batch = wire_format.decode_binary_batch(websocket.receive_bytes())
+        timestamps, values = batch[sensor_id]
+        assert timestamps == pytest.approx([1000.0, 1000.01, 1000.02])
+        assert values == [0.5, -0.25, 1.0]
+    
+    # The REST endpoint returns the same layout
+    response = client.get(
+        f"/api/sensors/{sensor_id}/data",
+        params={"start_time": 1000.0, "format": "binary"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == wire_format.MEDIA_TYPES["binary"]
+    timestamps, values = wire_format.decode_binary_batch(response.content)[sensor_id]
+    assert values == [1.0, -0.25, 0.5]
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"format": "xml"})
+    assert response.status_code == 400
+
+def test_websocket_msgpack_format(test_db):
+    """Test that a connection negotiating msgpack receives MessagePack batch frames, like the REST endpoint"""
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 100.0}
+    ).json()["id"]
+    
+    with client.websocket_connect("/api/ws/all", subprotocols=["egg.msgpack.v1"]) as websocket:
+        assert websocket.accepted_subprotocol == "egg.msgpack.v1"
+        assert websocket.receive_json()["format"] == "msgpack"
+        websocket.send_text(json.dumps({"type": "subscribe", "sensor_ids": [sensor_id], "time_range": 0}))
+        websocket.receive_json()
+        
+        response = client.post(
+            f"/api/sensors/{sensor_id}/data",
+            json={"start_time": 1000.0, "rate": 100.0, "values": [0.5, -0.25, 1.0]},
+        )
+        assert response.status_code == 201
+        frame = msgpack.unpackb(websocket.receive_bytes(), strict_map_key=False)
+        assert frame["event"] == "batch_data"
+        assert frame["data"][sensor_id]["timestamps"] == pytest.approx([1000.0, 1000.01, 1000.02])
+        assert frame["data"][sensor_id]["values"] == [0.5, -0.25, 1.0]
+    
+    # The REST endpoint returns the JSON response objects encoded with MessagePack
+    params = {"start_time": 1000.0}
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={**params, "format": "msgpack"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == wire_format.MEDIA_TYPES["msgpack"]
+    points = msgpack.unpackb(response.content)
+    assert [point["value"] for point in points] == [1.0, -0.25, 0.5]
+    assert points == client.get(f"/api/sensors/{sensor_id}/data", params=params).json()
+
+def test_run_db():
+    """Test that run_db runs a query off the event loop and returns its result"""
+    import asyncio
+    from app.database import run_db
+    
+    result = asyncio.run(run_db(lambda db, value: db.execute(text("SELECT :value"), {"value": value}).scalar(), 42))
+    assert result == 42
+
+def test_ingest_sensor_data(test_db):
+    """Test ingesting batches in the JSON, NDJSON and binary formats"""
+    from app.utils.ingest_formats import encode_binary_batch
+    
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # JSON with explicit timestamps
+    response = client.post(
+        f"/api/sensors/{sensor_id}/data",
+        json={"timestamps": [100.0, 100.1, 100.2], "values": [0.1, 0.2, 0.3]},
+    )
+    assert response.status_code == 201
+    assert response.json() == {"sensor_id": sensor_id, "accepted": 3, "start_time": 100.0, "end_time": 100.2}
+    
+    # NDJSON
+    response = client.post(
+        f"/api/sensors/{sensor_id}/data",
+        content=b'[101.0, 0.4]\n{"timestamp": 101.1, "value": 0.5}\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 201
+    assert response.json()["accepted"] == 2
+    
+    # Binary: start time + rate + packed float32 values
+    response = client.post(
+        f"/api/sensors/{sensor_id}/data",
+        content=encode_binary_batch(102.0, 10.0, [0.25, 0.5, 0.75, 1.0]),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 201
+    assert response.json()["end_time"] == pytest.approx(102.3)
+    
+    # Samples are committed by the ingest writer
+    assert ingest_writer.flush()
+    response = client.get(f"/api/sensors/{sensor_id}/data")
+    data = response.json()
+    assert len(data) == 9
+    assert data[0]["value"] == 1.0
+    
+    # Invalid batches are rejected without storing anything
+    response = client.post(f"/api/sensors/{sensor_id}/data", json={"timestamps": [1.0], "values": [0.1, 0.2]})
+    assert response.status_code == 400
+    response = client.post(f"/api/sensors/{sensor_id}/data", json={"timestamps": [1.0], "values": ["a"]})
+    assert response.status_code == 400
+    
+    # Unknown sensor
+    response = client.post("/api/sensors/999/data", json={"timestamps": [1.0], "values": [0.1]})
+    assert response.status_code == 404
+
+def test_ingest_sensor_data_backpressure(test_db, monkeypatch):
+    """Test that a batch the ingest writer refuses is answered with 503 and Retry-After, off the event loop"""
+    import asyncio
+    
+    sensor_id = client.post(
+        "/api/sensors/", json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0}
+    ).json()["id"]
+    on_loop = []
+    
+    def refuse(items):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return False
+    monkeypatch.setattr(ingest_writer, "submit_many", refuse)
+
+    response = client.post(f"/api/sensors/{sensor_id}/data", json={"timestamps": [1.0], "values": [0.1]})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert on_loop == [False]
+
+def test_websocket_ingest(test_db, monkeypatch):
+    """Test streaming samples over the ingest websocket with acks and backpressure"""
+    from starlette.websockets import WebSocketDisconnect
+    from app.routers import websockets
+    from app.utils.ingest_formats import INGEST_FRAME_HEADER, encode_binary_batch
+    from app.utils.ingest_writer import IngestWriter
+    
+    writer = IngestWriter(session_factory=TestingSessionLocal, batch_size=100, flush_interval=0.05, max_pending=10)
+    monkeypatch.setattr(websockets, "ingest_writer", writer)
+    monkeypatch.setattr(websockets, "INGEST_TOKENS", {"secret"})
+    
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    
+    # Connections without a valid token are refused
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/ws/ingest?token=wrong") as websocket:
+            websocket.receive_json()
+    
+    with client.websocket_connect("/api/ws/ingest?token=secret") as websocket:
+        assert websocket.receive_json()["event"] == "connected"
+        
+        # JSON frame
+        websocket.send_json({
+            "type": "samples",
+            "seq": 1,
+            "sensors": {str(sensor_id): {"start_time": 200.0, "rate": 10.0, "values": [0.1, 0.2, 0.3]}},
+        })
+        ack = websocket.receive_json()
+        assert ack["type"] == "ack"
+        assert ack["seq"] == 1
+        assert ack["accepted"] == 3
+        # The in-memory window is sized from the sensor's rate
+        assert hot_window.rates[sensor_id] == 10.0
+        
+        # Binary frame
+        websocket.send_bytes(INGEST_FRAME_HEADER.pack(2, sensor_id) + encode_binary_batch(201.0, 10.0, [0.4, 0.5]))
+        ack = websocket.receive_json()
+        assert ack == {"type": "ack", "seq": 2, "accepted": 2, "queue_depth": ack["queue_depth"], "queue_capacity": 10}
+        
+        # Unknown sensors are rejected
+        websocket.send_json({"type": "samples", "seq": 3, "sensors": {"999": [[1.0, 0.1]]}})
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+        assert error["seq"] == 3
+        
+        # A frame that does not fit in the writer queue is refused with backpressure
+        assert writer.flush()
+        writer.stop()
+        writer._running = True
+        writer.submit(sensor_id, [300.0 + i for i in range(8)], [0.0] * 8)
+        websocket.send_json({"type": "samples", "seq": 4, "sensors": {str(sensor_id): [[400.0, 0.1], [400.1, 0.2], [400.2, 0.3]]}})
+        message = websocket.receive_json()
+        assert message["type"] == "backpressure"
+        assert message["seq"] == 4
+        assert message["queue_depth"] == 8
+        writer._running = False
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data")
+    assert len(response.json()) == 5
+
+def test_get_sensor_data_from_hot_window(test_db):
+    """Test that recent ranges are served from the in-memory window"""
+    sensor_response = client.post(
+        "/api/sensors/",
+        json={"sensor_name": "test_sensor", "sensor_data_rate": 10.0},
+    )
+    sensor_id = sensor_response.json()["id"]
+    client.post(
+        f"/api/sensors/{sensor_id}/data",
+        json={"start_time": 500.0, "rate": 10.0, "values": [0.1 * i for i in range(10)]},
+    )
+    
+    # Remove the stored rows so that only the window can answer
+    db = TestingSessionLocal()
+    db.query(models.SensorData).delete()
+    db.commit()
+    db.close()
+    
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"start_time": 500.0, "limit": 4})
+    data = response.json()
+    assert [point["timestamp"] for point in data] == pytest.approx([500.9, 500.8, 500.7, 500.6])
+    
+    # Ranges starting before the window fall back to the database
+    response = client.get(f"/api/sensors/{sensor_id}/data", params={"start_time": 499.0})
+    assert response.json() == []
+    
+    status_response = client.get("/api/sensors/hot-window/status")
+    window = status_response.json()["sensors"][str(sensor_id)]
+    assert window["samples"] == 10
+    assert window["memory_bytes"] == window["capacity"] * 16
@@ -0,0 +1,62 @@
+import unittest
+from types import SimpleNamespace
+
+from app.utils.chunk_codec import MAX_CHUNK_SPAN, decode_chunk, encode_chunk
+
+class TestChunkCodec(unittest.TestCase):
+    """Tests for packing and unpacking sensor data chunks"""
+
+    def test_regular_samples_store_interval_only(self):
+        """Test that evenly spaced samples are encoded without timestamp offsets"""
+        # Arrange
+        start = 1700000000.0
+        timestamps = [start + i * 0.01 for i in range(500)]
+        values = [((i % 50) - 25) / 25 for i in range(500)]
+
+        # Act
+        encoded = encode_chunk(timestamps, values, "f8")
+        decoded_ts, decoded_values = decode_chunk(SimpleNamespace(**encoded))
+
+        # Assert
+        self.assertIsNone(encoded["timestamp_deltas"])
+        self.assertAlmostEqual(encoded["sample_interval"], 0.01, places=6)
+        self.assertEqual(encoded["sample_count"], 500)
+        self.assertEqual(len(encoded["values"]), 500 * 8)
+        for expected, actual in zip(timestamps, decoded_ts):
+            self.assertAlmostEqual(expected, actual, places=5)
+        self.assertEqual(decoded_values, values)
+
+    def test_irregular_samples_store_deltas(self):
+        """Test that irregular samples keep microsecond timestamp offsets"""
+        # Arrange - out of order input with uneven spacing
+        timestamps = [10.5, 10.0, 10.013, 10.2]
+        values = [0.4, 0.1, 0.2, 0.3]
+
+        # Act
+        encoded = encode_chunk(timestamps, values, "f4")
+        decoded_ts, decoded_values = decode_chunk(SimpleNamespace(**encoded))
+
+        # Assert
+        self.assertIsNone(encoded["sample_interval"])
+        self.assertEqual(len(encoded["timestamp_deltas"]), 4 * 4)
+        self.assertEqual(encoded["start_time"], 10.0)
+        self.assertAlmostEqual(encoded["end_time"], 10.5, places=6)
+        for expected, actual in zip([10.0, 10.013, 10.2, 10.5], decoded_ts):
+            self.assertAlmostEqual(expected, actual, places=6)
+        for expected, actual in zip([0.1, 0.2, 0.3, 0.4], decoded_values):
+            self.assertAlmostEqual(expected, actual, places=6)
+
+    def test_empty_chunk_rejected(self):
+        """Test that an empty block cannot be encoded"""
+        with self.assertRaises(ValueError):
+            encode_chunk([], [])
+
+    def test_span_beyond_offset_range_rejected(self):
+        """Test that a block too long for uint32 microsecond offsets is refused instead of overflowing"""
+        # Act / Assert
+        encode_chunk([0.0, MAX_CHUNK_SPAN], [0.1, 0.2])
+        with self.assertRaises(ValueError):
+            encode_chunk([0.0, MAX_CHUNK_SPAN + 1.0], [0.1, 0.2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,337 @@
+import asyncio
+import json
+import threading
+import unittest
+from unittest import mock
+
+from app.routers import websockets
+from app.routers.websockets import ConnectionManager
+from app.utils.connection_writer import ConnectionWriter
+
+class FakeWebSocket:
+    """Records the frames sent to it"""
+
+    def __init__(self, fail: bool = False, stuck: bool = False):
+        self.sent = []
+        self.fail = fail
+        self.stuck = stuck
+        self.close_code = None
+
+    async def send_text(self, frame):
+        if self.fail:
+            raise RuntimeError("connection closed")
+        if self.stuck:
+            # Never completes, like a client that stopped reading
+            await asyncio.Event().wait()
+        self.sent.append(frame)
+
+    async def send_bytes(self, frame):
+        await self.send_text(frame)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+async def drain():
+    """Let the writer tasks run until they are idle"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+class TestConnectionManager(unittest.IsolatedAsyncioTestCase):
+    """Tests for the batch fan-out of the ConnectionManager"""
+
+    def setUp(self):
+        """Register global connections without a real websocket handshake"""
+        self.manager = ConnectionManager()
+
+    async def asyncTearDown(self):
+        for websocket in list(self.manager.writers):
+            self.manager.disconnect(websocket)
+
+    def add_global(self, sensor_ids, wire_format="json", fail=False, stuck=False):
+        websocket = FakeWebSocket(fail, stuck)
+        self.manager.register(websocket, wire_format=wire_format)
+        self.manager.subscribe_global(websocket, sensor_ids)
+        return websocket
+
+    async def test_send_batch_encodes_once_per_subscription(self):
+        """Test that each sensor part and each distinct frame is encoded once"""
+        # Arrange - 50 viewers sharing two subscription sets
+        viewers = [self.add_global([1, 2]) for _ in range(25)] + [self.add_global([2, 3]) for _ in range(25)]
+        batch = {1: ([1.0], [0.1]), 2: ([1.0], [0.2]), 3: ([1.0], [0.3])}
+
+        # Act
+        with mock.patch.object(websockets, "encode_sensor", wraps=websockets.encode_sensor) as encode:
+            await self.manager.send_batch(batch)
+        await drain()
+
+        # Assert
+        self.assertEqual(encode.call_count, 3)
+        self.assertEqual(set(json.loads(viewers[0].sent[0])["data"]), {"1", "2"})
+        self.assertEqual(set(json.loads(viewers[-1].sent[0])["data"]), {"2", "3"})
+        self.assertTrue(all(len(viewer.sent) == 1 for viewer in viewers))
+        # Viewers with the same subscription share one frame object
+        self.assertIs(viewers[0].sent[0], viewers[1].sent[0])
+
+    async def test_send_batch_drops_failed_connections(self):
+        """Test that a failing socket is disconnected without affecting the others"""
+        # Arrange
+        healthy = self.add_global([1])
+        broken = self.add_global([1], fail=True)
+
+        # Act
+        await self.manager.send_batch({1: ([1.0], [0.5])})
+        await drain()
+
+        # Assert
+        self.assertEqual(len(healthy.sent), 1)
+        self.assertNotIn(broken, self.manager.global_connections)
+        self.assertNotIn(broken, self.manager.writers)
+
+    async def test_stuck_client_does_not_delay_others(self):
+        """Test that healthy clients receive every frame while another client never reads"""
+        # Arrange
+        healthy = self.add_global([1])
+        stuck = self.add_global([1], stuck=True)
+
+        # Act
+        for tick in range(100):
+            await self.manager.send_batch({1: ([float(tick)], [0.5])})
+            await drain()
+
+        # Assert - the stuck client's queue stays bounded
+        self.assertEqual(len(healthy.sent), 100)
+        stats = {entry["frames_sent"]: entry for entry in self.manager.stats()}
+        self.assertEqual(stats[100]["lag"], 0.0)
+        self.assertLessEqual(stats[0]["queued"], stats[0]["queue_capacity"])
+        self.assertGreater(stats[0]["frames_dropped"], 0)
+
+    async def test_send_tick_holds_back_slower_connections(self):
+        """Test that a connection with a slower tick gets the held samples in one frame"""
+        # Arrange
+        fast = self.add_global([1])
+        slow = self.add_global([1])
+        self.manager.set_tick(slow, 100)
+
+        # Act - five 20ms ticks, with the clock advancing 25ms each
+        now = [0.0]
+        with mock.patch.object(websockets.time, "monotonic", lambda: now[0]):
+            for tick in range(5):
+                await self.manager.send_tick({1: ([float(tick)], [0.5])}, 0.02)
+                await drain()
+                now[0] += 0.025
+
+        # Assert
+        self.assertEqual(len(fast.sent), 5)
+        self.assertEqual(len(slow.sent), 1)
+        self.assertEqual([point["timestamp"] for point in json.loads(slow.sent[0])["data"]["1"]], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    async def test_send_tick_keeps_default_connections_on_server_tick(self):
+        """Test that a client asking for a fast tick does not speed up the connections that did not"""
+        # Arrange
+        fast = self.add_global([1])
+        default = self.add_global([1])
+        self.manager.set_tick(fast, 20)
+
+        # Act - five 20ms ticks against a 100ms server tick
+        now = [0.0]
+        with mock.patch.object(websockets.time, "monotonic", lambda: now[0]):
+            interval = self.manager.base_interval(0.1)
+            for tick in range(5):
+                await self.manager.send_tick({1: ([float(tick)], [0.5])}, interval, 0.1)
+                await drain()
+                now[0] += 0.025
+
+        # Assert
+        self.assertEqual(interval, 0.02)
+        self.assertEqual(len(fast.sent), 5)
+        self.assertEqual(len(default.sent), 1)
+        self.assertEqual([point["timestamp"] for point in json.loads(default.sent[0])["data"]["1"]], [0.0, 1.0, 2.0, 3.0, 4.0])
+
+class TestSubscriptionIndex(unittest.IsolatedAsyncioTestCase):
+    """Tests for the sensor -> subscribers index of the ConnectionManager"""
+
+    def setUp(self):
+        self.manager = ConnectionManager()
+
+    async def asyncTearDown(self):
+        for websocket in list(self.manager.writers):
+            self.manager.disconnect(websocket)
+
+    async def test_index_follows_subscription_changes(self):
+        """Test that replace, add, remove and disconnect keep the index and active set consistent"""
+        # Arrange
+        first = FakeWebSocket()
+        second = FakeWebSocket()
+        single = FakeWebSocket()
+        self.manager.register(first)
+        self.manager.register(second)
+        self.manager.register(single, sensor_id=3)
+
+        # Act / Assert - replace
+        self.manager.subscribe_global(first, [1, 2])
+        self.manager.subscribe_global(second, [2])
+        self.assertEqual(self.manager.sensor_subscribers, {1: {first}, 2: {first, second}})
+        self.assertEqual(set(self.manager.active_sensors()), {1, 2, 3})
+
+        # Act / Assert - incremental changes
+        self.manager.add_subscriptions(second, [3, 2])
+        self.manager.remove_subscriptions(first, [1, 5])
+        self.assertEqual(self.manager.sensor_subscribers, {2: {first, second}, 3: {second}})
+        self.assertEqual(self.manager.global_subscriptions[second], {2, 3})
+        self.assertEqual(set(self.manager.active_sensors()), {2, 3})
+
+        # Act / Assert - disconnects
+        self.manager.disconnect(second)
+        self.manager.disconnect(single, 3)
+        self.assertEqual(self.manager.sensor_subscribers, {2: {first}})
+        self.assertEqual(set(self.manager.active_sensors()), {2})
+
+    async def test_send_batch_only_reaches_subscribers(self):
+        """Test that a batch reaches the subscribers of its sensors and nobody else"""
+        # Arrange
+        subscriber = FakeWebSocket()
+        bystander = FakeWebSocket()
+        self.manager.register(subscriber)
+        self.manager.register(bystander)
+        self.manager.subscribe_global(subscriber, [1])
+        self.manager.subscribe_global(bystander, [2])
+
+        # Act
+        await self.manager.send_batch({1: ([1.0], [0.5])})
+        await drain()
+
+        # Assert
+        self.assertEqual(len(subscriber.sent), 1)
+        self.assertEqual(bystander.sent, [])
+
+class TestSensorChangeDispatch(unittest.IsolatedAsyncioTestCase):
+    """Tests for how sensor registry changes reach the mock generator"""
+
+    async def asyncSetUp(self):
+        self.generator = websockets.MockDataGenerator()
+        self.generator.update_sensor_data_rate(1, 1.0)
+        patches = [
+            mock.patch.object(websockets, "mock_data_generator", self.generator),
+            mock.patch.object(websockets, "broadcast_loop", asyncio.get_running_loop()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_changes_from_threads_run_on_the_loop(self):
+        """Test that a delete from a worker thread is applied by the loop, not by the thread"""
+        # Act - the thread finishes while the loop is blocked
+        thread = threading.Thread(target=websockets.apply_sensor_change, args=(1, None))
+        thread.start()
+        thread.join()
+
+        # Assert - not applied from the thread, applied once the loop runs the callback
+        self.assertIn(1, self.generator.sensor_data_rates)
+        await drain()
+        self.assertNotIn(1, self.generator.sensor_data_rates)
+
+    async def test_changes_on_the_loop_apply_right_away(self):
+        """Test that a change made on the loop itself is applied immediately"""
+        # Act
+        websockets.apply_sensor_change(1, {"sensor_name": "s", "data_rate": 500.0, "is_active": True})
+
+        # Assert
+        self.assertEqual(self.generator.sensor_data_rates[1], websockets.mock_rate(500.0))
+
+class TestConnectionWriter(unittest.IsolatedAsyncioTestCase):
+    """Tests for the slow consumer policies"""
+
+    async def test_drop_oldest_keeps_newest_frames(self):
+        """Test that a full queue discards its oldest frames"""
+        # Arrange
+        writer = ConnectionWriter(FakeWebSocket(), max_frames=3, policy="drop_oldest")
+
+        # Act - the writer task is not started, so nothing drains
+        for index in range(5):
+            writer.enqueue(str(index))
+
+        # Assert
+        self.assertEqual([frame for _, frame, _ in writer.queue], ["2", "3", "4"])
+        self.assertEqual(writer.frames_dropped, 2)
+
+    async def test_coalesce_merges_queued_batches(self):
+        """Test that a full queue is merged into one frame without losing samples"""
+        # Arrange
+        writer = ConnectionWriter(FakeWebSocket(), max_frames=2, policy="coalesce")
+        batches = [{1: ([float(index)], [float(index)])} for index in range(3)]
+
+        # Act
+        for batch in batches:
+            writer.enqueue(websockets.join_batch([websockets.encode_sensor(1, batch[1])]), batch)
+
+        # Assert
+        self.assertEqual(len(writer.queue), 1)
+        frame = json.loads(writer.queue[0][1])
+        self.assertEqual([point["timestamp"] for point in frame["data"]["1"]], [0.0, 1.0, 2.0])
+        self.assertEqual(writer.frames_dropped, 0)
+        self.assertEqual(writer.frames_coalesced, 2)
+
+    async def test_disconnect_closes_slow_consumer(self):
+        """Test that the disconnect policy closes the socket and reports it"""
+        # Arrange
+        websocket = FakeWebSocket()
+        closed = []
+        writer = ConnectionWriter(websocket, max_frames=1, policy="disconnect", on_close=lambda: closed.append(True))
+
+        # Act
+        writer.enqueue("a")
+        accepted = writer.enqueue("b")
+        await drain()
+
+        # Assert
+        self.assertFalse(accepted)
+        self.assertEqual(closed, [True])
+        self.assertEqual(websocket.close_code, 1013)
+
+    async def test_release_sends_frames_ahead_of_held_ones(self):
+        """Test that frames released after a hold go out before the live frames held meanwhile"""
+        # Arrange
+        websocket = FakeWebSocket()
+        writer = ConnectionWriter(websocket)
+        writer.start()
+
+        # Act
+        writer.hold()
+        writer.enqueue("live 1")
+        writer.enqueue("live 2")
+        await drain()
+        self.assertEqual(websocket.sent, [])
+        writer.release(["history 1", "history 2"])
+        await drain()
+        writer.stop()
+
+        # Assert
+        self.assertEqual(websocket.sent, ["history 1", "history 2", "live 1", "live 2"])
+
+    async def test_held_frames_are_bounded(self):
+        """Test that frames held during a backfill are capped by the policy"""
+        # Arrange
+        dropping = ConnectionWriter(FakeWebSocket(), max_frames=3, policy="drop_oldest")
+        closing = ConnectionWriter(FakeWebSocket(), max_frames=3, policy="disconnect")
+        dropping.hold()
+        closing.hold()
+
+        # Act
+        for index in range(5):
+            dropping.enqueue(str(index))
+        accepted = [closing.enqueue(str(index)) for index in range(4)]
+        await drain()
+
+        # Assert
+        self.assertEqual([frame for frame, _ in dropping.held], ["2", "3", "4"])
+        self.assertEqual(dropping.frames_dropped, 2)
+        self.assertEqual(accepted, [True, True, True, False])
+        self.assertTrue(closing.closed)
+
+    async def test_unknown_policy(self):
+        """Test that an unknown policy is rejected"""
+        with self.assertRaises(ValueError):
+            ConnectionWriter(FakeWebSocket(), policy="block")
+
+if __name__ == "__main__":
+    unittest.main()
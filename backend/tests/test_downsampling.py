@@ -0,0 +1,69 @@
+import math
+import unittest
+
+import numpy as np
+
+from app.utils.downsampling import downsample, lttb, min_max
+
+class TestDownsampling(unittest.TestCase):
+    """Tests for the LTTB and min-max decimation functions"""
+
+    def setUp(self):
+        """Create a noisy sine wave with two artifacts"""
+        self.timestamps = [1000.0 + i * 0.01 for i in range(20000)]
+        self.values = [math.sin(i / 100) + 0.01 * ((i * 7919) % 13 - 6) for i in range(20000)]
+        self.values[5000] = 12.0
+        self.values[15000] = -12.0
+
+    def test_lttb_bounds_and_keeps_peaks(self):
+        """Test that LTTB keeps the end points and the artifacts"""
+        # Act
+        timestamps, values = lttb(self.timestamps, self.values, 500)
+
+        # Assert
+        self.assertEqual(len(timestamps), 500)
+        self.assertEqual(timestamps[0], self.timestamps[0])
+        self.assertEqual(timestamps[-1], self.timestamps[-1])
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+        self.assertIn(12.0, values)
+        self.assertIn(-12.0, values)
+
+    def test_min_max_keeps_extremes(self):
+        """Test that min-max keeps each bucket's extremes in time order"""
+        # Act
+        timestamps, values = min_max(self.timestamps, self.values, 500)
+
+        # Assert
+        self.assertLessEqual(len(timestamps), 500)
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+        self.assertEqual(values.max(), 12.0)
+        self.assertEqual(values.min(), -12.0)
+
+    def test_min_max_respects_small_and_odd_budgets(self):
+        """Test that min-max never returns more samples than max_points"""
+        for max_points in (0, 1, 2, 3, 5, 499):
+            # Act
+            timestamps, values = min_max(self.timestamps, self.values, max_points)
+
+            # Assert
+            self.assertLessEqual(len(timestamps), max_points)
+            self.assertEqual(len(timestamps), len(values))
+        # A single sample keeps the largest artifact
+        self.assertEqual(list(min_max(self.timestamps, self.values, 1)[1]), [12.0])
+
+    def test_short_series_unchanged(self):
+        """Test that a series within the budget is returned as-is"""
+        # Act
+        timestamps, values = downsample(self.timestamps[:100], self.values[:100], 500)
+
+        # Assert
+        self.assertEqual(timestamps.tolist(), self.timestamps[:100])
+        self.assertEqual(values.tolist(), self.values[:100])
+
+    def test_unknown_method(self):
+        """Test that an unknown method is rejected"""
+        with self.assertRaises(ValueError):
+            downsample(self.timestamps, self.values, 500, "median")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from app.utils.hot_window import HotWindowStore, SensorRingBuffer
+
+class TestSensorRingBuffer(unittest.TestCase):
+    """Tests for the SensorRingBuffer class"""
+
+    def test_eviction_moves_coverage(self):
+        """Test that evicting old samples narrows the range served from memory"""
+        # Arrange
+        buffer = SensorRingBuffer(5)
+
+        # Act
+        buffer.append([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+
+        # Assert
+        self.assertEqual(len(buffer), 5)
+        self.assertFalse(buffer.covers(2.0))
+        self.assertTrue(buffer.covers(2.5))
+        self.assertEqual(buffer.read(4.0, 6.0), ([4.0, 5.0, 6.0], [0.4, 0.5, 0.6]))
+        self.assertEqual(buffer.read(6.5), ([7.0], [0.7]))
+
+    def test_out_of_order_sample_breaks_coverage(self):
+        """Test that a dropped out-of-order sample marks earlier ranges incomplete"""
+        buffer = SensorRingBuffer(10)
+        buffer.append([1.0, 2.0, 3.0], [0.0, 0.0, 0.0])
+
+        buffer.append([1.5], [0.0])
+
+        self.assertEqual(len(buffer), 3)
+        self.assertFalse(buffer.covers(1.5))
+        self.assertTrue(buffer.covers(1.6))
+
+class TestHotWindowStore(unittest.TestCase):
+    """Tests for the HotWindowStore class"""
+
+    def test_capacity_follows_rate(self):
+        """Test that buffers are sized from the data rate and resized without losing samples"""
+        # Arrange
+        store = HotWindowStore(window_seconds=10, default_rate=1)
+        store.configure(1, 10.0)
+        store.append(1, [float(t) for t in range(20)], [0.5] * 20)
+
+        # Act
+        store.configure(1, 20.0)
+
+        # Assert
+        stats = store.stats()
+        self.assertEqual(stats["sensors"][1]["capacity"], 250)
+        self.assertEqual(stats["sensors"][1]["samples"], 20)
+        self.assertEqual(stats["total_memory_bytes"], 250 * 16)
+
+    def test_read_newest_first_with_limit(self):
+        """Test reading the newest samples of a range"""
+        store = HotWindowStore(window_seconds=10)
+        store.append(1, [1.0, 2.0, 3.0], [0.1, 0.2, 0.3])
+
+        samples = store.read(1, 1.0, limit=2)
+
+        self.assertEqual([sample["timestamp"] for sample in samples], [3.0, 2.0])
+        self.assertIsNone(store.read(1, 0.5))
+        self.assertIsNone(store.read(2, 1.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from unittest import mock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base
+from app.utils import ingest_writer, sample_store
+from app.utils.ingest_writer import IngestWriter
+
+class TestIngestWriter(unittest.TestCase):
+    """Tests for the IngestWriter class"""
+
+    def setUp(self):
+        """Create an in-memory database and a writer bound to it"""
+        self.engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.writer = IngestWriter(
+            session_factory=self.Session,
+            batch_size=100,
+            flush_interval=0.05,
+            max_pending=1000,
+            window=None,
+        )
+
+    def tearDown(self):
+        self.writer.stop()
+        Base.metadata.drop_all(bind=self.engine)
+
+    def test_submit_and_flush(self):
+        """Test that submitted samples are written in batches"""
+        # Act
+        for i in range(250):
+            self.writer.submit(1, (float(i),), (i / 250,))
+        drained = self.writer.flush()
+
+        # Assert
+        self.assertTrue(drained)
+        db = self.Session()
+        try:
+            self.assertEqual(db.query(models.SensorData).count(), 250)
+        finally:
+            db.close()
+        stats = self.writer.stats()
+        self.assertEqual(stats["samples_written"], 250)
+        self.assertEqual(stats["queue_depth"], 0)
+        # 250 samples with a batch size of 100 need at least 3 commits, but far fewer than 250
+        self.assertGreaterEqual(stats["batches_written"], 3)
+        self.assertLess(stats["batches_written"], 250)
+
+    def test_commits_invalidate_cached_spectra(self):
+        """Test that committed samples invalidate the cached spectra of their time span"""
+        # Act
+        with mock.patch.object(ingest_writer, "spectral_cache") as cache:
+            self.writer.submit(1, (10.0, 12.0, 11.0), (0.1, 0.2, 0.3))
+            self.writer.flush()
+
+        # Assert
+        cache.invalidate.assert_called_once_with(1, 10.0, 12.0)
+
+    def test_chunk_storage(self):
+        """Test that chunk storage packs samples into time blocks"""
+        # Arrange
+        writer = IngestWriter(session_factory=self.Session, batch_size=100, flush_interval=0.05, storage="chunks", window=None)
+
+        # Act - 12 seconds of 50 Hz data
+        for i in range(600):
+            writer.submit(1, (1000.0 + i * 0.02,), (0.25,))
+        drained = writer.flush()
+        writer.stop()
+
+        # Assert
+        self.assertTrue(drained)
+        db = self.Session()
+        try:
+            self.assertEqual(db.query(models.SensorData).count(), 0)
+            chunks = db.query(models.SensorDataChunk).order_by(models.SensorDataChunk.start_time).all()
+            self.assertEqual(sum(chunk.sample_count for chunk in chunks), 600)
+            self.assertLess(len(chunks), 10)
+            for chunk in chunks:
+                self.assertLessEqual(chunk.end_time - chunk.start_time, sample_store.CHUNK_SECONDS)
+        finally:
+            db.close()
+
+    def test_submit_rejects_when_full(self):
+        """Test that a non-blocking submit fails once the queue is full"""
+        # Arrange - fill the queue without a running writer thread
+        self.writer._running = True
+        self.assertTrue(self.writer.submit(1, [0.0] * 1000, [0.0] * 1000, block=False))
+
+        # Act
+        accepted = self.writer.submit(1, (1.0,), (0.5,), block=False)
+
+        # Assert
+        self.assertFalse(accepted)
+        self.assertEqual(self.writer.queue_depth(), 1000)
+        self.assertEqual(self.writer.stats()["samples_rejected"], 1)
+        self.writer._running = False
+
+    def test_failed_write_is_retried(self):
+        """Test that a batch whose first write fails is written by a retry"""
+        # Arrange - the first write raises, the next ones go through
+        write_samples = sample_store.write_samples
+        calls = []
+
+        def flaky_write(*args, **kwargs):
+            calls.append(args[1])
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return write_samples(*args, **kwargs)
+
+        # Act
+        with mock.patch.object(sample_store, "write_samples", flaky_write):
+            self.writer.submit(1, (1.0, 2.0), (0.1, 0.2))
+            drained = self.writer.flush()
+
+        # Assert
+        self.assertTrue(drained)
+        db = self.Session()
+        try:
+            self.assertEqual(db.query(models.SensorData).count(), 2)
+        finally:
+            db.close()
+        stats = self.writer.stats()
+        self.assertEqual(stats["write_retries"], 1)
+        self.assertEqual(stats["samples_dropped"], 0)
+        self.assertIsNone(stats["last_error"])
+
+    def test_failing_batch_is_dropped_and_counted(self):
+        """Test that a batch is dropped and counted once every attempt has failed"""
+        # Arrange
+        writer = IngestWriter(session_factory=self.Session, batch_size=100, flush_interval=0.01, max_attempts=3, window=None)
+
+        # Act
+        with mock.patch.object(sample_store, "write_samples", side_effect=RuntimeError("disk full")) as write:
+            writer.submit(1, (1.0, 2.0, 3.0), (0.1, 0.2, 0.3))
+            drained = writer.flush()
+        writer.stop()
+
+        # Assert
+        self.assertTrue(drained)
+        self.assertEqual(write.call_count, 3)
+        stats = writer.stats()
+        self.assertEqual(stats["samples_dropped"], 3)
+        self.assertEqual(stats["samples_written"], 0)
+        self.assertEqual(stats["write_retries"], 2)
+        self.assertEqual(stats["last_error"], "disk full")
+
+if __name__ == "__main__":
+    unittest.main()
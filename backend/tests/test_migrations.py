@@ -0,0 +1,96 @@
+import unittest
+from sqlalchemy import create_engine
+
+from app import models
+from app.migrations import MIGRATIONS, run_migrations
+from app.utils.chunk_codec import encode_chunk
+from app.utils.rollups import ROLLUP_RESOLUTIONS
+
+# Tables as created by earlier versions of the application
+LEGACY_SCHEMA = [
+    "CREATE TABLE sensors (id INTEGER NOT NULL, sensor_name VARCHAR, sensor_data_rate FLOAT, is_active BOOLEAN, PRIMARY KEY (id))",
+    "CREATE TABLE sensor_data (id INTEGER NOT NULL, sensor_id INTEGER, timestamp FLOAT, value FLOAT, PRIMARY KEY (id))",
+    "CREATE INDEX ix_sensor_data_id ON sensor_data (id)",
+    "CREATE INDEX ix_sensor_data_timestamp ON sensor_data (timestamp)",
+]
+
+class TestMigrations(unittest.TestCase):
+    """Tests for in-place schema migrations"""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        with self.engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql("INSERT INTO sensor_data (sensor_id, timestamp, value) VALUES (1, 10.0, 0.5)")
+
+    def _indexes(self, conn):
+        return {row[1] for row in conn.exec_driver_sql("PRAGMA index_list('sensor_data')")}
+
+    def test_migrates_legacy_database(self):
+        """Test that a legacy database gets the composite index without losing data"""
+        # Act
+        version = run_migrations(self.engine)
+
+        # Assert
+        self.assertEqual(version, MIGRATIONS[-1][0])
+        with self.engine.connect() as conn:
+            indexes = self._indexes(conn)
+            self.assertIn("ix_sensor_data_sensor_id_timestamp", indexes)
+            self.assertNotIn("ix_sensor_data_timestamp", indexes)
+            self.assertEqual(conn.exec_driver_sql("SELECT COUNT(*) FROM sensor_data").scalar(), 1)
+
+            # Range reads are answered from the covering index
+            plan = " ".join(
+                str(row[-1]) for row in conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN SELECT id, timestamp, value FROM sensor_data "
+                    "WHERE sensor_id = 1 AND timestamp >= 5 ORDER BY timestamp"
+                )
+            )
+            self.assertIn("COVERING INDEX ix_sensor_data_sensor_id_timestamp", plan)
+
+    def test_adds_retention_columns(self):
+        """Test that the per-sensor retention columns are added to an existing sensors table"""
+        run_migrations(self.engine)
+
+        with self.engine.connect() as conn:
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info('sensors')")}
+        self.assertIn("raw_retention_hours", columns)
+        self.assertIn("rollup_retention_days", columns)
+
+    def test_backfills_rollups_of_existing_samples(self):
+        """Test that rows and chunks stored before rollups existed get their rollups"""
+        # Arrange - one more row in the same buckets, and a chunk written before the rollups
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO sensor_data (sensor_id, timestamp, value) VALUES (1, 10.5, -0.5)")
+            models.SensorDataChunk.__table__.create(conn)
+            conn.execute(
+                models.SensorDataChunk.__table__.insert(),
+                [dict(sensor_id=2, **encode_chunk([20.0, 20.25, 20.5], [1.0, 2.0, 3.0], "f8"))],
+            )
+
+        # Act
+        run_migrations(self.engine)
+
+        # Assert
+        with self.engine.connect() as conn:
+            rows = conn.exec_driver_sql(
+                "SELECT sensor_id, resolution, bucket_start, count, min_value, max_value, sum_value "
+                "FROM sensor_data_rollups WHERE resolution = ? ORDER BY sensor_id",
+                (ROLLUP_RESOLUTIONS[0],),
+            ).all()
+            total = conn.exec_driver_sql("SELECT COUNT(*) FROM sensor_data_rollups").scalar()
+        self.assertEqual([tuple(row) for row in rows], [
+            (1, ROLLUP_RESOLUTIONS[0], 10.0, 2, -0.5, 0.5, 0.0),
+            (2, ROLLUP_RESOLUTIONS[0], 20.0, 3, 1.0, 3.0, 6.0),
+        ])
+        self.assertEqual(total, 2 * len(ROLLUP_RESOLUTIONS))
+
+    def test_migrations_run_once(self):
+        """Test that running migrations again is a no-op"""
+        first = run_migrations(self.engine)
+        second = run_migrations(self.engine)
+        self.assertEqual(first, second)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -83,6 +83,23 @@ class TestMockDataGenerator(unittest.TestCase):
             timestamp_diff = data_points[i]["timestamp"] - data_points[i-1]["timestamp"]
             self.assertAlmostEqual(timestamp_diff, broadcast_interval / data_rate, places=6)
             
+    def test_generate_until_rate(self):
+        """Test that generate_until yields data_rate points per second however often it is called"""
+        # Arrange
+        sensor_id = 1
+        self.generator.update_sensor_data_rate(sensor_id, 10.0)
+        
+        # Act - a 20ms tick for 2 seconds
+        data_points = []
+        for tick in range(101):
+            data_points.extend(self.generator.generate_until(sensor_id, 1000.0 + tick * 0.02))
+        
+        # Assert
+        timestamps = [point["timestamp"] for point in data_points]
+        self.assertEqual(len(data_points), 21)
+        for i in range(1, len(timestamps)):
+            self.assertAlmostEqual(timestamps[i] - timestamps[i - 1], 0.1)
+        
     def test_generate_single_data_point(self):
         """Test generating a single data point"""
         # Arrange
@@ -0,0 +1,87 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.database import Base
+from app.utils import sample_store
+from app.utils.retention import RetentionJob
+
+class TestRetentionJob(unittest.TestCase):
+    """Tests for the RetentionJob class"""
+
+    def setUp(self):
+        """Create an in-memory database with two sensors and an hour of data each"""
+        self.engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+        db = self.Session()
+        db.add(models.Sensor(id=1, sensor_name="global policy"))
+        db.add(models.Sensor(id=2, sensor_name="keeps raw longer", raw_retention_hours=2.0))
+        timestamps = [float(t) for t in range(0, 3600, 2)]  # One sample every 2 seconds
+        for sensor_id in (1, 2):
+            sample_store.write_samples(db, sensor_id, timestamps, [0.5] * len(timestamps), storage="rows")
+            sample_store.write_samples(db, sensor_id, [t + 0.5 for t in timestamps], [0.5] * len(timestamps), storage="chunks")
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        Base.metadata.drop_all(bind=self.engine)
+
+    def _count(self, model, sensor_id):
+        db = self.Session()
+        try:
+            return db.query(model).filter(model.sensor_id == sensor_id).count()
+        finally:
+            db.close()
+
+    def test_deletes_expired_raw_data_in_batches(self):
+        """Test that raw data older than the policy is deleted and per-sensor overrides apply"""
+        # Arrange - keep 30 minutes of raw data, deleting 100 rows per transaction
+        job = RetentionJob(session_factory=self.Session, raw_hours=0.5, rollup_days=0, batch_size=100, batch_pause=0)
+
+        # Act - "now" is one hour after the first sample
+        report = job.run_once(now=3600.0)
+
+        # Assert
+        self.assertTrue(report["completed"])
+        self.assertEqual(report["raw_rows_deleted"], 900)
+        self.assertGreater(report["chunks_deleted"], 0)
+        self.assertEqual(self._count(models.SensorData, 1), 900)
+        # Sensor 2 keeps raw data for 2 hours, so nothing expired yet
+        self.assertEqual(self._count(models.SensorData, 2), 1800)
+        # Rollups are kept when no rollup retention is configured
+        self.assertEqual(report["rollups_deleted"], 0)
+        self.assertIs(job.last_report, report)
+
+    def test_deletes_expired_rollups(self):
+        """Test that rollups older than the policy are deleted"""
+        # Arrange - keep rollups for 30 minutes
+        job = RetentionJob(session_factory=self.Session, raw_hours=0, rollup_days=0.5 / 24, batch_size=50, batch_pause=0)
+        before = self._count(models.SensorDataRollup, 1)
+
+        # Act
+        report = job.run_once(now=3600.0)
+
+        # Assert
+        self.assertGreater(report["rollups_deleted"], 0)
+        self.assertLess(self._count(models.SensorDataRollup, 1), before)
+        self.assertEqual(report["raw_rows_deleted"], 0)
+
+    def test_stops_at_time_budget(self):
+        """Test that a run stops once its time budget is used up"""
+        job = RetentionJob(session_factory=self.Session, raw_hours=0.5, rollup_days=0, batch_size=10, batch_pause=0, run_budget=0)
+
+        report = job.run_once(now=3600.0)
+
+        self.assertFalse(report["completed"])
+        self.assertEqual(report["raw_rows_deleted"], 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import math
+import unittest
+
+import numpy as np
+
+from app.utils.spectral import SpectralCache, analyze, segment_indices
+
+class TestSpectral(unittest.TestCase):
+    """Tests for the Welch spectrum and its periodogram cache"""
+
+    def setUp(self):
+        """Create 20 minutes of a 3 cpm slow wave sampled at 10 Hz"""
+        self.rate = 10.0
+        self.timestamps = 6000.0 + np.arange(int(1200 * self.rate)) / self.rate
+        phase = 2 * np.pi * (3.0 / 60.0) * self.timestamps
+        noise = 0.05 * np.sin(2 * np.pi * 1.3 * self.timestamps)
+        self.values = np.sin(phase) + noise
+        self.reads = []
+
+    def read_series(self, start, end):
+        self.reads.append((start, end))
+        first, last = np.searchsorted(self.timestamps, [start, end], side="left")
+        return self.timestamps[first:last + 1], self.values[first:last + 1]
+
+    def test_dominant_frequency_and_bands(self):
+        """Test that a 3 cpm signal is found in the normogastria band"""
+        # Act
+        result = analyze(self.read_series, 1, self.rate, 6000.0, 7200.0, 120.0, 0.5, cache=SpectralCache())
+
+        # Assert
+        self.assertEqual(result["segments"], 19)
+        self.assertAlmostEqual(result["dominant_frequency_cpm"], 3.0, delta=0.5)
+        bands = {band["name"]: band for band in result["bands"]}
+        self.assertGreater(bands["normogastria"]["ratio"], 0.9)
+        self.assertLessEqual(max(result["frequencies_cpm"]), 15.0)
+        self.assertEqual(len(result["frequencies_cpm"]), len(result["psd"]))
+
+    def test_sliding_window_reuses_segments(self):
+        """Test that moving a window forward only computes the new segments"""
+        # Arrange
+        cache = SpectralCache()
+        analyze(self.read_series, 1, self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+        self.reads.clear()
+
+        # Act - slide the window by two steps
+        result = analyze(self.read_series, 1, self.rate, 6120.0, 7020.0, 120.0, 0.5, spectrogram=True, cache=cache)
+
+        # Assert
+        self.assertEqual(self.reads, [(6840.0, 7020.0)])
+        self.assertEqual(cache.segments_computed, 16)
+        self.assertEqual(cache.segments_reused, 12)
+        self.assertEqual(len(result["spectrogram"]), 14)
+        self.assertEqual(result["spectrogram"][0]["start_time"], 6120.0)
+
+    def test_invalidate_drops_overlapping_segments(self):
+        """Test that changed samples only cost the segments they fall into"""
+        # Arrange
+        cache = SpectralCache()
+        analyze(self.read_series, 1, self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+        self.reads.clear()
+
+        # Act - a late write into [6500, 6510] touches the segments starting at 6420 and 6480
+        cache.invalidate(1, 6500.0, 6510.0)
+        cache.invalidate(2)
+        analyze(self.read_series, 1, self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+
+        # Assert
+        self.assertEqual(self.reads, [(6420.0, 6600.0)])
+        self.assertEqual(cache.segments_invalidated, 2)
+
+    def test_changes_during_analysis_are_not_cached(self):
+        """Test that segments invalidated while their samples were being read are not stored"""
+        # Arrange - a write lands while the analysis reads
+        cache = SpectralCache()
+
+        def read_during_write(start, end):
+            series = self.read_series(start, end)
+            cache.invalidate(1, 6500.0, 6510.0)
+            return series
+
+        # Act
+        result = analyze(read_during_write, 1, self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+
+        # Assert
+        self.assertEqual(result["segments"], 14)
+        entry = cache.entries[(1, self.rate, 120.0, 60.0, 4.0)]
+        self.assertEqual(len(entry), 12)
+        self.assertNotIn(107, entry)
+        self.assertNotIn(108, entry)
+
+    def test_source_rate_is_part_of_the_key(self):
+        """Test that spectra computed at another source rate are not reused"""
+        # Arrange
+        cache = SpectralCache()
+        analyze(self.read_series, 1, self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+        self.reads.clear()
+
+        # Act
+        analyze(self.read_series, 1, 2 * self.rate, 6000.0, 6900.0, 120.0, 0.5, cache=cache)
+
+        # Assert
+        self.assertEqual(cache.segments_reused, 0)
+        self.assertEqual(self.reads, [(6000.0, 6900.0)])
+
+    def test_segment_indices_are_aligned(self):
+        """Test that segments start on the absolute step grid"""
+        # Act
+        indices = segment_indices(6010.0, 6300.0, 120.0, 60.0)
+
+        # Assert
+        self.assertEqual([index * 60.0 for index in indices], [6060.0, 6120.0, 6180.0])
+
+if __name__ == "__main__":
+    unittest.main()
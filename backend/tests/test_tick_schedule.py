@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+from app.utils import tick_schedule
+from app.utils.tick_schedule import TickClock, parse_tick_ms, server_interval
+
+class TestTickSchedule(unittest.TestCase):
+    """Tests for the broadcast tick settings"""
+
+    def test_parse_tick_ms(self):
+        """Test that requested ticks are clamped and invalid ones ignored"""
+        self.assertEqual(parse_tick_ms("50"), 50)
+        self.assertEqual(parse_tick_ms(5), tick_schedule.MIN_TICK_MS)
+        self.assertEqual(parse_tick_ms(60000), tick_schedule.MAX_TICK_MS)
+        self.assertIsNone(parse_tick_ms(None))
+        self.assertIsNone(parse_tick_ms("fast"))
+        self.assertIsNone(parse_tick_ms("nan"))
+
+    def test_server_interval_fixed(self):
+        """Test that the fixed mode ignores the load"""
+        self.assertEqual(server_interval(500, busy=0.2, tick_ms=250, mode="fixed"), 0.25)
+
+    def test_server_interval_adaptive(self):
+        """Test that the adaptive tick grows with connections and processing time"""
+        # Arrange / Act
+        idle = server_interval(3, tick_ms=1000, mode="adaptive", adaptive_connections=50)
+        loaded = server_interval(120, tick_ms=1000, mode="adaptive", adaptive_connections=50)
+        slow = server_interval(3, busy=0.1, tick_ms=1000, mode="adaptive", adaptive_connections=50)
+        capped = server_interval(100000, tick_ms=500, mode="adaptive", adaptive_connections=50)
+
+        # Assert
+        self.assertAlmostEqual(idle, 0.02)
+        self.assertAlmostEqual(loaded, 0.06)
+        self.assertAlmostEqual(slow, 0.2)
+        self.assertAlmostEqual(capped, 0.5)
+
+    def test_tick_clock_does_not_drift(self):
+        """Test that deadlines advance by the interval whatever the processing time"""
+        # Arrange
+        clock = TickClock()
+        now = [100.0]
+
+        # Act / Assert
+        with mock.patch.object(tick_schedule.time, "monotonic", lambda: now[0]):
+            self.assertAlmostEqual(clock.delay(0.05), 0.05)
+            now[0] = 100.08  # The tick took 30 ms longer than its slot
+            self.assertAlmostEqual(clock.delay(0.05), 0.02)
+            now[0] = 100.5  # Far behind: skip ahead instead of bursting
+            self.assertEqual(clock.delay(0.05), 0.0)
+            self.assertGreater(clock.ticks_missed, 0)
+            self.assertAlmostEqual(clock.delay(0.05), 0.05)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from app.utils.wire_format import encode_batch, negotiate, regular_step
+
+class TestDeltaFormat(unittest.TestCase):
+    """Tests for the t0/dt delta frame encoding"""
+
+    def test_regular_step(self):
+        """Test that evenly spaced timestamps are detected within the tolerance"""
+        # Arrange
+        timestamps = [1700000000.0 + i * 0.01 for i in range(100)]
+
+        # Act / Assert
+        self.assertAlmostEqual(regular_step(timestamps), 0.01)
+        self.assertEqual(regular_step([5.0]), 0.0)
+        self.assertIsNone(regular_step([]))
+        self.assertIsNone(regular_step([0.0, 0.01, 0.025, 0.03]))
+
+    def test_regular_series_uses_t0_dt(self):
+        """Test that a regular series is sent as t0, dt and values, and is much smaller than JSON"""
+        # Arrange
+        timestamps = [1700000000.123456 + i * 0.01 for i in range(100)]
+        values = [round(0.5 - i * 0.001, 6) for i in range(100)]
+
+        # Act
+        delta = encode_batch({7: (timestamps, values)}, "delta")
+        plain = encode_batch({7: (timestamps, values)}, "json")
+
+        # Assert
+        series = json.loads(delta)["data"]["7"]
+        self.assertEqual(series["t0"], timestamps[0])
+        self.assertEqual(series["values"], values)
+        for i, timestamp in enumerate(timestamps):
+            self.assertAlmostEqual(series["t0"] + i * series["dt"], timestamp, delta=1e-6)
+        self.assertLess(len(delta) * 3, len(plain))
+
+    def test_irregular_series_keeps_timestamps(self):
+        """Test that irregular samples fall back to explicit timestamps"""
+        # Act
+        frame = json.loads(encode_batch({1: ([1.0, 1.5, 3.0], [0.1, 0.2, 0.3])}, "delta"))
+
+        # Assert
+        self.assertEqual(frame, {"event": "batch_data", "data": {"1": {"timestamps": [1.0, 1.5, 3.0], "values": [0.1, 0.2, 0.3]}}})
+
+    def test_negotiate_delta(self):
+        """Test that delta frames are chosen by query parameter or subprotocol"""
+        self.assertEqual(negotiate("delta"), ("delta", None))
+        self.assertEqual(negotiate(None, ["egg.delta.v1"]), ("delta", "egg.delta.v1"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -197,6 +197,37 @@ export default function PresentationScreen() {
               }));
             });
             
+            return updatedData;
+          });
+        }
+        // Handle history sent after a subscribe (possibly split over several frames)
+        else if (data.event === 'backfill' && data.data) {
+          setSensorData(prevData => {
+            const updatedData = { ...prevData };
+
+            Object.entries(data.data).forEach(([sensorId, dataPoints]) => {
+              const numericSensorId = parseInt(sensorId);
+              if (dataPoints.length === 0) {
+                return;
+              }
+
+              const historyPoints = dataPoints.map(point => ({
+                timestamp: typeof point.timestamp === 'number' ? point.timestamp : parseFloat(point.timestamp),
+                value: typeof point.value === 'number' ? point.value : parseFloat(point.value)
+              }));
+              const firstTimestamp = historyPoints[0].timestamp;
+              const lastTimestamp = historyPoints[historyPoints.length - 1].timestamp;
+
+              // The history replaces the points already held for its time span
+              const sensorDataArray = updatedData[numericSensorId] || [];
+              const keptData = sensorDataArray.filter(d => {
+                const timestamp = typeof d.timestamp === 'number' ? d.timestamp : parseFloat(d.timestamp);
+                return timestamp < firstTimestamp || timestamp > lastTimestamp;
+              });
+
+              updatedData[numericSensorId] = [...keptData, ...historyPoints].sort((a, b) => a.timestamp - b.timestamp);
+            });
+
             return updatedData;
           });
         }